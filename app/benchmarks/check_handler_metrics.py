@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+"""
+Offline check of the handler metrics (EMF log lines) written by arriba_wgts_rna_tools.metrics
+
+A handler decorated with instrument_handler is invoked against the local OrcaBus api stand-in
+(orcabus_api_stub.py), it makes one api request and uses one memoising cache,
+and the log lines captured from stdout are checked
+
+  * every line is a valid EMF document (namespace, dimensions and metrics present, with units)
+  * ColdStart is 1 on the first invocation only
+  * one ApiFunction line per api function called, and one CacheName line per cache used
+  * an invocation that raises is recorded with Errors 1 (and the error is still raised)
+  * EventBytes / ResponseBytes are only recorded with HANDLER_METRICS_PAYLOAD_SIZES=true
+  * nothing is written with HANDLER_METRICS_MODE=off
+
+Each check is printed with its result, the exit code is 1 if any check fails.
+
+Usage:
+
+python3 app/benchmarks/check_handler_metrics.py
+"""
+
+# Standard imports
+import io
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+from typing import Any, Callable, Dict, List, Tuple
+
+# Local imports
+from orcabus_api_stub import OrcabusApiStub
+from run_benchmarks import setup_offline_environment, unload_layer_modules
+
+# Globals
+FUNCTION_NAME = "check_handler_metrics"
+NAMESPACE = "OrcaBus/ArribaWgtsRnaPipelineManager"
+PORTAL_RUN_ID = "20250617ac346b29"  # pragma: allowlist secret
+API_FUNCTION_NAME = "workflow.get_workflow_run_from_portal_run_id"
+CACHE_NAME = "checkHandlerMetrics"
+
+
+class CheckContext:
+    """
+    The parts of the lambda context read by the metrics
+    """
+    function_name = FUNCTION_NAME
+
+
+def get_handlers() -> Tuple[Callable, Callable]:
+    """
+    Build a handler that makes one api request and uses one cache, and a handler that raises
+    :return:
+    """
+    from arriba_wgts_rna_tools.cache import MemoisingCache
+    from arriba_wgts_rna_tools.metrics import instrument_handler
+    from arriba_wgts_rna_tools.transport import iter_api_results
+    from arriba_wgts_rna_tools.workflow import WORKFLOW_RUN_ENDPOINT, WORKFLOW_SUBDOMAIN
+
+    check_cache = MemoisingCache(name=CACHE_NAME, ttl_seconds=60, max_size=8)
+
+    @instrument_handler
+    def handler(event, context):
+        workflow_run_list = check_cache.get_or_set(
+            event['portalRunId'],
+            lambda: list(iter_api_results(
+                API_FUNCTION_NAME, WORKFLOW_SUBDOMAIN, WORKFLOW_RUN_ENDPOINT,
+                params={"portalRunId": event['portalRunId']}
+            ))
+        )
+        return {"workflowRunCount": len(workflow_run_list)}
+
+    @instrument_handler
+    def failing_handler(event, context):
+        raise ValueError("Expected failure")
+
+    return handler, failing_handler
+
+
+def capture_emf_documents(handler: Callable, event: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Invoke the handler and parse the log lines it writes
+    :param handler:
+    :param event:
+    :return: The EMF documents, and whether the handler raised
+    """
+    captured_stdout = io.StringIO()
+    is_error = False
+    with redirect_stdout(captured_stdout):
+        try:
+            handler(event, CheckContext())
+        except ValueError:
+            is_error = True
+    return list(map(json.loads, captured_stdout.getvalue().splitlines())), is_error
+
+
+def is_valid_emf_document(emf_document: Dict[str, Any]) -> bool:
+    metric_directive = emf_document['_aws']['CloudWatchMetrics'][0]
+    return (
+        isinstance(emf_document['_aws']['Timestamp'], int) and
+        metric_directive['Namespace'] == NAMESPACE and
+        all(map(lambda dimension_iter_: dimension_iter_ in emf_document, metric_directive['Dimensions'][0])) and
+        all(map(
+            lambda metric_iter_: (
+                isinstance(emf_document.get(metric_iter_['Name'], None), (int, float)) and
+                metric_iter_['Unit'] in ["Milliseconds", "Bytes", "Count"]
+            ),
+            metric_directive['Metrics']
+        ))
+    )
+
+
+def get_function_document(emf_document_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return next(filter(
+        lambda emf_document_iter_: (
+            emf_document_iter_['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [["FunctionName"]]
+        ),
+        emf_document_list
+    ))
+
+
+def run_checks() -> List[Tuple[str, bool]]:
+    api_stub = OrcabusApiStub.from_fixtures_file()
+    event = {"portalRunId": PORTAL_RUN_ID}
+
+    with api_stub.installed():
+        unload_layer_modules()
+        handler, failing_handler = get_handlers()
+        api_stub.attach()
+
+        os.environ["HANDLER_METRICS_MODE"] = "emf"
+        os.environ.pop("HANDLER_METRICS_PAYLOAD_SIZES", None)
+
+        cold_emf_documents, _ = capture_emf_documents(handler, event)
+        warm_emf_documents, _ = capture_emf_documents(handler, event)
+        error_emf_documents, is_error = capture_emf_documents(failing_handler, event)
+
+        os.environ["HANDLER_METRICS_PAYLOAD_SIZES"] = "true"
+        sized_emf_documents, _ = capture_emf_documents(handler, event)
+        os.environ.pop("HANDLER_METRICS_PAYLOAD_SIZES")
+
+        os.environ["HANDLER_METRICS_MODE"] = "off"
+        off_emf_documents, _ = capture_emf_documents(handler, event)
+
+        unload_layer_modules()
+
+    cold_function_document = get_function_document(cold_emf_documents)
+    warm_function_document = get_function_document(warm_emf_documents)
+    error_function_document = get_function_document(error_emf_documents)
+    sized_function_document = get_function_document(sized_emf_documents)
+
+    return [
+        (
+            "every log line is a valid EMF document",
+            all(map(
+                is_valid_emf_document,
+                cold_emf_documents + warm_emf_documents + error_emf_documents + sized_emf_documents
+            ))
+        ),
+        (
+            "the function name is taken from the context",
+            cold_function_document['FunctionName'] == FUNCTION_NAME
+        ),
+        (
+            "ColdStart is 1 on the first invocation only",
+            cold_function_document['ColdStart'] == 1 and warm_function_document['ColdStart'] == 0
+        ),
+        (
+            "the api request is recorded on its own line",
+            any(map(
+                lambda emf_document_iter_: (
+                    emf_document_iter_.get('ApiFunction', None) == API_FUNCTION_NAME and
+                    emf_document_iter_['ApiCalls'] == 1
+                ),
+                cold_emf_documents
+            )) and cold_function_document['ApiCalls'] == 1
+        ),
+        (
+            "the cache miss then hit are recorded on their own lines",
+            any(map(
+                lambda emf_document_iter_: (
+                    emf_document_iter_.get('CacheName', None) == CACHE_NAME and
+                    emf_document_iter_['CacheMisses'] == 1
+                ),
+                cold_emf_documents
+            )) and
+            warm_function_document['CacheHits'] == 1 and warm_function_document['ApiCalls'] == 0
+        ),
+        (
+            "a failed invocation is raised and recorded with Errors 1",
+            is_error and error_function_document['Errors'] == 1 and 'ResponseBytes' not in error_function_document
+        ),
+        (
+            "payload sizes are not recorded by default",
+            'EventBytes' not in cold_function_document and 'ResponseBytes' not in cold_function_document
+        ),
+        (
+            "payload sizes are recorded with HANDLER_METRICS_PAYLOAD_SIZES=true",
+            sized_function_document.get('EventBytes', None) == len(json.dumps(event, separators=(",", ":"))) and
+            sized_function_document.get('ResponseBytes', 0) > 0
+        ),
+        (
+            "nothing is written with HANDLER_METRICS_MODE=off",
+            len(off_emf_documents) == 0
+        ),
+    ]
+
+
+def main():
+    setup_offline_environment()
+
+    results_list = run_checks()
+    for check_name, is_passed in results_list:
+        print(f"{'PASS' if is_passed else 'FAIL'}  {check_name}")
+
+    if not all(map(lambda result_iter_: result_iter_[1], results_list)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+Local stand-in for the SQS queue in front of a lambda (an SQS event source)
+
+Messages are sent with a (simulated) sent timestamp, and received in batches as the event source would,
+a batch is closed once it holds batch_size messages or once the batching window
+(from the first message in the batch) has passed.
+
+Batches are returned as an SQS lambda event, so they can be passed straight to a handler,
+and the handler response (batchItemFailures) is applied as the event source would,
+failed messages are returned to the queue and dead-lettered after max_receive_count receives.
+"""
+
+# Standard imports
+import json
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# Globals
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_BATCHING_WINDOW_MS = 10000
+DEFAULT_MAX_RECEIVE_COUNT = 3
+
+
+class LocalQueue:
+    """
+    In-memory queue with SQS event source batching, partial batch failures and a dead letter queue
+    """
+
+    def __init__(
+            self,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            batching_window_ms: int = DEFAULT_BATCHING_WINDOW_MS,
+            max_receive_count: int = DEFAULT_MAX_RECEIVE_COUNT,
+    ):
+        self.batch_size = batch_size
+        self.batching_window_ms = batching_window_ms
+        self.max_receive_count = max_receive_count
+
+        self._messages: Deque[Dict[str, Any]] = deque()
+        self._in_flight: Dict[str, Dict[str, Any]] = {}
+        self._message_counter = 0
+
+        self.dead_letter_messages: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def send_messages(self, body_list: List[Dict[str, Any]], sent_timestamp_list: List[int]):
+        """
+        Queue the messages, in sent timestamp order
+        :param body_list:
+        :param sent_timestamp_list: Epoch milliseconds
+        :return:
+        """
+        message_list = list(self._messages)
+        for body, sent_timestamp in zip(body_list, sent_timestamp_list):
+            self._message_counter += 1
+            message_list.append({
+                "messageId": f"msg-{self._message_counter:08d}",
+                "body": json.dumps(body),
+                "sentTimestamp": sent_timestamp,
+                "receiveCount": 0,
+            })
+        self._messages = deque(sorted(message_list, key=lambda message_iter_: message_iter_['sentTimestamp']))
+
+    def receive_batch(self) -> Optional[Dict[str, Any]]:
+        """
+        Receive the next batch as an SQS lambda event, None if the queue is empty
+        :return:
+        """
+        if not self._messages:
+            return None
+
+        window_close_timestamp = self._messages[0]['sentTimestamp'] + self.batching_window_ms
+        record_list = []
+        while (
+                self._messages and
+                len(record_list) < self.batch_size and
+                self._messages[0]['sentTimestamp'] <= window_close_timestamp
+        ):
+            message = self._messages.popleft()
+            message['receiveCount'] += 1
+            self._in_flight[message['messageId']] = message
+            record_list.append({
+                "messageId": message['messageId'],
+                "body": message['body'],
+                "attributes": {
+                    "ApproximateReceiveCount": str(message['receiveCount']),
+                    "SentTimestamp": str(message['sentTimestamp']),
+                },
+                "eventSource": "aws:sqs",
+            })
+
+        return {"Records": record_list}
+
+    def complete_batch(self, batch: Dict[str, Any], response: Optional[Dict[str, Any]]):
+        """
+        Delete the successful messages of the batch, and return the failed messages to the queue.
+        A handler error (response None) fails the whole batch
+        :param batch:
+        :param response: The handler response
+        :return:
+        """
+        if response is None:
+            failed_message_id_list = list(map(lambda record_iter_: record_iter_['messageId'], batch['Records']))
+        else:
+            failed_message_id_list = list(map(
+                lambda failure_iter_: failure_iter_['itemIdentifier'],
+                response.get("batchItemFailures", [])
+            ))
+
+        for record in batch['Records']:
+            message = self._in_flight.pop(record['messageId'])
+            if record['messageId'] not in failed_message_id_list:
+                continue
+            if message['receiveCount'] >= self.max_receive_count:
+                self.dead_letter_messages.append(message)
+                continue
+            self._messages.append(message)
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+
+"""
+Local stand-in for the OrcaBus APIs that the lambdas talk to through the layer transport (transport.py)
+
+The workflow, fastq, metadata and filemanager endpoints used by the lambdas are served
+from an in-memory fixture (fixtures/orcabus-api.json) rather than over HTTP.
+Listings are paged (honouring rowsPerPage and following the next link) as the real apis are.
+
+Each request sleeps for the configured latency (plus jitter) so that the cost of api round trips
+(and any concurrency in the handlers) is reflected in the benchmark timings,
+and each request is counted (by api and resource, i.e 'workflow.workflowrun')
+so we can report the number of api calls made per handler invocation.
+
+The stub is attached by swapping the session factory, hostname and token of the layer transport
+(see transport.set_api_transport), this must happen after the handler (and layer) modules are imported,
+and is undone when the installed context exits.
+"""
+
+# Standard imports
+import importlib
+import json
+import random
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from copy import deepcopy
+from fnmatch import fnmatch
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# Globals
+FIXTURES_PATH = Path(__file__).absolute().parent / "fixtures" / "orcabus-api.json"
+
+API_NAMES = ["workflow", "fastq", "metadata", "filemanager"]
+
+STUB_HOSTNAME = "orcabus.local"
+TRANSPORT_MODULE_NAME = "arriba_wgts_rna_tools.transport"
+DEFAULT_ROWS_PER_PAGE = 100
+
+# Api subdomain -> api name
+SUBDOMAIN_API_NAMES = {
+    "workflow": "workflow",
+    "fastq": "fastq",
+    "metadata": "metadata",
+    "file": "filemanager",
+}
+
+
+class OrcabusApiNotFoundError(Exception):
+    """
+    Raised when the stub has no fixture for the request,
+    a requests.HTTPError is raised instead where requests is available (as the real transport would)
+    """
+    pass
+
+
+def get_not_found_error(message: str) -> Exception:
+    try:
+        from requests import HTTPError
+        return HTTPError(message)
+    except ImportError:
+        return OrcabusApiNotFoundError(message)
+
+
+class StubResponse:
+    """
+    The parts of a requests.Response that the transport reads
+    """
+
+    def __init__(self, status_code: int, body: Any, url: str):
+        self.status_code = status_code
+        self.body = body
+        self.url = url
+        # No urllib3 retry history
+        self.raw = None
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise get_not_found_error(f"{self.status_code} for url {self.url}: {self.body}")
+
+    def json(self) -> Any:
+        return self.body
+
+
+class StubSession:
+    """
+    A requests.Session stand-in, every get is routed to the stub
+    """
+
+    def __init__(self, api_stub: 'OrcabusApiStub'):
+        self.api_stub = api_stub
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> StubResponse:
+        return self.api_stub.handle_request(url, params)
+
+
+class OrcabusApiStub:
+    """
+    In-memory OrcaBus api with injectable latency and per-resource call counters
+    """
+
+    def __init__(
+            self,
+            fixtures: Dict[str, Any],
+            latency_ms: float = 0.0,
+            jitter_ms: float = 0.0,
+            api_latency_ms: Optional[Dict[str, float]] = None,
+            filemanager_cache_files: int = 0,
+            seed: int = 0,
+    ):
+        self.fixtures = fixtures
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        # Per api latency overrides, i.e {"filemanager": 250}
+        self.api_latency_ms = api_latency_ms or {}
+        # Pad each file listing with n cache files (listed first) to mimic a large portal run
+        self.filemanager_cache_files = filemanager_cache_files
+
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        self.calls: Counter = Counter()
+
+    @classmethod
+    def from_fixtures_file(cls, fixtures_path: Path = FIXTURES_PATH, **kwargs) -> 'OrcabusApiStub':
+        with open(fixtures_path) as fixtures_h:
+            return cls(json.load(fixtures_h), **kwargs)
+
+    # Call accounting
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def get_calls(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.calls)
+
+    # Request handling
+    def handle_request(self, url: str, params: Optional[Dict[str, Any]] = None) -> StubResponse:
+        """
+        Route the request to its resource, and page the results of a listing
+        :param url:
+        :param params:
+        :return:
+        """
+        url_obj = urlparse(url)
+        api_name = SUBDOMAIN_API_NAMES.get(url_obj.netloc.split(".")[0], url_obj.netloc)
+        path_parts = url_obj.path.strip("/").split("/")[2:]
+
+        # Query string and params (values are always lists)
+        query = parse_qs(url_obj.query)
+        for key, value in (params or {}).items():
+            query[key] = list(map(str, value)) if isinstance(value, list) else [str(value)]
+
+        with self._lock:
+            # Counted by resource, i.e workflow.workflowrun, workflow.state, workflow.payload
+            self.calls[f"{api_name}.{path_parts[2] if len(path_parts) > 2 else path_parts[0]}"] += 1
+            latency_s = (
+                self.api_latency_ms.get(api_name, self.latency_ms) +
+                self._random.uniform(0, self.jitter_ms)
+            ) / 1000
+        if latency_s > 0:
+            time.sleep(latency_s)
+
+        try:
+            is_listing, body = self._route(api_name, path_parts, query)
+        except KeyError as e:
+            return StubResponse(404, {"detail": f"Not found: {e}"}, url)
+
+        if not is_listing:
+            # Callers own (and may mutate) what they are given, as they would a decoded response
+            return StubResponse(200, deepcopy(body), url)
+
+        return StubResponse(200, deepcopy(self._get_page(url_obj, query, body)), url)
+
+    @staticmethod
+    def _get_page(url_obj, query: Dict[str, List[str]], results_list: List[Dict]) -> Dict:
+        rows_per_page = int(query.get("rowsPerPage", [DEFAULT_ROWS_PER_PAGE])[0])
+        page_number = int(query.get("page", [1])[0])
+        start = (page_number - 1) * rows_per_page
+
+        next_link = None
+        if start + rows_per_page < len(results_list):
+            next_link = url_obj._replace(query=urlencode({**query, "page": [page_number + 1]}, doseq=True)).geturl()
+
+        return {
+            "links": {"previous": None, "next": next_link},
+            "pagination": {"count": len(results_list), "page": page_number, "rowsPerPage": rows_per_page},
+            "results": results_list[start:start + rows_per_page],
+        }
+
+    def _route(self, api_name: str, path_parts: List[str], query: Dict[str, List[str]]) -> Tuple[bool, Any]:
+        """
+        Get the object (or listing) for the request path, raises a KeyError if there is no such object
+        :param api_name:
+        :param path_parts: The path after api/v1, i.e ['workflowrun', 'wfr.123', 'state']
+        :param query:
+        :return: Is this a listing, and the object or listing
+        """
+        resource, object_id, sub_resource = (path_parts + [None, None])[:3]
+
+        def _first(key: str) -> Optional[str]:
+            return query.get(key, [None])[0]
+
+        if api_name == "workflow" and resource == "workflowrun" and object_id is None:
+            return True, self.list_workflow_runs(
+                portal_run_id=_first("portalRunId"),
+                workflow_name=_first("workflow__workflowName"),
+                workflow_version=_first("workflow__workflowVersion"),
+                library_id_list=query.get("libraries__libraryId", None),
+            )
+        if api_name == "workflow" and resource == "workflowrun" and sub_resource == "state":
+            return True, self.list_workflow_run_states(object_id)
+        if api_name == "workflow" and resource == "payload":
+            return False, self.get_payload(object_id)
+        if api_name == "metadata" and resource == "library" and object_id is not None:
+            return False, self.get_library("orcabusId", object_id)
+        if api_name == "metadata" and resource == "library":
+            return True, [self.get_library("libraryId", _first("libraryId"))]
+        if api_name == "fastq" and resource == "fastq" and _first("rgid") is not None:
+            return True, [self.get_fastq_by_rgid(_first("rgid"))]
+        if api_name == "fastq" and resource == "fastq":
+            return True, self.list_fastqs_in_fastq_set(_first("fastqSetId"))
+        if api_name == "fastq" and resource == "fastqSet":
+            return True, self.list_fastq_sets(_first("library"), _first("currentFastqSet"))
+        if api_name == "filemanager" and resource == "s3" and _first("bucket") is not None:
+            return True, self.list_files_from_s3_uri(_first("bucket"), _first("key"))
+        if api_name == "filemanager" and resource == "s3":
+            return True, self.list_files_from_key_pattern(_first("key"))
+
+        raise KeyError("/".join(path_parts))
+
+    # Workflow api
+    def list_workflow_runs(
+            self,
+            portal_run_id: Optional[str] = None,
+            workflow_name: Optional[str] = None,
+            workflow_version: Optional[str] = None,
+            library_id_list: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        return list(filter(
+            lambda workflow_run_iter_: (
+                (portal_run_id is None or workflow_run_iter_['portalRunId'] == portal_run_id) and
+                (workflow_name is None or workflow_run_iter_['workflow']['workflowName'] == workflow_name) and
+                (
+                    workflow_version is None or
+                    workflow_run_iter_['workflow']['workflowVersion'] == workflow_version
+                ) and
+                (
+                    not library_id_list or
+                    any(map(
+                        lambda library_iter_: library_iter_['libraryId'] in library_id_list,
+                        workflow_run_iter_['libraries']
+                    ))
+                )
+            ),
+            self.fixtures['workflowRuns']
+        ))
+
+    def list_workflow_run_states(self, workflow_run_orcabus_id: str) -> List[Dict]:
+        """
+        A single state per workflow run (its current state) carrying the payload of its portal run
+        :param workflow_run_orcabus_id:
+        :return:
+        """
+        workflow_run = next(
+            filter(
+                lambda workflow_run_iter_: workflow_run_iter_['orcabusId'] == workflow_run_orcabus_id,
+                self.fixtures['workflowRuns']
+            )
+        )
+        payload = self.fixtures['payloads'].get(workflow_run['portalRunId'], None)
+        return [{
+            **workflow_run['currentState'],
+            "payload": payload['orcabusId'] if payload is not None else None,
+        }]
+
+    def get_payload(self, payload_orcabus_id: str) -> Dict:
+        return next(
+            filter(
+                lambda payload_iter_: payload_iter_['orcabusId'] == payload_orcabus_id,
+                self.fixtures['payloads'].values()
+            )
+        )
+
+    # Fastq api
+    def get_fastq_by_rgid(self, rgid: str) -> Dict:
+        return next(
+            filter(
+                lambda fastq_iter_: ".".join([
+                    fastq_iter_['index'], str(fastq_iter_['lane']), fastq_iter_['instrumentRunId']
+                ]) == rgid,
+                self.fixtures['fastqs']
+            )
+        )
+
+    def list_fastq_sets(self, library: Optional[str] = None, current_fastq_set: Optional[str] = None) -> List[Dict]:
+        return list(filter(
+            lambda fastq_set_iter_: (
+                (
+                    library is None or
+                    library in [fastq_set_iter_['library']['libraryId'], fastq_set_iter_['library']['orcabusId']]
+                ) and
+                (
+                    current_fastq_set is None or
+                    fastq_set_iter_['currentFastqSet'] == (current_fastq_set.lower() == "true")
+                )
+            ),
+            self.fixtures['fastqSets']
+        ))
+
+    def list_fastqs_in_fastq_set(self, fastq_set_id: str) -> List[Dict]:
+        fastq_set = next(
+            filter(
+                lambda fastq_set_iter_: fastq_set_iter_['id'] == fastq_set_id,
+                self.fixtures['fastqSets']
+            )
+        )
+        return list(filter(
+            lambda fastq_iter_: fastq_iter_['id'] in fastq_set['fastqSet'],
+            self.fixtures['fastqs']
+        ))
+
+    # Metadata api
+    def get_library(self, key: str, value: str) -> Dict:
+        return next(
+            filter(
+                lambda library_iter_: library_iter_[key] == value,
+                self.fixtures['libraries']
+            )
+        )
+
+    # Filemanager api
+    def list_files_from_portal_run_id(self, portal_run_id: str) -> List[Dict]:
+        files_list = self.fixtures['files'].get(portal_run_id, [])
+        if len(files_list) == 0 or self.filemanager_cache_files == 0:
+            return files_list
+        cache_prefix = files_list[0]['key'].split(portal_run_id)[0] + portal_run_id + "/cache/"
+        return [
+            {
+                "bucket": files_list[0]['bucket'],
+                "key": f"{cache_prefix}part-{idx:06d}.tmp",
+                "size": 1024,
+            }
+            for idx in range(self.filemanager_cache_files)
+        ] + files_list
+
+    def list_files_from_key_pattern(self, key_pattern: str) -> List[Dict]:
+        return next(
+            (
+                self.list_files_from_portal_run_id(portal_run_id)
+                for portal_run_id in self.fixtures['files']
+                if fnmatch(portal_run_id, key_pattern)
+            ),
+            []
+        )
+
+    def list_files_from_s3_uri(self, bucket: str, key: str) -> List[Dict]:
+        return [
+            file_iter_
+            for files_list in self.fixtures['files'].values()
+            for file_iter_ in files_list
+            if file_iter_['bucket'] == bucket and file_iter_['key'] == key
+        ]
+
+    # Transport attachment
+    def get_session(self) -> StubSession:
+        return StubSession(self)
+
+    def attach(self):
+        """
+        Route the layer transport through the stub, call after the handler (and layer) modules are imported
+        :return:
+        """
+        importlib.import_module(TRANSPORT_MODULE_NAME).set_api_transport(
+            session_factory=self.get_session,
+            get_hostname_func=lambda: STUB_HOSTNAME,
+            get_token_func=lambda force_refresh=False: "offline",
+        )
+
+    @contextmanager
+    def installed(self) -> Iterator['OrcabusApiStub']:
+        """
+        Detach the stub from the layer transport on exit (if the transport is still loaded),
+        call attach once the handler modules are imported
+        :return:
+        """
+        try:
+            yield self
+        finally:
+            if TRANSPORT_MODULE_NAME in sys.modules:
+                importlib.import_module(TRANSPORT_MODULE_NAME).set_api_transport()
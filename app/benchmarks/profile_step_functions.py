@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+
+"""
+Offline latency profile of the step function templates in app/step-functions-templates
+
+Walks the state graph of each template and builds a per-state timing trace,
+  * lambda tasks (${__<lambda_name>_lambda_function_arn__}) are timed by replaying the recorded events
+    in events/<lambda_name>.json through the in-repo handler against the local api stand-in (see run_benchmarks.py),
+    plus a fixed invoke overhead
+  * ssm getParameter and eventbridge putEvents tasks are stubbed with a fixed latency
+  * Parallel states take as long as their slowest branch, the other branches are reported with their slack
+  * Map states run the item processor once per item, in batches of MaxConcurrency (unbounded if not set)
+  * Choice states follow the slowest branch (the worst case), unless a branch is chosen with --choice
+
+The critical path (the states that determine the end-to-end latency) is marked with a '*'
+and the slowest states on the critical path are listed at the end.
+
+The templates use JSONata for their arguments and outputs, which we do not evaluate here,
+so the trace is structural, the lambdas are timed on their recorded events rather than on the
+output of the previous state.
+
+Usage:
+
+python3 app/benchmarks/profile_step_functions.py --template populate_draft_data --latency-ms 20
+python3 app/benchmarks/profile_step_functions.py --lambda-timings results.json --map-items "For each changed draft=5"
+python3 app/benchmarks/profile_step_functions.py --choice "Have readsets for all rgids=Get readsets from rgid list"
+"""
+
+# Standard imports
+import argparse
+import json
+import math
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Local imports
+from orcabus_api_stub import OrcabusApiStub, FIXTURES_PATH
+from run_benchmarks import APP_DIR, get_lambda_names, run_lambda_benchmarks, setup_offline_environment
+
+# Globals
+TEMPLATES_DIR = APP_DIR / "step-functions-templates"
+TEMPLATE_SUFFIX = "_sfn_template.asl.json"
+
+LAMBDA_ARN_PLACEHOLDER_REGEX = re.compile(r"\$\{__(\w+)_lambda_function_arn__}")
+LAMBDA_INVOKE_RESOURCE = "arn:aws:states:::lambda:invoke"
+SSM_RESOURCE_PREFIX = "arn:aws:states:::aws-sdk:ssm:"
+EVENTS_RESOURCE_PREFIX = "arn:aws:states:::events:"
+
+DEFAULT_ITERATIONS = 10
+DEFAULT_INVOKE_OVERHEAD_MS = 15.0
+DEFAULT_SSM_MS = 20.0
+DEFAULT_EVENTS_MS = 30.0
+DEFAULT_TASK_MS = 20.0
+DEFAULT_LAMBDA_MS = 50.0
+DEFAULT_TOP_N = 5
+
+# Guard against loops in the state graph
+MAX_STATE_VISITS = 1000
+
+
+def get_template_names() -> List[str]:
+    return sorted(
+        template_iter_.name[:-len(TEMPLATE_SUFFIX)]
+        for template_iter_ in TEMPLATES_DIR.glob(f"*{TEMPLATE_SUFFIX}")
+    )
+
+
+def load_template(template_name: str) -> Dict[str, Any]:
+    with open(TEMPLATES_DIR / f"{template_name}{TEMPLATE_SUFFIX}") as template_h:
+        return json.load(template_h)
+
+
+def get_lambda_name_from_state(state: Dict[str, Any]) -> Optional[str]:
+    """
+    Get the lambda name from the function arn placeholder of a lambda invoke task
+    :param state:
+    :return:
+    """
+    if state.get("Resource", None) != LAMBDA_INVOKE_RESOURCE:
+        return None
+    match = LAMBDA_ARN_PLACEHOLDER_REGEX.search(json.dumps(state.get("Arguments", state.get("Parameters", {}))))
+    if match is None:
+        return None
+    return match.group(1)
+
+
+def iter_states(states: Dict[str, Any]):
+    """
+    Yield every state, including those nested in Parallel branches and Map item processors
+    :param states:
+    :return:
+    """
+    for state_name, state in states.items():
+        yield state_name, state
+        for branch in state.get("Branches", []):
+            yield from iter_states(branch["States"])
+        item_processor = state.get("ItemProcessor", state.get("Iterator", None))
+        if item_processor is not None:
+            yield from iter_states(item_processor["States"])
+
+
+def get_template_lambda_names(template: Dict[str, Any]) -> List[str]:
+    return sorted(set(filter(
+        lambda lambda_name_iter_: lambda_name_iter_ is not None,
+        map(lambda state_iter_: get_lambda_name_from_state(state_iter_[1]), iter_states(template["States"]))
+    )))
+
+
+def get_lambda_timings_from_results(results_list: List[Dict[str, Any]], stat: str) -> Dict[str, float]:
+    """
+    Take the slowest case of each lambda from a list of benchmark results
+    :param results_list:
+    :param stat: p50Ms or p99Ms
+    :return:
+    """
+    lambda_timings: Dict[str, float] = {}
+    for result in results_list:
+        if 'error' in result:
+            continue
+        lambda_timings[result['lambdaName']] = max(
+            lambda_timings.get(result['lambdaName'], 0.0),
+            result[stat]
+        )
+    return lambda_timings
+
+
+class StateMachineProfiler:
+    """
+    Build the timing trace of a state machine from the time taken by each task
+    """
+
+    def __init__(
+            self,
+            lambda_timings: Dict[str, float],
+            choices: Dict[str, str],
+            map_items: Dict[str, int],
+            invoke_overhead_ms: float = DEFAULT_INVOKE_OVERHEAD_MS,
+            ssm_ms: float = DEFAULT_SSM_MS,
+            events_ms: float = DEFAULT_EVENTS_MS,
+            task_ms: float = DEFAULT_TASK_MS,
+            default_lambda_ms: float = DEFAULT_LAMBDA_MS,
+            transition_ms: float = 0.0,
+    ):
+        self.lambda_timings = lambda_timings
+        self.choices = choices
+        self.map_items = map_items
+        self.invoke_overhead_ms = invoke_overhead_ms
+        self.ssm_ms = ssm_ms
+        self.events_ms = events_ms
+        self.task_ms = task_ms
+        self.default_lambda_ms = default_lambda_ms
+        self.transition_ms = transition_ms
+
+    def get_task_duration(self, state: Dict[str, Any]) -> Tuple[float, str]:
+        """
+        Get the duration of a task state, and what the duration is based on
+        :param state:
+        :return:
+        """
+        lambda_name = get_lambda_name_from_state(state)
+        if lambda_name is not None:
+            if lambda_name in self.lambda_timings:
+                return (
+                    self.lambda_timings[lambda_name] + self.invoke_overhead_ms,
+                    f"lambda {lambda_name} ({self.lambda_timings[lambda_name]:.3f} ms handler)"
+                )
+            return self.default_lambda_ms + self.invoke_overhead_ms, f"lambda {lambda_name} (not measured)"
+
+        resource = state.get("Resource", "")
+        if resource.startswith(SSM_RESOURCE_PREFIX):
+            return self.ssm_ms, f"ssm {resource[len(SSM_RESOURCE_PREFIX):]} (stub)"
+        if resource.startswith(EVENTS_RESOURCE_PREFIX):
+            return self.events_ms, f"events {resource[len(EVENTS_RESOURCE_PREFIX):]} (stub)"
+        return self.task_ms, f"{resource} (stub)"
+
+    def run_states(
+            self,
+            states: Dict[str, Any],
+            start_at: str,
+            start_ms: float,
+            path: str,
+            depth: int,
+    ) -> Tuple[float, List[Dict[str, Any]]]:
+        """
+        Walk the states from start_at, returning the end time and the trace of each state visited
+        :param states:
+        :param start_at:
+        :param start_ms:
+        :param path:
+        :param depth:
+        :return:
+        """
+        trace_list: List[Dict[str, Any]] = []
+        current_ms = start_ms
+        state_name: Optional[str] = start_at
+
+        for _ in range(MAX_STATE_VISITS):
+            if state_name is None:
+                break
+
+            state = states[state_name]
+            state_type = state["Type"]
+            state_path = f"{path}/{state_name}" if path else state_name
+            trace_entry = {
+                "state": state_name,
+                "path": state_path,
+                "type": state_type,
+                "depth": depth,
+                "startMs": current_ms,
+                "durationMs": self.transition_ms,
+                "critical": True,
+                "detail": "",
+            }
+            trace_list.append(trace_entry)
+
+            if state_type == "Choice":
+                next_state_list = list(dict.fromkeys(
+                    list(map(lambda choice_iter_: choice_iter_["Next"], state.get("Choices", []))) +
+                    ([state["Default"]] if "Default" in state else [])
+                ))
+                if state_name in self.choices:
+                    if self.choices[state_name] not in next_state_list:
+                        raise ValueError(
+                            f"'{self.choices[state_name]}' is not a branch of choice state '{state_name}', "
+                            f"expected one of {', '.join(next_state_list)}"
+                        )
+                    next_state_list = [self.choices[state_name]]
+                    trace_entry["detail"] = f"chosen: {next_state_list[0]}"
+
+                # Follow the slowest branch
+                branch_run_list = list(map(
+                    lambda next_state_iter_: self.run_states(
+                        states, next_state_iter_, current_ms + self.transition_ms, path, depth
+                    ),
+                    next_state_list
+                ))
+                slowest_branch_idx = max(range(len(branch_run_list)), key=lambda idx: branch_run_list[idx][0])
+                if state_name not in self.choices:
+                    trace_entry["detail"] = (
+                        f"worst case of {len(next_state_list)}: {next_state_list[slowest_branch_idx]}"
+                    )
+                end_ms, branch_trace_list = branch_run_list[slowest_branch_idx]
+                trace_list.extend(branch_trace_list)
+                return end_ms, trace_list
+
+            if state_type == "Task":
+                task_duration_ms, trace_entry["detail"] = self.get_task_duration(state)
+                trace_entry["durationMs"] += task_duration_ms
+
+            elif state_type == "Parallel":
+                branch_run_list = list(map(
+                    lambda branch_iter_: self.run_states(
+                        branch_iter_["States"], branch_iter_["StartAt"], current_ms, state_path, depth + 1
+                    ),
+                    state["Branches"]
+                ))
+                # Only the first of equally slow branches is on the critical path
+                slowest_branch_idx = max(range(len(branch_run_list)), key=lambda idx: branch_run_list[idx][0])
+                slowest_end_ms = branch_run_list[slowest_branch_idx][0]
+                trace_entry["durationMs"] += slowest_end_ms - current_ms
+                trace_entry["detail"] = "branches: " + ", ".join(map(
+                    lambda branch_run_iter_: f"{branch_run_iter_[0] - current_ms:.1f} ms",
+                    branch_run_list
+                ))
+
+                for branch_idx, (branch_end_ms, branch_trace_list) in enumerate(branch_run_list):
+                    is_slowest_branch = branch_idx == slowest_branch_idx
+                    for branch_trace_entry in branch_trace_list:
+                        branch_trace_entry["critical"] = branch_trace_entry["critical"] and is_slowest_branch
+                    if not is_slowest_branch and branch_trace_list:
+                        branch_trace_list[0]["detail"] = (
+                            f"{branch_trace_list[0]['detail']}, " if branch_trace_list[0]["detail"] else ""
+                        ) + f"slack {slowest_end_ms - branch_end_ms:.1f} ms"
+                    trace_list.extend(branch_trace_list)
+
+            elif state_type == "Map":
+                item_processor = state.get("ItemProcessor", state.get("Iterator"))
+                item_count = self.map_items.get(state_name, 1)
+                max_concurrency = state.get("MaxConcurrency", 0) or 0
+                batch_count = (
+                    math.ceil(item_count / max_concurrency)
+                    if max_concurrency > 0
+                    else min(item_count, 1)
+                )
+                item_end_ms, item_trace_list = self.run_states(
+                    item_processor["States"], item_processor["StartAt"], current_ms, f"{state_path}[0]", depth + 1
+                )
+                trace_entry["durationMs"] += batch_count * (item_end_ms - current_ms)
+                trace_entry["detail"] = (
+                    f"fan-out {item_count} item(s), "
+                    f"max concurrency {max_concurrency if max_concurrency > 0 else 'unbounded'}, "
+                    f"{batch_count} batch(es) of {item_end_ms - current_ms:.1f} ms"
+                )
+                trace_list.extend(item_trace_list)
+
+            elif state_type == "Wait":
+                trace_entry["durationMs"] += float(state.get("Seconds", 0)) * 1000
+                trace_entry["detail"] = "wait"
+
+            current_ms += trace_entry["durationMs"]
+
+            if state_type in ["Succeed", "Fail"] or state.get("End", False):
+                break
+            state_name = state.get("Next", None)
+        else:
+            raise ValueError(f"More than {MAX_STATE_VISITS} states visited from '{start_at}', is there a loop?")
+
+        return current_ms, trace_list
+
+    def profile(self, template: Dict[str, Any]) -> Dict[str, Any]:
+        end_ms, trace_list = self.run_states(template["States"], template["StartAt"], 0.0, "", 0)
+        return {
+            "totalMs": round(end_ms, 3),
+            "trace": list(map(
+                lambda trace_iter_: {
+                    **trace_iter_,
+                    "startMs": round(trace_iter_["startMs"], 3),
+                    "durationMs": round(trace_iter_["durationMs"], 3),
+                },
+                trace_list
+            )),
+        }
+
+
+def get_bottlenecks(trace_list: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+    """
+    The slowest leaf states (tasks) on the critical path
+    :param trace_list:
+    :param top_n:
+    :return:
+    """
+    return sorted(
+        filter(
+            lambda trace_iter_: trace_iter_["critical"] and trace_iter_["type"] == "Task",
+            trace_list
+        ),
+        key=lambda trace_iter_: trace_iter_["durationMs"],
+        reverse=True
+    )[:top_n]
+
+
+def print_profile(template_name: str, profile: Dict[str, Any], top_n: int):
+    print(f"== {template_name}: {profile['totalMs']:.1f} ms end to end")
+    print(f"  {'':1} {'state':<70} {'start ms':>9} {'ms':>9}  detail")
+    for trace_entry in profile["trace"]:
+        state_str = "  " * trace_entry["depth"] + trace_entry["state"]
+        print(
+            f"  {'*' if trace_entry['critical'] else ' ':1} {state_str:<70} "
+            f"{trace_entry['startMs']:>9.1f} {trace_entry['durationMs']:>9.1f}  {trace_entry['detail']}"
+        )
+    bottlenecks_list = get_bottlenecks(profile["trace"], top_n)
+    if bottlenecks_list:
+        print("  Slowest tasks on the critical path")
+        for trace_entry in bottlenecks_list:
+            print(
+                f"    {trace_entry['path']}: {trace_entry['durationMs']:.1f} ms "
+                f"({trace_entry['durationMs'] / profile['totalMs'] * 100 if profile['totalMs'] else 0:.0f}%)"
+            )
+    print()
+
+
+def parse_key_value_list(key_value_list: List[str]) -> Dict[str, str]:
+    return dict(map(
+        lambda key_value_iter_: tuple(map(str.strip, key_value_iter_.rsplit("=", 1))),
+        key_value_list
+    ))
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Profile the step function templates offline")
+    parser.add_argument(
+        "--template", action="append", default=[],
+        help="Only profile this template (i.e populate_draft_data), may be repeated"
+    )
+    parser.add_argument(
+        "--lambda-timings", type=Path, default=None,
+        help="Use the results of a previous run_benchmarks.py --output, rather than replaying the handlers"
+    )
+    parser.add_argument("--stat", choices=["p50Ms", "p99Ms"], default="p50Ms", help="Handler latency statistic")
+    parser.add_argument(
+        "--lambda-ms", action="append", default=[],
+        help="Override the handler latency of a lambda, i.e get_library_context=120"
+    )
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="Invocations per event")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency of each api call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random latency added to each api call")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_PATH, help="OrcaBus api fixtures")
+    parser.add_argument("--invoke-overhead-ms", type=float, default=DEFAULT_INVOKE_OVERHEAD_MS)
+    parser.add_argument("--ssm-ms", type=float, default=DEFAULT_SSM_MS, help="Latency of ssm tasks")
+    parser.add_argument("--events-ms", type=float, default=DEFAULT_EVENTS_MS, help="Latency of eventbridge tasks")
+    parser.add_argument("--task-ms", type=float, default=DEFAULT_TASK_MS, help="Latency of any other task")
+    parser.add_argument(
+        "--default-lambda-ms", type=float, default=DEFAULT_LAMBDA_MS,
+        help="Handler latency of lambdas that could not be measured"
+    )
+    parser.add_argument("--transition-ms", type=float, default=0.0, help="Overhead of each state transition")
+    parser.add_argument(
+        "--choice", action="append", default=[],
+        help="Follow this branch of a choice state rather than the worst case, i.e 'Draft data is valid=Success'"
+    )
+    parser.add_argument(
+        "--map-items", action="append", default=[],
+        help="Number of items of a map state, i.e 'For each changed draft=5' (default 1)"
+    )
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_N, help="Number of bottlenecks to report")
+    parser.add_argument("--json", action="store_true", help="Print the profiles as json")
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    template_name_list = args.template or get_template_names()
+    template_by_name = dict(map(
+        lambda template_name_iter_: (template_name_iter_, load_template(template_name_iter_)),
+        template_name_list
+    ))
+
+    # Time the handlers used by the templates
+    if args.lambda_timings is not None:
+        with open(args.lambda_timings) as lambda_timings_h:
+            lambda_timings = get_lambda_timings_from_results(json.load(lambda_timings_h), args.stat)
+    else:
+        setup_offline_environment()
+        api_stub = OrcabusApiStub.from_fixtures_file(
+            args.fixtures,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+        )
+        results_list = []
+        # Lambdas without recorded events are not timed, their tasks fall back to --default-lambda-ms
+        recorded_lambda_name_list = get_lambda_names()
+        for lambda_name in sorted(set(
+            lambda_name
+            for template in template_by_name.values()
+            for lambda_name in get_template_lambda_names(template)
+        )):
+            if lambda_name not in recorded_lambda_name_list:
+                print(
+                    f"No recorded events for {lambda_name}, using --default-lambda-ms ({args.default_lambda_ms} ms)",
+                    file=sys.stderr
+                )
+                continue
+            results_list.extend(run_lambda_benchmarks(lambda_name, api_stub, args.iterations, warm_cache=False))
+        for result in filter(lambda result_iter_: 'error' in result_iter_, results_list):
+            print(
+                f"Could not time {result['lambdaName']} / {result['caseName']}: {result['error']}",
+                file=sys.stderr
+            )
+        lambda_timings = get_lambda_timings_from_results(results_list, args.stat)
+
+    lambda_timings.update(dict(map(
+        lambda lambda_ms_iter_: (lambda_ms_iter_[0], float(lambda_ms_iter_[1])),
+        parse_key_value_list(args.lambda_ms).items()
+    )))
+
+    profiler = StateMachineProfiler(
+        lambda_timings=lambda_timings,
+        choices=parse_key_value_list(args.choice),
+        map_items=dict(map(
+            lambda map_items_iter_: (map_items_iter_[0], int(map_items_iter_[1])),
+            parse_key_value_list(args.map_items).items()
+        )),
+        invoke_overhead_ms=args.invoke_overhead_ms,
+        ssm_ms=args.ssm_ms,
+        events_ms=args.events_ms,
+        task_ms=args.task_ms,
+        default_lambda_ms=args.default_lambda_ms,
+        transition_ms=args.transition_ms,
+    )
+
+    profiles_by_template = {
+        template_name: profiler.profile(template)
+        for template_name, template in template_by_name.items()
+    }
+
+    if args.json:
+        print(json.dumps(profiles_by_template, indent=2))
+        return
+
+    for template_name, profile in profiles_by_template.items():
+        print_profile(template_name, profile, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+
+"""
+Replay synthetic bursts of ICAv2 WES state change events, with and without coalescing
+
+For each of n analyses we generate the state changes an ICAv2 analysis emits
+(SUBMITTED, QUEUED, INITIALIZING, PREPARING_INPUTS, IN_PROGRESS, then GENERATING_OUTPUTS and SUCCEEDED / FAILED),
+each burst spread over a few seconds, with a fraction of events delayed (arriving out of order)
+and a fraction delivered twice (EventBridge delivers at least once).
+
+The events are then converted
+  * without coalescing: every event goes through convert_icav2_wes_event_to_wrsc_event,
+    as it did when the state machine was the event rule target
+  * with coalescing: events are queued on a local SQS stand-in (local_queue.py) and drained in batches
+    through coalesce_icav2_wes_state_change_events, which starts the conversion for each remaining event
+
+Both runs are against the local OrcaBus api stand-in (orcabus_api_stub.py), with one synthetic workflow run per analysis.
+
+For each run we report the workflow manager api calls, the WRSC events emitted,
+and the number of those WRSC events that would move a workflow run backwards (i.e RUNNING after SUCCEEDED).
+
+Usage:
+
+python3 app/benchmarks/replay_icav2_wes_bursts.py --analyses 500
+python3 app/benchmarks/replay_icav2_wes_bursts.py --analyses 200 --delayed-fraction 0.3 --latency-ms 5 --json
+"""
+
+# Standard imports
+import argparse
+import json
+import random
+import time
+from copy import deepcopy
+from typing import Any, Dict, List, Tuple
+
+# Local imports
+from local_queue import LocalQueue, DEFAULT_BATCH_SIZE, DEFAULT_BATCHING_WINDOW_MS
+from orcabus_api_stub import OrcabusApiStub, FIXTURES_PATH
+from run_benchmarks import clear_layer_caches, load_handler_module, setup_offline_environment, unload_layer_modules
+
+# Globals
+STARTUP_STATUS_LIST = ["SUBMITTED", "QUEUED", "INITIALIZING", "PREPARING_INPUTS", "IN_PROGRESS"]
+COMPLETION_STATUS_LIST = ["GENERATING_OUTPUTS"]
+
+COALESCE_LAMBDA_NAME = "coalesce_icav2_wes_state_change_events"
+CONVERT_LAMBDA_NAME = "convert_icav2_wes_event_to_wrsc_event"
+
+DEFAULT_ANALYSES = 300
+DEFAULT_BURST_SPREAD_MS = 3000
+DEFAULT_RUN_DURATION_MS = 600000
+DEFAULT_ARRIVAL_SPREAD_MS = 300000
+DEFAULT_DELAYED_FRACTION = 0.1
+DEFAULT_MAX_DELAY_MS = 30000
+DEFAULT_DUPLICATE_FRACTION = 0.05
+DEFAULT_FAILED_FRACTION = 0.1
+
+
+def get_synthetic_fixtures(fixtures: Dict[str, Any], portal_run_id_list: List[str]) -> Dict[str, Any]:
+    """
+    Clone the first workflow run (and its payload) in the fixtures for each synthetic portal run id
+    :param fixtures:
+    :param portal_run_id_list:
+    :return:
+    """
+    template_workflow_run = fixtures['workflowRuns'][0]
+    template_payload = fixtures['payloads'][template_workflow_run['portalRunId']]
+
+    synthetic_fixtures = deepcopy(fixtures)
+    for idx, portal_run_id in enumerate(portal_run_id_list):
+        workflow_run = deepcopy(template_workflow_run)
+        workflow_run['orcabusId'] = f"wfr.SYNTHETIC{idx:016d}"
+        workflow_run['portalRunId'] = portal_run_id
+        workflow_run['workflowRunName'] = workflow_run['workflowRunName'].replace(
+            template_workflow_run['portalRunId'], portal_run_id
+        )
+        synthetic_fixtures['workflowRuns'].append(workflow_run)
+        synthetic_fixtures['payloads'][portal_run_id] = deepcopy(template_payload)
+
+    return synthetic_fixtures
+
+
+def get_icav2_wes_event(portal_run_id: str, status: str) -> Dict[str, Any]:
+    return {
+        "id": f"iwa.{portal_run_id.upper()}",
+        "name": f"umccr--automated--arriba-wgts-rna--2-5-0--{portal_run_id}",
+        "tags": {
+            "portalRunId": portal_run_id,
+        },
+        "status": status,
+    }
+
+
+def generate_bursts(
+        portal_run_id_list: List[str],
+        burst_spread_ms: int,
+        run_duration_ms: int,
+        arrival_spread_ms: int,
+        delayed_fraction: float,
+        max_delay_ms: int,
+        duplicate_fraction: float,
+        failed_fraction: float,
+        seed: int,
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Generate the (sent timestamp ms, event) list for every analysis, in sent timestamp order
+    :return:
+    """
+    rand = random.Random(seed)
+
+    timed_event_list = []
+    for portal_run_id in portal_run_id_list:
+        start_timestamp = rand.randint(0, arrival_spread_ms)
+        terminal_status = "FAILED" if rand.random() < failed_fraction else "SUCCEEDED"
+
+        status_timestamp_list = []
+        for burst_start, status_list in [
+            (start_timestamp, STARTUP_STATUS_LIST),
+            (start_timestamp + run_duration_ms, COMPLETION_STATUS_LIST + [terminal_status]),
+        ]:
+            offset_list = sorted(rand.randint(0, burst_spread_ms) for _ in status_list)
+            status_timestamp_list.extend(zip(
+                status_list,
+                map(lambda offset_iter_: burst_start + offset_iter_, offset_list)
+            ))
+
+        for status, timestamp in status_timestamp_list:
+            if rand.random() < delayed_fraction:
+                timestamp += rand.randint(1, max_delay_ms)
+            timed_event_list.append((timestamp, get_icav2_wes_event(portal_run_id, status)))
+            if rand.random() < duplicate_fraction:
+                timed_event_list.append((
+                    timestamp + rand.randint(0, 1000),
+                    get_icav2_wes_event(portal_run_id, status)
+                ))
+
+    return sorted(timed_event_list, key=lambda timed_event_iter_: timed_event_iter_[0])
+
+
+class WrscEventRecorder:
+    """
+    Record the WRSC events emitted, and count those that move a workflow run backwards
+    """
+
+    def __init__(self, status_rank: Dict[str, int]):
+        self.status_rank = status_rank
+        self.wrsc_event_count = 0
+        self.backwards_wrsc_event_count = 0
+        self._last_rank_by_portal_run_id: Dict[str, int] = {}
+
+    def record(self, wrsc_event: Dict[str, Any]):
+        portal_run_id = wrsc_event['portalRunId']
+        rank = self.status_rank[wrsc_event['status']]
+        last_rank = self._last_rank_by_portal_run_id.get(portal_run_id, None)
+
+        self.wrsc_event_count += 1
+        if last_rank is not None and rank <= last_rank:
+            self.backwards_wrsc_event_count += 1
+        else:
+            self._last_rank_by_portal_run_id[portal_run_id] = rank
+
+
+def get_workflow_api_calls(api_stub: OrcabusApiStub) -> int:
+    return sum(
+        count
+        for func_name, count in api_stub.get_calls().items()
+        if func_name.startswith("workflow.")
+    )
+
+
+def replay_without_coalescing(
+        convert_module: Any,
+        api_stub: OrcabusApiStub,
+        timed_event_list: List[Tuple[int, Dict[str, Any]]],
+        status_rank: Dict[str, int],
+) -> Dict[str, Any]:
+    recorder = WrscEventRecorder(status_rank)
+    api_stub.reset_calls()
+    # Each run starts from a cold container
+    clear_layer_caches()
+
+    start_time = time.perf_counter()
+    for _, icav2_wes_event in timed_event_list:
+        response = convert_module.handler({"icav2WesStateChangeEvent": deepcopy(icav2_wes_event)}, None)
+        recorder.record(response['workflowRunStateChangeEvent'])
+
+    return {
+        "mode": "withoutCoalescing",
+        "stateChangeEvents": len(timed_event_list),
+        "conversions": len(timed_event_list),
+        "workflowApiCalls": get_workflow_api_calls(api_stub),
+        "wrscEvents": recorder.wrsc_event_count,
+        "backwardsWrscEvents": recorder.backwards_wrsc_event_count,
+        "handlerSeconds": round(time.perf_counter() - start_time, 3),
+    }
+
+
+def replay_with_coalescing(
+        coalesce_module: Any,
+        convert_module: Any,
+        api_stub: OrcabusApiStub,
+        timed_event_list: List[Tuple[int, Dict[str, Any]]],
+        status_rank: Dict[str, int],
+        batch_size: int,
+        batching_window_ms: int,
+) -> Dict[str, Any]:
+    recorder = WrscEventRecorder(status_rank)
+    api_stub.reset_calls()
+    # Each run starts from a cold container
+    clear_layer_caches()
+
+    conversion_count = 0
+
+    # The state machine runs the conversion lambda, then puts the WRSC event
+    def _start_conversion(icav2_wes_event: Dict[str, Any]):
+        nonlocal conversion_count
+        response = convert_module.handler({"icav2WesStateChangeEvent": deepcopy(icav2_wes_event)}, None)
+        conversion_count += 1
+        recorder.record(response['workflowRunStateChangeEvent'])
+
+    coalesce_module.start_conversion = _start_conversion
+
+    local_queue = LocalQueue(batch_size=batch_size, batching_window_ms=batching_window_ms)
+    local_queue.send_messages(
+        list(map(lambda timed_event_iter_: timed_event_iter_[1], timed_event_list)),
+        list(map(lambda timed_event_iter_: timed_event_iter_[0], timed_event_list)),
+    )
+
+    batch_count = 0
+    start_time = time.perf_counter()
+    while True:
+        batch = local_queue.receive_batch()
+        if batch is None:
+            break
+        batch_count += 1
+        try:
+            response = coalesce_module.handler(batch, None)
+        except Exception:
+            response = None
+        local_queue.complete_batch(batch, response)
+
+    return {
+        "mode": "withCoalescing",
+        "stateChangeEvents": len(timed_event_list),
+        "batches": batch_count,
+        "conversions": conversion_count,
+        "workflowApiCalls": get_workflow_api_calls(api_stub),
+        "wrscEvents": recorder.wrsc_event_count,
+        "backwardsWrscEvents": recorder.backwards_wrsc_event_count,
+        "deadLetteredMessages": len(local_queue.dead_letter_messages),
+        "handlerSeconds": round(time.perf_counter() - start_time, 3),
+    }
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Replay synthetic ICAv2 WES state change bursts with and without coalescing")
+    parser.add_argument("--analyses", type=int, default=DEFAULT_ANALYSES, help="Number of analyses")
+    parser.add_argument("--burst-spread-ms", type=int, default=DEFAULT_BURST_SPREAD_MS, help="Spread of each burst")
+    parser.add_argument(
+        "--run-duration-ms", type=int, default=DEFAULT_RUN_DURATION_MS,
+        help="Time between the startup and the completion burst of an analysis"
+    )
+    parser.add_argument(
+        "--arrival-spread-ms", type=int, default=DEFAULT_ARRIVAL_SPREAD_MS,
+        help="Analyses are started uniformly over this period"
+    )
+    parser.add_argument(
+        "--delayed-fraction", type=float, default=DEFAULT_DELAYED_FRACTION,
+        help="Fraction of events that are delayed (and may arrive out of order)"
+    )
+    parser.add_argument("--max-delay-ms", type=int, default=DEFAULT_MAX_DELAY_MS, help="Maximum delay of a delayed event")
+    parser.add_argument(
+        "--duplicate-fraction", type=float, default=DEFAULT_DUPLICATE_FRACTION,
+        help="Fraction of events that are delivered twice"
+    )
+    parser.add_argument(
+        "--failed-fraction", type=float, default=DEFAULT_FAILED_FRACTION,
+        help="Fraction of analyses that end in FAILED"
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Queue batch size")
+    parser.add_argument(
+        "--batching-window-ms", type=int, default=DEFAULT_BATCHING_WINDOW_MS,
+        help="Queue batching (coalescing) window"
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency of each api call")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--json", action="store_true", help="Print the results as json")
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    setup_offline_environment()
+
+    portal_run_id_list = list(map(
+        lambda idx_iter_: f"20250901{idx_iter_:08x}",
+        range(args.analyses)
+    ))
+
+    with open(FIXTURES_PATH) as fixtures_h:
+        fixtures = get_synthetic_fixtures(json.load(fixtures_h), portal_run_id_list)
+
+    timed_event_list = generate_bursts(
+        portal_run_id_list,
+        burst_spread_ms=args.burst_spread_ms,
+        run_duration_ms=args.run_duration_ms,
+        arrival_spread_ms=args.arrival_spread_ms,
+        delayed_fraction=args.delayed_fraction,
+        max_delay_ms=args.max_delay_ms,
+        duplicate_fraction=args.duplicate_fraction,
+        failed_fraction=args.failed_fraction,
+        seed=args.seed,
+    )
+
+    api_stub = OrcabusApiStub(fixtures, latency_ms=args.latency_ms, seed=args.seed)
+
+    with api_stub.installed():
+        unload_layer_modules()
+        convert_module = load_handler_module(CONVERT_LAMBDA_NAME)
+        coalesce_module = load_handler_module(COALESCE_LAMBDA_NAME)
+        api_stub.attach()
+
+        from arriba_wgts_rna_tools.coalesce import ICAV2_WES_STATUS_RANK
+
+        results_list = [
+            replay_without_coalescing(convert_module, api_stub, timed_event_list, ICAV2_WES_STATUS_RANK),
+            replay_with_coalescing(
+                coalesce_module, convert_module, api_stub, timed_event_list, ICAV2_WES_STATUS_RANK,
+                batch_size=args.batch_size,
+                batching_window_ms=args.batching_window_ms,
+            ),
+        ]
+        unload_layer_modules()
+
+    reduction = results_list[0]['workflowApiCalls'] / max(1, results_list[1]['workflowApiCalls'])
+
+    if args.json:
+        print(json.dumps({"results": results_list, "workflowApiCallReduction": round(reduction, 2)}, indent=2))
+        return
+
+    print(f"{'mode':<20} {'events':>7} {'conversions':>12} {'wf api calls':>13} {'wrsc':>6} {'backwards':>10} {'seconds':>8}")
+    for result in results_list:
+        print(
+            f"{result['mode']:<20} {result['stateChangeEvents']:>7} {result['conversions']:>12} "
+            f"{result['workflowApiCalls']:>13} {result['wrscEvents']:>6} {result['backwardsWrscEvents']:>10} "
+            f"{result['handlerSeconds']:>8.3f}"
+        )
+    print(f"workflow api call reduction: {reduction:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
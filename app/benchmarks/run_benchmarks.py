@@ -0,0 +1,661 @@
+#!/usr/bin/env python3
+
+"""
+Offline benchmarks for the python lambda handlers
+
+Replays the recorded events in events/<lambda_name>.json through each lambda handler,
+against the local OrcaBus api stand-in (orcabus_api_stub.py) with injectable latency.
+
+For each (lambda, event) case we report
+  * p50 / p99 handler latency (ms)
+  * api calls per invocation (total, and by api function)
+  * peak python memory allocated during an invocation (KiB, via tracemalloc)
+
+Layer caches (MemoisingCache instances in arriba_wgts_rna_tools) are cleared between invocations
+so that each invocation is measured as if it were the first in a new container,
+use --warm-cache to keep them (and measure warm invocations instead),
+invocation scoped caches (i.e the latest payload) are still cleared by each handler on entry.
+
+Some lambdas also have conversion cases, which time the lambda's conversion functions on synthetic inputs
+against a copy of the implementation they replaced (the outputs are checked to match before timing),
+i.e snake_case key conversion on large and deeply nested inputs for convert_ready_event_inputs_to_icav2_wes_event_inputs,
+and its compiled cwl input mapping against the previous hand-written conversion (on the recorded events).
+Conversion cases make no api calls, and are not used by the step function profiler.
+
+Results may be written out with --output and compared to a previous run with --baseline,
+the exit code is 1 if any case regresses past the tolerance (latency) or makes more api calls.
+
+Usage:
+
+python3 app/benchmarks/run_benchmarks.py --iterations 50 --latency-ms 20 --jitter-ms 5
+python3 app/benchmarks/run_benchmarks.py --lambda-name find_latest_workflow --output results.json
+python3 app/benchmarks/run_benchmarks.py --baseline results.json --tolerance 0.2
+
+Third party packages required by the handlers (i.e jsonschema for validate_draft_data_complete_schema)
+must be installed in the current environment, orcabus_api_tools is not required
+(the layer makes its own api requests, which the stand-in serves).
+"""
+
+# Standard imports
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+from functools import partial
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Local imports
+from orcabus_api_stub import OrcabusApiStub, FIXTURES_PATH
+
+# Globals
+BENCHMARKS_DIR = Path(__file__).absolute().parent
+APP_DIR = BENCHMARKS_DIR.parent
+LAMBDAS_DIR = APP_DIR / "lambdas"
+LAYERS_DIR = APP_DIR / "layers"
+EVENTS_DIR = BENCHMARKS_DIR / "events"
+LAMBDA_DIR_SUFFIX = "_py"
+LAYER_PACKAGE_NAME = "arriba_wgts_rna_tools"
+
+DEFAULT_ITERATIONS = 20
+DEFAULT_TOLERANCE = 0.2
+
+# Conversion cases
+CONVERT_READY_EVENT_INPUTS_LAMBDA_NAME = "convert_ready_event_inputs_to_icav2_wes_event_inputs"
+LARGE_INPUTS_ROW_COUNT = 5000
+# Well past the default recursion limit
+DEEP_INPUTS_DEPTH = 10000
+PREVIOUS_REFERENCE_FILE_KEYS = [
+    "referenceFasta",
+    "annotationGtf",
+    "cytobandsTsv",
+    "proteinDomainsGff3",
+    "blacklistTsv",
+]
+
+# Environment required by handlers to run offline
+OFFLINE_ENVIRONMENT = {
+    "LOCAL_SCHEMA_PATH": str(APP_DIR / "event-schemas" / "complete-data-draft-schema.json"),
+    # Keep the EMF metric log lines out of the benchmark output
+    "HANDLER_METRICS_MODE": "off",
+}
+
+
+def get_percentile(values_list: List[float], percentile: float) -> float:
+    """
+    Nearest rank percentile
+    :param values_list:
+    :param percentile:
+    :return:
+    """
+    sorted_values_list = sorted(values_list)
+    rank = max(1, int(round(percentile / 100 * len(sorted_values_list) + 0.5)))
+    return sorted_values_list[min(rank, len(sorted_values_list)) - 1]
+
+
+def get_event_cases(lambda_name: str) -> List[Dict[str, Any]]:
+    with open(EVENTS_DIR / f"{lambda_name}.json") as events_h:
+        return json.load(events_h)
+
+
+def get_lambda_names() -> List[str]:
+    return sorted(
+        events_file_iter_.stem
+        for events_file_iter_ in EVENTS_DIR.glob("*.json")
+    )
+
+
+def load_handler_module(lambda_name: str) -> ModuleType:
+    """
+    Import the handler module from its lambda directory, under a unique module name
+    so handlers are isolated from each other
+    :param lambda_name:
+    :return:
+    """
+    module_path = LAMBDAS_DIR / f"{lambda_name}{LAMBDA_DIR_SUFFIX}" / f"{lambda_name}.py"
+    spec = importlib.util.spec_from_file_location(f"benchmark_{lambda_name}", module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def unload_layer_modules():
+    """
+    Drop the layer modules so that each lambda binds to a fresh copy (and the current api stub)
+    :return:
+    """
+    for module_name in list(sys.modules):
+        if module_name == LAYER_PACKAGE_NAME or module_name.startswith(f"{LAYER_PACKAGE_NAME}."):
+            del sys.modules[module_name]
+
+
+def clear_layer_caches():
+    """
+    Invalidate every memoising cache in the layer modules
+    :return:
+    """
+    cache_module = sys.modules.get(f"{LAYER_PACKAGE_NAME}.cache", None)
+    if cache_module is None:
+        return
+    for module_name, module in list(sys.modules.items()):
+        if not module_name.startswith(f"{LAYER_PACKAGE_NAME}."):
+            continue
+        for attr_value in list(vars(module).values()):
+            if isinstance(attr_value, cache_module.MemoisingCache):
+                attr_value.invalidate()
+
+
+def run_case(
+        handler_module: ModuleType,
+        api_stub: OrcabusApiStub,
+        event: Dict[str, Any],
+        iterations: int,
+        warm_cache: bool,
+) -> Dict[str, Any]:
+    """
+    Run the event through the handler n times, then once more under tracemalloc for the peak memory.
+    Events are deep-copied per invocation as some handlers update the event in place.
+    :param handler_module:
+    :param api_stub:
+    :param event:
+    :param iterations:
+    :param warm_cache:
+    :return:
+    """
+    durations_ms_list = []
+    calls_list = []
+
+    for _ in range(iterations):
+        if not warm_cache:
+            clear_layer_caches()
+        event_copy = deepcopy(event)
+        api_stub.reset_calls()
+        start_time = time.perf_counter()
+        handler_module.handler(event_copy, None)
+        durations_ms_list.append((time.perf_counter() - start_time) * 1000)
+        calls_list.append(api_stub.get_calls())
+
+    # Peak memory, measured separately as tracemalloc slows down every allocation
+    if not warm_cache:
+        clear_layer_caches()
+    event_copy = deepcopy(event)
+    tracemalloc.start()
+    try:
+        handler_module.handler(event_copy, None)
+        _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    calls_by_function: Dict[str, float] = {}
+    for calls_iter_ in calls_list:
+        for func_name, count in calls_iter_.items():
+            calls_by_function[func_name] = calls_by_function.get(func_name, 0) + count / iterations
+
+    return {
+        "iterations": iterations,
+        "p50Ms": round(get_percentile(durations_ms_list, 50), 3),
+        "p99Ms": round(get_percentile(durations_ms_list, 99), 3),
+        "apiCallsPerInvocation": round(sum(calls_by_function.values()), 2),
+        "apiCallsByFunction": dict(sorted(
+            (func_name, round(count, 2))
+            for func_name, count in calls_by_function.items()
+        )),
+        "peakMemoryKiB": round(peak_memory_bytes / 1024, 1),
+    }
+
+
+def run_lambda_benchmarks(
+        lambda_name: str,
+        api_stub: OrcabusApiStub,
+        iterations: int,
+        warm_cache: bool,
+) -> List[Dict[str, Any]]:
+    results_list = []
+    with api_stub.installed():
+        unload_layer_modules()
+        try:
+            handler_module = load_handler_module(lambda_name)
+            api_stub.attach()
+        except Exception as e:
+            return [{
+                "lambdaName": lambda_name,
+                "caseName": None,
+                "error": f"Could not import handler: {e.__class__.__name__}: {e}",
+            }]
+
+        for case in get_event_cases(lambda_name):
+            try:
+                result = run_case(handler_module, api_stub, case['event'], iterations, warm_cache)
+            except Exception as e:
+                result = {"error": f"{e.__class__.__name__}: {e}"}
+            results_list.append({
+                "lambdaName": lambda_name,
+                "caseName": case['name'],
+                **result,
+            })
+        unload_layer_modules()
+    return results_list
+
+
+def run_function_case(
+        func: Callable[[Any], Any],
+        get_input: Callable[[], Any],
+        iterations: int,
+) -> Dict[str, Any]:
+    """
+    Run the function n times, then once more under tracemalloc for the peak memory.
+    Each call gets a fresh input, built outside of the timed section, as some functions update their input in place.
+    :param func:
+    :param get_input:
+    :param iterations:
+    :return:
+    """
+    durations_ms_list = []
+
+    for _ in range(iterations):
+        func_input = get_input()
+        start_time = time.perf_counter()
+        func(func_input)
+        durations_ms_list.append((time.perf_counter() - start_time) * 1000)
+
+    func_input = get_input()
+    tracemalloc.start()
+    try:
+        func(func_input)
+        _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50Ms": round(get_percentile(durations_ms_list, 50), 3),
+        "p99Ms": round(get_percentile(durations_ms_list, 99), 3),
+        "apiCallsPerInvocation": 0,
+        "apiCallsByFunction": {},
+        "peakMemoryKiB": round(peak_memory_bytes / 1024, 1),
+    }
+
+
+def previous_to_snake_case(s: str) -> str:
+    """
+    Copy of the key conversion before it was memoised
+    :param s:
+    :return:
+    """
+    return ''.join(['_' + c.lower() if c.isupper() else c for c in s]).lstrip('_')
+
+
+def previous_recursive_snake_case(d: Any) -> Any:
+    """
+    Copy of the recursive key conversion, before the traversal was made iterative
+    :param d:
+    :return:
+    """
+    if not isinstance(d, dict) and not isinstance(d, list):
+        return d
+
+    if isinstance(d, dict):
+        return {previous_to_snake_case(k): previous_recursive_snake_case(v) for k, v in d.items()}
+
+    return [previous_recursive_snake_case(item) for item in d]
+
+
+def get_large_inputs() -> Dict[str, Any]:
+    """
+    Large nested (camelCase) inputs, one fastq list row per lane
+    :return:
+    """
+    return {
+        "sampleName": "L2500373",
+        "fastqListRows": [
+            {
+                "rgId": f"CTGCTTCC+GATCTATC.{lane_iter_}.250328_A01052_0258_AHFGM7DSXF",
+                "read1FileUri": {"class": "File", "location": f"s3://bucket/path/L{lane_iter_}_R1.fastq.ora"},
+                "read2FileUri": {"class": "File", "location": f"s3://bucket/path/L{lane_iter_}_R2.fastq.ora"},
+                "qcMetrics": {"insertSizeEstimate": 286, "duplicateFractionEstimate": 0.26},
+            }
+            for lane_iter_ in range(LARGE_INPUTS_ROW_COUNT)
+        ],
+    }
+
+
+def get_deep_inputs() -> Dict[str, Any]:
+    """
+    Deeply nested inputs, the recursive key conversion fails on these with a RecursionError
+    :return:
+    """
+    deep_inputs = current = {}
+    for _ in range(DEEP_INPUTS_DEPTH):
+        current["childNode"] = {}
+        current = current["childNode"]
+    return deep_inputs
+
+
+def check_key_conversion(handler_module: ModuleType):
+    """
+    The key conversion must match the previous recursive conversion, in both modes (and in key order)
+    :param handler_module:
+    :return:
+    """
+    expected_json_str = json.dumps(previous_recursive_snake_case(get_large_inputs()))
+    if json.dumps(handler_module.snake_case_keys(get_large_inputs())) != expected_json_str:
+        raise AssertionError("snake_case_keys does not match the previous key conversion")
+    if json.dumps(handler_module.snake_case_keys(get_large_inputs(), in_place=True)) != expected_json_str:
+        raise AssertionError("snake_case_keys (in place) does not match the previous key conversion")
+
+
+def get_key_conversion_cases(handler_module: ModuleType) -> List[Tuple[str, Callable[[Any], Any], Callable[[], Any]]]:
+    """
+    Key conversion cases, as (case name, function, input factory),
+    the deeply nested cases fail with a RecursionError if the traversal is ever made recursive again
+    :param handler_module:
+    :return:
+    """
+    snake_case_keys = handler_module.snake_case_keys
+    snake_case_large_inputs = previous_recursive_snake_case(get_large_inputs())
+
+    return [
+        ("key conversion, large nested (previous recursive)", previous_recursive_snake_case, get_large_inputs),
+        ("key conversion, large nested (copy)", snake_case_keys, get_large_inputs),
+        ("key conversion, large nested (in place)", partial(snake_case_keys, in_place=True), get_large_inputs),
+        (
+            # i.e a replayed event
+            "key conversion, large nested, already snake_case (in place)",
+            partial(snake_case_keys, in_place=True), partial(deepcopy, snake_case_large_inputs)
+        ),
+        ("key conversion, deeply nested (copy)", snake_case_keys, get_deep_inputs),
+        ("key conversion, deeply nested (in place)", partial(snake_case_keys, in_place=True), get_deep_inputs),
+    ]
+
+
+def previous_cwlify_file(file_uri: str) -> Dict[str, str]:
+    return {
+        "class": "File",
+        "location": file_uri
+    }
+
+
+def previous_convert_ready_event_inputs_handler(event, context) -> Dict[str, Any]:
+    """
+    Copy of the hand-written ready event inputs conversion, before it was driven by the cwl input mapping spec,
+    the event inputs are updated in place
+    :param event:
+    :param context:
+    :return:
+    """
+    inputs = event['inputs']
+
+    # cwl-ify the inputs
+    inputs['alignmentData'] = (
+        {k: previous_cwlify_file(v) for k, v in inputs['alignmentData'].items()}
+    )
+
+    # cwl-ify the reference data
+    for key in PREVIOUS_REFERENCE_FILE_KEYS:
+        if key not in inputs:
+            continue
+        inputs[key] = previous_cwlify_file(inputs[key])
+
+    inputs = previous_recursive_snake_case(inputs)
+
+    # Add in the bam index
+    if 'bam_input' in inputs.get('alignment_data', {}):
+        bam_input = inputs['alignment_data']['bam_input']
+        bam_index = bam_input['location'] + '.bai'
+        bam_input['secondaryFiles'] = [previous_cwlify_file(bam_index)]
+        inputs['alignment_data']['bam_input'] = bam_input
+
+    # Add the fai index
+    if 'reference_fasta' in inputs:
+        reference_fasta = inputs['reference_fasta']
+        reference_fai = reference_fasta['location'] + '.fai'
+        reference_fasta['secondaryFiles'] = [previous_cwlify_file(reference_fai)]
+        inputs['reference_fasta'] = reference_fasta
+
+    # Return the inputs
+    return {
+        "inputs": inputs
+    }
+
+
+def check_cwl_input_conversion(handler_module: ModuleType):
+    """
+    The compiled cwl input mapping must match the previous hand-written conversion on every recorded event
+    :param handler_module:
+    :return:
+    """
+    for case in get_event_cases(CONVERT_READY_EVENT_INPUTS_LAMBDA_NAME):
+        if (
+                json.dumps(handler_module.handler(deepcopy(case['event']), None)) !=
+                json.dumps(previous_convert_ready_event_inputs_handler(deepcopy(case['event']), None))
+        ):
+            raise AssertionError(f"The compiled cwl input mapping does not match the previous conversion for {case['name']}")
+
+
+def get_cwl_input_conversion_cases(handler_module: ModuleType) -> List[Tuple[str, Callable[[Any], Any], Callable[[], Any]]]:
+    """
+    Cwl input conversion cases for each recorded event, as (case name, function, input factory),
+    both conversions update the event, so each call gets its own copy (as each lambda invocation does)
+    :param handler_module:
+    :return:
+    """
+    cases_list = []
+    for case in get_event_cases(CONVERT_READY_EVENT_INPUTS_LAMBDA_NAME):
+        get_event = partial(deepcopy, case['event'])
+        cases_list.extend([
+            (
+                f"cwl input conversion, {case['name']} (previous hand-written)",
+                partial(previous_convert_ready_event_inputs_handler, context=None), get_event
+            ),
+            (
+                f"cwl input conversion, {case['name']} (compiled mapping)",
+                partial(handler_module.handler, context=None), get_event
+            ),
+        ])
+    return cases_list
+
+
+# Conversion checks and cases by lambda name
+CONVERSION_BENCHMARKS: Dict[str, List[Tuple[
+    Callable[[ModuleType], None],
+    Callable[[ModuleType], List[Tuple[str, Callable[[Any], Any], Callable[[], Any]]]]
+]]] = {
+    CONVERT_READY_EVENT_INPUTS_LAMBDA_NAME: [
+        (check_key_conversion, get_key_conversion_cases),
+        (check_cwl_input_conversion, get_cwl_input_conversion_cases),
+    ],
+}
+
+
+def run_conversion_benchmarks(lambda_name: str, iterations: int) -> List[Dict[str, Any]]:
+    """
+    Run the conversion cases of a lambda, each group of cases is only timed if its check passes
+    :param lambda_name:
+    :param iterations:
+    :return:
+    """
+    if lambda_name not in CONVERSION_BENCHMARKS:
+        return []
+
+    results_list = []
+    unload_layer_modules()
+    try:
+        handler_module = load_handler_module(lambda_name)
+    except Exception as e:
+        return [{
+            "lambdaName": lambda_name,
+            "caseName": None,
+            "error": f"Could not import handler: {e.__class__.__name__}: {e}",
+        }]
+
+    for check_func, get_cases_func in CONVERSION_BENCHMARKS[lambda_name]:
+        try:
+            check_func(handler_module)
+        except Exception as e:
+            results_list.append({
+                "lambdaName": lambda_name,
+                "caseName": check_func.__name__,
+                "error": f"{e.__class__.__name__}: {e}",
+            })
+            continue
+
+        for case_name, func, get_input in get_cases_func(handler_module):
+            try:
+                result = run_function_case(func, get_input, iterations)
+            except Exception as e:
+                result = {"error": f"{e.__class__.__name__}: {e}"}
+            results_list.append({
+                "lambdaName": lambda_name,
+                "caseName": case_name,
+                **result,
+            })
+    unload_layer_modules()
+    return results_list
+
+
+def compare_to_baseline(
+        results_list: List[Dict[str, Any]],
+        baseline_results_list: List[Dict[str, Any]],
+        tolerance: float,
+) -> List[str]:
+    """
+    Get the list of regressions against the baseline,
+    the p50 latency may not exceed the baseline by more than the tolerance
+    and the number of api calls may not increase
+    :param results_list:
+    :param baseline_results_list:
+    :param tolerance:
+    :return:
+    """
+    baseline_results_by_case = {
+        (baseline_iter_['lambdaName'], baseline_iter_['caseName']): baseline_iter_
+        for baseline_iter_ in baseline_results_list
+        if 'error' not in baseline_iter_
+    }
+
+    regressions_list = []
+    for result in results_list:
+        baseline_result = baseline_results_by_case.get((result['lambdaName'], result['caseName']), None)
+        if baseline_result is None or 'error' in result:
+            continue
+        case_str = f"{result['lambdaName']} / {result['caseName']}"
+        if result['p50Ms'] > baseline_result['p50Ms'] * (1 + tolerance):
+            regressions_list.append(
+                f"{case_str}: p50 {result['p50Ms']} ms, baseline {baseline_result['p50Ms']} ms"
+            )
+        if result['apiCallsPerInvocation'] > baseline_result['apiCallsPerInvocation']:
+            regressions_list.append(
+                f"{case_str}: {result['apiCallsPerInvocation']} api calls, "
+                f"baseline {baseline_result['apiCallsPerInvocation']}"
+            )
+    return regressions_list
+
+
+def print_results(results_list: List[Dict[str, Any]]):
+    case_width = max([75] + [
+        len(f"{result_iter_['lambdaName']} / {result_iter_['caseName']}")
+        for result_iter_ in results_list
+    ])
+    print(f"{'lambda / case':<{case_width}} {'p50 ms':>9} {'p99 ms':>9} {'calls':>6} {'peak KiB':>9}")
+    for result in results_list:
+        case_str = f"{result['lambdaName']} / {result['caseName']}"
+        if 'error' in result:
+            print(f"{case_str:<{case_width}} ERROR {result['error']}")
+            continue
+        print(
+            f"{case_str:<{case_width}} "
+            f"{result['p50Ms']:>9.3f} {result['p99Ms']:>9.3f} "
+            f"{result['apiCallsPerInvocation']:>6} {result['peakMemoryKiB']:>9.1f}"
+        )
+        for func_name, count in result['apiCallsByFunction'].items():
+            print(f"    {func_name}: {count}")
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Replay recorded events through the lambda handlers offline")
+    parser.add_argument(
+        "--lambda-name", action="append", default=[],
+        help="Only benchmark this lambda (i.e find_latest_workflow), may be repeated"
+    )
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="Invocations per event")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency of each api call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random latency added to each api call")
+    parser.add_argument(
+        "--api-latency-ms", action="append", default=[],
+        help="Latency of a single api (workflow, fastq, metadata, filemanager), i.e filemanager=250"
+    )
+    parser.add_argument(
+        "--filemanager-cache-files", type=int, default=0,
+        help="Pad each filemanager listing with n cache files"
+    )
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_PATH, help="OrcaBus api fixtures")
+    parser.add_argument("--warm-cache", action="store_true", help="Keep the layer caches between invocations")
+    parser.add_argument("--skip-conversion-cases", action="store_true", help="Only replay the recorded events")
+    parser.add_argument("--output", type=Path, default=None, help="Write the results to this json file")
+    parser.add_argument("--baseline", type=Path, default=None, help="Compare to a previous results json file")
+    parser.add_argument(
+        "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+        help="Allowed p50 latency increase over the baseline, as a fraction"
+    )
+    return parser.parse_args()
+
+
+def setup_offline_environment():
+    """
+    Handlers import their layers from the lambda runtime path, and read their config from the environment
+    :return:
+    """
+    for layer_python_path in sorted(LAYERS_DIR.glob("*/python")):
+        if str(layer_python_path) not in sys.path:
+            sys.path.insert(0, str(layer_python_path))
+    for env_key, env_value in OFFLINE_ENVIRONMENT.items():
+        os.environ.setdefault(env_key, env_value)
+
+
+def main():
+    args = get_args()
+
+    setup_offline_environment()
+
+    api_stub = OrcabusApiStub.from_fixtures_file(
+        args.fixtures,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        api_latency_ms=dict(map(
+            lambda latency_iter_: (latency_iter_.split("=", 1)[0], float(latency_iter_.split("=", 1)[1])),
+            args.api_latency_ms
+        )),
+        filemanager_cache_files=args.filemanager_cache_files,
+    )
+
+    results_list = []
+    for lambda_name in (args.lambda_name or get_lambda_names()):
+        results_list.extend(run_lambda_benchmarks(lambda_name, api_stub, args.iterations, args.warm_cache))
+        if not args.skip_conversion_cases:
+            results_list.extend(run_conversion_benchmarks(lambda_name, args.iterations))
+
+    print_results(results_list)
+
+    if args.output is not None:
+        with open(args.output, "w") as output_h:
+            json.dump(results_list, output_h, indent=2)
+            output_h.write("\n")
+
+    regressions_list: Optional[List[str]] = None
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_h:
+            regressions_list = compare_to_baseline(results_list, json.load(baseline_h), args.tolerance)
+        for regression in regressions_list:
+            print(f"REGRESSION {regression}")
+
+    if any(map(lambda result_iter_: 'error' in result_iter_, results_list)) or regressions_list:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
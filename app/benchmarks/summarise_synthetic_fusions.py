@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark the streaming fusions.tsv summariser on a synthetic (multi-GB) Arriba fusions.tsv
+
+We write a synthetic fusions.tsv of the requested size to a local file,
+with the full Arriba column set and long read_identifiers columns (which is what makes a real fusions.tsv large),
+then stream it through arriba_wgts_rna_tools.fusions.summarise_fusions_tsv in fixed-size chunks, as the
+summarise_arriba_fusions lambda does with the S3 object body.
+
+For the summariser we report
+  * the throughput (MB/s of fusions.tsv)
+  * the peak python memory (tracemalloc), in a second pass so the trace does not slow the timed pass
+  * the sidecar size, and the rows / headline counts read back from the sidecar against those we generated
+
+With --compare-naive we also parse the file the naive way (read it whole, split every line),
+which needs memory in proportion to the file, so keep --size-gb small when using it.
+
+Usage:
+
+python3 app/benchmarks/summarise_synthetic_fusions.py --size-gb 2
+python3 app/benchmarks/summarise_synthetic_fusions.py --size-gb 0.2 --compare-naive --json
+"""
+
+# Standard imports
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator
+
+# Local imports
+from run_benchmarks import setup_offline_environment
+
+# Globals
+BYTES_PER_GB = 1024 ** 3
+BYTES_PER_MB = 1024 ** 2
+
+DEFAULT_SIZE_GB = 2.0
+DEFAULT_READ_IDENTIFIERS_BYTES = 20000
+DEFAULT_GENE_POOL_SIZE = 20000
+
+FUSIONS_TSV_HEADER_COLUMNS = [
+    "#gene1", "gene2", "strand1(gene/fusion)", "strand2(gene/fusion)", "breakpoint1", "breakpoint2",
+    "site1", "site2", "type", "split_reads1", "split_reads2", "discordant_mates", "coverage1", "coverage2",
+    "confidence", "reading_frame", "tags", "retained_protein_domains",
+    "closest_genomic_breakpoint1", "closest_genomic_breakpoint2", "gene_id1", "gene_id2",
+    "transcript_id1", "transcript_id2", "direction1", "direction2", "filters",
+    "fusion_transcript", "peptide_sequence", "read_identifiers",
+]
+CHROMOSOME_LIST = list(map(str, range(1, 23))) + ["X", "Y"]
+CONFIDENCE_WEIGHTS = {"low": 0.7, "medium": 0.2, "high": 0.1}
+READ_NAME_LENGTH = 40
+
+
+def write_synthetic_fusions_tsv(
+        output_path: Path,
+        size_bytes: int,
+        read_identifiers_bytes: int,
+        gene_pool_size: int,
+        seed: int,
+) -> Dict[str, int]:
+    """
+    Write a synthetic fusions.tsv of (at least) size_bytes
+    :param output_path:
+    :param size_bytes:
+    :param read_identifiers_bytes: Average length of the read_identifiers column
+    :param gene_pool_size:
+    :param seed:
+    :return: The counts we expect back from the summary
+    """
+    rng = random.Random(seed)
+
+    # A block of read names to slice the read identifiers from
+    read_name_block = ",".join(
+        "".join(rng.choices("ACGTN0123456789:", k=READ_NAME_LENGTH))
+        for _ in range((2 * read_identifiers_bytes) // (READ_NAME_LENGTH + 1) + 1)
+    ).encode()
+
+    gene_list = list(map(lambda idx_iter_: f"GENE{idx_iter_}", range(gene_pool_size)))
+    confidence_list = list(CONFIDENCE_WEIGHTS.keys())
+    confidence_weight_list = list(CONFIDENCE_WEIGHTS.values())
+
+    expected_counts = {
+        "fusionCount": 0,
+        **{f"{level}ConfidenceFusionCount": 0 for level in confidence_list},
+    }
+
+    written_bytes = 0
+    with open(output_path, "wb") as output_h:
+        header = ("\t".join(FUSIONS_TSV_HEADER_COLUMNS) + "\n").encode()
+        output_h.write(header)
+        written_bytes += len(header)
+
+        while written_bytes < size_bytes:
+            confidence = rng.choices(confidence_list, weights=confidence_weight_list)[0]
+            read_identifiers_start = rng.randrange(0, read_identifiers_bytes)
+            read_identifiers_length = rng.randrange(read_identifiers_bytes // 2, read_identifiers_bytes * 3 // 2)
+
+            row = b"\t".join([
+                rng.choice(gene_list).encode(),
+                rng.choice(gene_list).encode(),
+                b"+/+", b"-/-",
+                f"{rng.choice(CHROMOSOME_LIST)}:{rng.randrange(1, 248_000_000)}".encode(),
+                f"{rng.choice(CHROMOSOME_LIST)}:{rng.randrange(1, 248_000_000)}".encode(),
+                b"splice-site", b"splice-site", b"translocation",
+                str(rng.randrange(0, 200)).encode(),
+                str(rng.randrange(0, 200)).encode(),
+                str(rng.randrange(0, 200)).encode(),
+                b"150", b"120",
+                confidence.encode(),
+                b"in-frame", b".", b".", b".", b".",
+                b"ENSG00000186716.21", b"ENSG00000097007.19",
+                b"ENST00000305877.13", b"ENST00000318560.6",
+                b"downstream", b"upstream", b"duplicates(3)",
+                b"ATGGTGGACCCGGTGGGCTTCGCGGAGGCGTGGAAGGCGCAGTTCCCGGACTCA|GAAGCCCTTCAGCGGCCAGTAGCATC",
+                b"MVDPVGFAEAWKAQFPDS|eALQRPVAS",
+                read_name_block[read_identifiers_start:read_identifiers_start + read_identifiers_length],
+            ]) + b"\n"
+            output_h.write(row)
+            written_bytes += len(row)
+
+            expected_counts["fusionCount"] += 1
+            expected_counts[f"{confidence}ConfidenceFusionCount"] += 1
+
+    return expected_counts
+
+
+def iter_file_chunks(input_path: Path, chunk_size: int) -> Iterator[bytes]:
+    with open(input_path, "rb") as input_h:
+        yield from iter(partial(input_h.read, chunk_size), b"")
+
+
+def get_peak_traced_memory(func: Callable[[], Any]) -> int:
+    """
+    Run the function and return its peak python memory allocation
+    :param func:
+    :return:
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def parse_naive(input_path: Path) -> int:
+    """
+    Read the whole file, and split every line
+    :param input_path:
+    :return:
+    """
+    with open(input_path, "rb") as input_h:
+        rows = list(map(lambda line_iter_: line_iter_.split(b"\t"), input_h.read().splitlines()[1:]))
+    return len(rows)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming fusions.tsv summariser on synthetic input")
+    parser.add_argument("--size-gb", type=float, default=DEFAULT_SIZE_GB, help="Size of the synthetic fusions.tsv")
+    parser.add_argument(
+        "--read-identifiers-bytes", type=int, default=DEFAULT_READ_IDENTIFIERS_BYTES,
+        help="Average length of the read_identifiers column"
+    )
+    parser.add_argument(
+        "--gene-pool-size", type=int, default=DEFAULT_GENE_POOL_SIZE,
+        help="Number of distinct gene names"
+    )
+    parser.add_argument("--chunk-size-bytes", type=int, default=None, help="Read chunk size (default 1 MiB)")
+    parser.add_argument("--row-group-size", type=int, default=None, help="Sidecar row group size (default 65536)")
+    parser.add_argument("--work-dir", type=Path, default=None, help="Where to write the synthetic files")
+    parser.add_argument("--skip-memory-trace", action="store_true", help="Skip the (slower) traced pass")
+    parser.add_argument("--compare-naive", action="store_true", help="Also parse the file whole, for comparison")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--json", action="store_true", help="Print the results as json")
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    setup_offline_environment()
+
+    from arriba_wgts_rna_tools import fusions
+
+    chunk_size = args.chunk_size_bytes or fusions.DEFAULT_CHUNK_SIZE_BYTES
+    row_group_size = args.row_group_size or fusions.DEFAULT_ROW_GROUP_SIZE
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        fusions_tsv_path = Path(work_dir) / "fusions.tsv"
+        fusions_summary_path = Path(work_dir) / "fusions.summary.arfs"
+
+        start_time = time.perf_counter()
+        expected_counts = write_synthetic_fusions_tsv(
+            fusions_tsv_path,
+            size_bytes=int(args.size_gb * BYTES_PER_GB),
+            read_identifiers_bytes=args.read_identifiers_bytes,
+            gene_pool_size=args.gene_pool_size,
+            seed=args.seed,
+        )
+        generate_seconds = time.perf_counter() - start_time
+        fusions_tsv_size = os.path.getsize(fusions_tsv_path)
+
+        def _summarise() -> Dict[str, int]:
+            with open(fusions_summary_path, "wb") as fusions_summary_h:
+                return fusions.summarise_fusions_tsv(
+                    iter_file_chunks(fusions_tsv_path, chunk_size),
+                    fusions_summary_h,
+                    row_group_size=row_group_size,
+                )
+
+        # Timed pass
+        start_time = time.perf_counter()
+        headline_counts = _summarise()
+        summarise_seconds = time.perf_counter() - start_time
+
+        # Read the sidecar back
+        with open(fusions_summary_path, "rb") as fusions_summary_h:
+            sidecar_row_count = sum(map(
+                lambda columns_iter_: len(columns_iter_["gene1"]),
+                fusions.read_fusions_summary(fusions_summary_h)
+            ))
+        fusions_summary_size = os.path.getsize(fusions_summary_path)
+
+        results = {
+            "fusionsTsvMB": round(fusions_tsv_size / BYTES_PER_MB, 1),
+            "fusionCount": headline_counts["fusionCount"],
+            "chunkSizeBytes": chunk_size,
+            "rowGroupSize": row_group_size,
+            "generateSeconds": round(generate_seconds, 2),
+            "summariseSeconds": round(summarise_seconds, 2),
+            "summariseMBPerSecond": round(fusions_tsv_size / BYTES_PER_MB / summarise_seconds, 1),
+            "sidecarBytes": fusions_summary_size,
+            "sidecarBytesPerFusion": round(fusions_summary_size / max(1, sidecar_row_count), 1),
+            "countsMatch": (
+                sidecar_row_count == expected_counts["fusionCount"] and
+                all(headline_counts[key] == value for key, value in expected_counts.items())
+            ),
+        }
+
+        # Traced pass
+        if not args.skip_memory_trace:
+            results["summarisePeakMemoryMB"] = round(get_peak_traced_memory(_summarise) / BYTES_PER_MB, 2)
+
+        if args.compare_naive:
+            start_time = time.perf_counter()
+            parse_naive(fusions_tsv_path)
+            results["naiveSeconds"] = round(time.perf_counter() - start_time, 2)
+            results["naivePeakMemoryMB"] = round(
+                get_peak_traced_memory(partial(parse_naive, fusions_tsv_path)) / BYTES_PER_MB, 2
+            )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for key, value in results.items():
+        print(f"{key:<24} {value}")
+
+
+if __name__ == "__main__":
+    main()
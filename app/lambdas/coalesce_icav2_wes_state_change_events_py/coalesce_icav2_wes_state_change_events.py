@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+"""
+Coalesce ICAv2 WES State Change Events
+
+Given a batch of ICAv2 WES state change events from the queue (an SQS event, the record body is the event detail),
+collapse the events to the newest status per portal run (see arriba_wgts_rna_tools.coalesce)
+and start the ICAv2 WES event to WRSC event state machine once for each remaining event.
+
+{
+  "Records": [
+    {
+      "messageId": "059f36b4-87a3-44ab-83d2-661975830a7d",
+      "body": "{\"id\": \"iwa.01JY07DV46QMQJWH1J1Y8YFR27\", \"status\": \"SUCCEEDED\", \"tags\": {\"portalRunId\": \"20250617ac346b29\"}, ...}",
+      "attributes": {
+        "SentTimestamp": "1750214792146"
+      },
+      ...
+    }
+  ]
+}
+
+TO
+
+{
+  // Only the messages of the portal runs we could not forward, these are returned to the queue
+  "batchItemFailures": [
+    {
+      "itemIdentifier": "059f36b4-87a3-44ab-83d2-661975830a7d"
+    }
+  ]
+}
+
+Superseded and stale events are deleted from the queue along with the event they were coalesced into.
+
+Executions are named after the portal run id, status and event content,
+so a redelivered batch does not start a second execution for the same event.
+
+The state machine and concurrency are set with the following environment variables
+  * STATE_MACHINE_ARN
+  * MAX_CONCURRENCY (default 8)
+"""
+
+# Standard imports
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from hashlib import sha256
+from os import environ
+from typing import Any, Dict, List
+
+# Layer imports
+from arriba_wgts_rna_tools.coalesce import (
+    coalesce_state_change_events,
+    is_stale_status,
+    set_last_forwarded_status,
+)
+from arriba_wgts_rna_tools.lazy import lazy_import
+from arriba_wgts_rna_tools.transport import instrument_boto3_client
+from arriba_wgts_rna_tools.metrics import instrument_handler
+
+boto3 = lazy_import("boto3")
+
+# Globals
+STATE_MACHINE_ARN_ENV_VAR = "STATE_MACHINE_ARN"
+MAX_CONCURRENCY_ENV_VAR = "MAX_CONCURRENCY"
+DEFAULT_MAX_CONCURRENCY = 8
+
+EXECUTION_NAME_MAX_LENGTH = 80
+EXECUTION_ALREADY_EXISTS_ERROR_CODE = "ExecutionAlreadyExists"
+
+# Set logger
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+@lru_cache(maxsize=1)
+def get_sfn_client():
+    return instrument_boto3_client(boto3.client("stepfunctions"))
+
+
+def get_queued_event_from_sqs_record(sqs_record: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "messageId": sqs_record['messageId'],
+        "sentTimestamp": int(sqs_record.get('attributes', {}).get('SentTimestamp', 0)),
+        "event": json.loads(sqs_record['body']),
+    }
+
+
+def get_execution_name(icav2_wes_event: Dict[str, Any]) -> str:
+    """
+    A deterministic execution name for the event, i.e '20250617ac346b29--SUCCEEDED--3f1c0a9e2b7d'
+    :param icav2_wes_event:
+    :return:
+    """
+    event_digest = sha256(json.dumps(icav2_wes_event, sort_keys=True, default=str).encode()).hexdigest()
+    execution_name = "--".join([
+        str(icav2_wes_event.get('tags', {}).get('portalRunId', "unknown")),
+        str(icav2_wes_event.get('status', "UNKNOWN")),
+        event_digest[:12],
+    ])
+    return re.sub(r"[^A-Za-z0-9_-]", "-", execution_name)[-EXECUTION_NAME_MAX_LENGTH:]
+
+
+def start_conversion(icav2_wes_event: Dict[str, Any]):
+    """
+    Start the ICAv2 WES event to WRSC event state machine for the event.
+    An execution with the same name means this event has already been forwarded.
+    :param icav2_wes_event:
+    :return:
+    """
+    try:
+        get_sfn_client().start_execution(
+            stateMachineArn=environ[STATE_MACHINE_ARN_ENV_VAR],
+            name=get_execution_name(icav2_wes_event),
+            input=json.dumps(icav2_wes_event),
+        )
+    except Exception as e:
+        if getattr(e, "response", {}).get("Error", {}).get("Code", None) == EXECUTION_ALREADY_EXISTS_ERROR_CODE:
+            return
+        raise
+
+
+def forward_group(group: Dict[str, Any]) -> List[str]:
+    """
+    Forward the newest event of the group (unless it is stale)
+    :param group:
+    :return: The message ids to return to the queue (empty on success)
+    """
+    status = group['event'].get('status', None)
+
+    if is_stale_status(group['portalRunId'], status):
+        logger.info(f"Dropping stale status {status} for portal run {group['portalRunId']}")
+        return []
+
+    try:
+        start_conversion(group['event'])
+    except Exception as e:
+        logger.exception(f"Could not forward status {status} for portal run {group['portalRunId']}: {e}")
+        return group['messageIdList']
+
+    set_last_forwarded_status(group['portalRunId'], status)
+    return []
+
+
+@instrument_handler
+def handler(event, context):
+    """
+    Perform the following steps:
+    1. Parse the queued ICAv2 WES state change events
+    2. Coalesce the events to the newest status per portal run
+    3. Start the conversion state machine for each non-stale event
+    :param event:
+    :param context:
+    :return:
+    """
+    failed_message_id_list = []
+
+    # Parse the queued events, a message we cannot parse is returned to the queue (and dead-lettered)
+    queued_event_list = []
+    for sqs_record in event['Records']:
+        try:
+            queued_event_list.append(get_queued_event_from_sqs_record(sqs_record))
+        except (KeyError, ValueError) as e:
+            logger.exception(f"Could not parse message {sqs_record.get('messageId', None)}: {e}")
+            failed_message_id_list.append(sqs_record.get('messageId', None))
+
+    # Coalesce
+    group_list = coalesce_state_change_events(queued_event_list)
+
+    logger.info(
+        f"Coalesced {len(queued_event_list)} events into {len(group_list)}, "
+        f"{sum(map(lambda group_iter_: group_iter_['supersededCount'], group_list))} superseded"
+    )
+
+    # Forward each group, groups are independent of each other
+    max_concurrency = max(1, int(environ.get(MAX_CONCURRENCY_ENV_VAR, DEFAULT_MAX_CONCURRENCY)))
+    if len(group_list) <= 1 or max_concurrency == 1:
+        failed_message_id_lists = list(map(forward_group, group_list))
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(group_list))) as executor:
+            failed_message_id_lists = list(executor.map(forward_group, group_list))
+
+    for failed_message_id_list_iter_ in failed_message_id_lists:
+        failed_message_id_list.extend(failed_message_id_list_iter_)
+
+    return {
+        "batchItemFailures": list(map(
+            lambda message_id_iter_: {"itemIdentifier": message_id_iter_},
+            failed_message_id_list
+        ))
+    }
+
+
+# if __name__ == "__main__":
+#     from os import environ
+#     environ['AWS_PROFILE'] = 'umccr-development'
+#     environ['AWS_REGION'] = 'ap-southeast-2'
+#     environ['STATE_MACHINE_ARN'] = 'arn:aws:states:ap-southeast-2:843407916570:stateMachine:arriba-wgts-rna-icav2WesAscEventToWorkflowRscEvent'
+#
+#     print(json.dumps(
+#         handler(
+#             {
+#                 "Records": [
+#                     {
+#                         "messageId": "1",
+#                         "body": json.dumps({"status": "QUEUED", "tags": {"portalRunId": "20250617ac346b29"}}),  # pragma: allowlist secret
+#                         "attributes": {"SentTimestamp": "1750214792000"}
+#                     },
+#                     {
+#                         "messageId": "2",
+#                         "body": json.dumps({"status": "SUCCEEDED", "tags": {"portalRunId": "20250617ac346b29"}}),  # pragma: allowlist secret
+#                         "attributes": {"SentTimestamp": "1750214792146"}
+#                     },
+#                     {
+#                         "messageId": "3",
+#                         "body": json.dumps({"status": "RUNNING", "tags": {"portalRunId": "20250617ac346b29"}}),  # pragma: allowlist secret
+#                         "attributes": {"SentTimestamp": "1750214792201"}
+#                     }
+#                 ]
+#             },
+#             None
+#         ),
+#         indent=4
+#     ))
+#
+#     # {
+#     #     "batchItemFailures": []
+#     # }
@@ -5,11 +5,29 @@ Compare the payload of the original portal run id and that of the new object
 
 We dont want to accidentally end up in an infinite loop, so we only want to push a WRU / WRSC event if
 the payload has changed
+
+Inputs are as follows:
+
+{
+  // Either the old payload or the digest of the old payload
+  "oldPayload": {...},
+  "oldPayloadDigest": "sha256 hex digest",
+  "newPayload": {...},
+  // Optional, return the JSON paths of all differences
+  "explain": false
+}
 """
 
-# Standard library imports
-from deepdiff import DeepDiff
+# Layer imports
+from arriba_wgts_rna_tools.compare import (
+    payload_has_changed,
+    get_payload_differences,
+    get_payload_digest
+)
+from arriba_wgts_rna_tools.metrics import instrument_handler
 
+
+@instrument_handler
 def handler(event, context):
     """
     Get the latest payload from the portal run id and compare it to the new object payload
@@ -17,13 +35,71 @@ def handler(event, context):
     :param context:
     :return:
     """
-    old_payload = event['oldPayload']
+    old_payload = event.get('oldPayload', None)
+    old_payload_digest = event.get('oldPayloadDigest', None)
     new_payload = event['newPayload']
 
-    if not DeepDiff(old_payload, new_payload):
-        return {
-            "hasChanged": False
-        }
-    return {
-        "hasChanged": True
+    if old_payload is None and old_payload_digest is None:
+        raise ValueError("Either oldPayload or oldPayloadDigest must be provided")
+
+    response = {
+        "hasChanged": payload_has_changed(
+            old_payload, new_payload,
+            old_payload_digest=old_payload_digest
+        ),
+        "newPayloadDigest": get_payload_digest(new_payload),
     }
+
+    # Explain mode, only available if we have the old payload
+    if event.get('explain', False) and old_payload is not None:
+        response['differences'] = get_payload_differences(old_payload, new_payload)
+
+    return response
+
+
+# Benchmark against DeepDiff (pip install deepdiff) on an arriba draft payload
+# if __name__ == "__main__":
+#     import timeit
+#     from copy import deepcopy
+#     from deepdiff import DeepDiff
+#     old_payload = {
+#         "version": "2025.08.05",
+#         "data": {
+#             "inputs": {
+#                 "sampleName": "L2500373",
+#                 "alignmentData": {
+#                     "bamInput": "s3://pipeline-prod-cache-503977275616-ap-southeast-2/byob-icav2/production/analysis/dragen-wgts-rna/20250617ac346b29/L2500373_dragen_variant_calling/L2500373.bam"
+#                 },
+#                 "referenceFasta": "s3://reference-data-503977275616-ap-southeast-2/refdata/genomes/GRCh38_umccr/GRCh38_full_analysis_set_plus_decoy_hla.fa",
+#                 "annotationGtf": "s3://reference-data-503977275616-ap-southeast-2/refdata/gencode/hg38/v44/gencode.v44.annotation.gtf.gz",
+#                 "cytobandsTsv": "s3://reference-data-503977275616-ap-southeast-2/refdata/arriba/2-5-0/cytobands_hg38_GRCh38_v2.5.0.tsv",
+#                 "proteinDomainsGff3": "s3://reference-data-503977275616-ap-southeast-2/refdata/arriba/2-5-0/protein_domains_hg38_GRCh38_v2.5.0.gff3",
+#                 "blacklistTsv": "s3://reference-data-503977275616-ap-southeast-2/refdata/arriba/2-5-0/blacklist_hg38_GRCh38_v2.5.0.tsv.gz"
+#             },
+#             "engineParameters": {
+#                 "projectId": "eba5c946-1677-441d-bbce-6a11baadecbb",
+#                 "pipelineId": "372b7fbd-d4f5-4ed4-8e75-d773971ed25f",
+#                 "outputUri": "s3://pipeline-prod-cache-503977275616-ap-southeast-2/byob-icav2/production/analysis/arriba-wgts-rna/20250617abcd1234/",
+#                 "logsUri": "s3://pipeline-prod-cache-503977275616-ap-southeast-2/byob-icav2/production/logs/arriba-wgts-rna/20250617abcd1234/"
+#             },
+#             "tags": {
+#                 "libraryId": "L2500373",
+#                 "subjectId": "AIRSPACE-194-5",
+#                 "individualId": "SBJ06472",
+#                 "fastqRgidList": [
+#                     "CTGCTTCC+GATCTATC.4.250328_A01052_0258_AHFGM7DSXF"
+#                 ]
+#             }
+#         }
+#     }
+#     same_payload = deepcopy(old_payload)
+#     changed_payload = deepcopy(old_payload)
+#     changed_payload['data']['inputs']['alignmentData']['bamInput'] += ".new"
+#
+#     for name, new_payload in [("unchanged", same_payload), ("changed", changed_payload)]:
+#         for engine, func in [
+#             ("DeepDiff", lambda: bool(DeepDiff(old_payload, new_payload))),
+#             ("payload_has_changed", lambda: payload_has_changed(old_payload, new_payload)),
+#         ]:
+#             number = 2000
+#             print(f"{name} / {engine}: {min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6:.1f} us")
@@ -59,6 +59,7 @@ TO
       "libraryId": "L20202020"
     }
   ],
+  // Only included for SUCCEEDED events
   "payload": {
     "refId": "workflowmanagerrefid",
     "version": "2024.07.01",
@@ -97,24 +98,101 @@ TO
     }
   }
 }
+
+The workflow, workflow run name and libraries of a portal run do not change after READY,
+so they are cached per portal run (the workflow run skeleton), and repeat events for a run need no api reads.
+
+Only a SUCCEEDED event adds to the payload (the outputs), so only a SUCCEEDED event fetches the latest payload,
+the WRSC event for any other status is sent without a payload (the payload is unchanged since READY).
+
+If the ARRIBA_OUTPUT_MANIFEST_BACKEND environment variable is set (to 'filemanager' or 's3'),
+the Arriba output prefix of a SUCCEEDED analysis is listed once, and the key files (with their sizes and ETags)
+are added to the outputs as 'arribaRnaFusionCallingOutputManifest' (see arriba_wgts_rna_tools.manifest).
+The manifest is optional, if it cannot be built the error is logged and the event is sent without it.
 """
 # Standard imports
-from copy import deepcopy
+import logging
 from datetime import datetime, timezone
+from os import environ
+from typing import Any, Dict, Optional
 
 # Layer helpers
-from orcabus_api_tools.workflow import (
-    get_latest_payload_from_workflow_run,
-    get_workflow_run_from_portal_run_id
-)
+from arriba_wgts_rna_tools.workflow import get_workflow_run_skeleton, get_latest_payload_from_workflow_run
+from arriba_wgts_rna_tools.manifest import get_output_manifest
+from arriba_wgts_rna_tools.metrics import instrument_handler
+
+# Globals
+SUCCEEDED_STATUS = "SUCCEEDED"
+ARRIBA_OUTPUT_MANIFEST_BACKEND_ENV_VAR = "ARRIBA_OUTPUT_MANIFEST_BACKEND"
+
+# Set logger
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def get_succeeded_outputs(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the outputs of a succeeded analysis, relative to the output uri
+    :param inputs:
+    :return:
+    """
+    rna_fusion_calling_output_rel_path = "_".join([
+        inputs['sampleName'],
+        "arriba"
+    ]) + "/"
+
+    return dict(filter(
+        lambda kv_iter_: kv_iter_[1] is not None,
+        {
+            'arribaRnaFusionCallingOutputRelPath': rna_fusion_calling_output_rel_path,
+        }.items()
+    ))
+
+
+def get_output_prefix_uri(output_uri: str, output_rel_path: str) -> str:
+    return output_uri.rstrip("/") + "/" + output_rel_path
 
 
+def get_optional_output_manifest(
+        output_prefix_uri: str,
+        portal_run_id: str,
+        backend: str,
+) -> Optional[Dict[str, Any]]:
+    """
+    Get the output manifest, the manifest is optional,
+    so any error is logged and we send the SUCCEEDED event without it
+    :param output_prefix_uri:
+    :param portal_run_id:
+    :param backend:
+    :return: The manifest, or None if we could not build it
+    """
+    try:
+        output_manifest = get_output_manifest(
+            output_prefix_uri,
+            portal_run_id=portal_run_id,
+            backend=backend,
+        )
+    except Exception as e:
+        logger.exception(f"Could not build the Arriba output manifest for portal run {portal_run_id}: {e}")
+        return None
+
+    if output_manifest['missingFiles'] or output_manifest['emptyFiles']:
+        logger.warning(
+            f"Arriba outputs for portal run {portal_run_id} are incomplete, "
+            f"missing: {output_manifest['missingFiles']}, empty: {output_manifest['emptyFiles']}"
+        )
+
+    return output_manifest
+
+
+@instrument_handler
 def handler(event, context):
     """
     Perform the following steps:
     1. Get portal run ID from ICAv2 WES Event Tags
-    2. Look up workflow run / payload using the portal run ID
-    3. Generate the WRSC Event payload based on the existing WRSC Event payload
+    2. Get the (cached) workflow run skeleton using the portal run ID
+    3. If the status is SUCCEEDED, look up the latest payload and add the outputs (and optionally the output manifest)
+    4. Generate the WRSC Event
     :param event:
     :param context:
     :return:
@@ -126,63 +204,55 @@ def handler(event, context):
     # Get the portal run ID from the event tags
     portal_run_id = icav2_wes_event['tags']['portalRunId']
 
-    # Get the workflow run using the portal run ID
-    workflow_run = get_workflow_run_from_portal_run_id(portal_run_id)
+    # Get the workflow run skeleton using the portal run ID
+    workflow_run_skeleton = get_workflow_run_skeleton(portal_run_id)
 
-    # Get the latest payload from the workflow run
-    latest_payload = get_latest_payload_from_workflow_run(workflow_run['orcabusId'])
+    # Prepare the WRSC Event
+    workflow_run_state_change_event = {
+        # New status
+        "status": icav2_wes_event['status'],
+        # Current time
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds').replace("+00:00", "Z"),
+        # Portal Run ID
+        "portalRunId": portal_run_id,
+        # Workflow details
+        "workflow": workflow_run_skeleton['workflow'],
+        "workflowRunName": workflow_run_skeleton['workflowRunName'],
+        # Linked libraries in workflow run
+        "libraries": workflow_run_skeleton['libraries'],
+    }
 
     # Check if the status was SUCCEEDED, if so we populate the 'outputs' data payload
-    if icav2_wes_event['status'] == 'SUCCEEDED':
-        # Get the inputs from the latest payload
-        inputs = latest_payload['data']['inputs']
-
-        rna_fusion_calling_output_rel_path = "_".join([
-            inputs['sampleName'],
-            "arriba"
-        ]) + "/"
-
-        outputs = dict(filter(
-            lambda kv_iter_: kv_iter_[1] is not None,
-            {
-                'arribaRnaFusionCallingOutputRelPath': rna_fusion_calling_output_rel_path,
-            }.items()
-        ))
-    else:
-        outputs = None
-
-    # Update the latest payload with the outputs if available
-    if outputs:
-        latest_payload['data']['outputs'] = outputs
-
-    # Update the workflow object to contain 'name' and 'version'
-    workflow = dict(deepcopy(workflow_run['workflow']))
-    if 'workflowName' in workflow:
-        workflow['name'] = workflow.pop('workflowName')
-    if 'workflowVersion' in workflow:
-        workflow['version'] = workflow.pop('workflowVersion')
-
-    # Prepare the WRSC Event payload
-    return {
-        "workflowRunStateChangeEvent": {
-            # New status
-            "status": icav2_wes_event['status'],
-            # Current time
-            "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds').replace("+00:00", "Z"),
-            # Portal Run ID
-            "portalRunId": portal_run_id,
-            # Workflow details
-            "workflow": workflow,
-            "workflowRunName": workflow_run['workflowRunName'],
-            # Linked libraries in workflow run
-            "libraries": workflow_run['libraries'],
-            # Payload containing the original inputs and engine parameters
-            # But with the updated outputs if available
-            "payload": {
-                "version": latest_payload['version'],
-                "data": latest_payload['data']
-            }
+    if icav2_wes_event['status'] == SUCCEEDED_STATUS:
+        # Get the latest payload from the workflow run
+        latest_payload = get_latest_payload_from_workflow_run(workflow_run_skeleton['orcabusId'])
+
+        # Update the latest payload with the outputs
+        latest_payload['data']['outputs'] = get_succeeded_outputs(latest_payload['data']['inputs'])
+
+        # Optionally list the output prefix once, and record the key files
+        manifest_backend = environ.get(ARRIBA_OUTPUT_MANIFEST_BACKEND_ENV_VAR, None)
+        if manifest_backend:
+            output_manifest = get_optional_output_manifest(
+                get_output_prefix_uri(
+                    latest_payload['data']['engineParameters']['outputUri'],
+                    latest_payload['data']['outputs']['arribaRnaFusionCallingOutputRelPath'],
+                ),
+                portal_run_id=portal_run_id,
+                backend=manifest_backend,
+            )
+            if output_manifest is not None:
+                latest_payload['data']['outputs']['arribaRnaFusionCallingOutputManifest'] = output_manifest
+
+        # Payload containing the original inputs and engine parameters
+        # But with the updated outputs
+        workflow_run_state_change_event["payload"] = {
+            "version": latest_payload['version'],
+            "data": latest_payload['data']
         }
+
+    return {
+        "workflowRunStateChangeEvent": workflow_run_state_change_event
     }
 
 
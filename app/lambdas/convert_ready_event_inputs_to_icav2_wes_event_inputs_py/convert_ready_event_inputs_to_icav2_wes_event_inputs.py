@@ -58,43 +58,126 @@ With the outputs as follows:
   },
 }
 
+The conversion is driven by the mapping spec in cwl_input_mapping.json, which is compiled once per container
+into a single-pass transformer. Each field in the spec may set
+  * name: the output key (defaults to the snake_case of the input key)
+  * type: one of File, Directory, record (a nested object with its own fields) or passthrough (the default)
+  * secondaryFiles: CWL secondary file patterns for File fields, i.e '.bai' (append) or '^.bai' (replace extension)
+  * required: raise an error if the field is missing
+  * fields / defaultFieldType: for record fields, the spec of each nested field and of any other nested field
+
+Fields not in the spec are passed through with their keys (and any nested keys) converted to snake_case.
+Passthrough values are converted in place, the event is only read by this invocation.
+
+If the CWL_INPUTS_PREFLIGHT_BACKEND environment variable is set (to 'filemanager'),
+every File location in the converted inputs (including the secondary files) is checked before we return,
+and we fail fast with the list of missing uris rather than submitting an analysis that cannot succeed.
+The lambda role has no S3 read access on the reference or input buckets, so the 's3' backend is not supported here.
 """
 
 # Imports
-from typing import Dict, Any, Union, List
+import json
+import string
+from functools import lru_cache, partial
+from os import environ
+from pathlib import Path
+from typing import Dict, Any, Union, List, Tuple, Callable, Optional
+
+# Layer imports
+from arriba_wgts_rna_tools.preflight import check_cwl_inputs_exist, FILEMANAGER_BACKEND
+from arriba_wgts_rna_tools.metrics import instrument_handler
+
+# Globals
+CWL_INPUT_MAPPING_SPEC_PATH = Path(__file__).absolute().parent / "cwl_input_mapping.json"
+CWL_INPUTS_PREFLIGHT_BACKEND_ENV_VAR = "CWL_INPUTS_PREFLIGHT_BACKEND"
+# The lambda role has no s3:GetObject on the reference or input buckets
+SUPPORTED_CWL_INPUTS_PREFLIGHT_BACKEND_LIST = [FILEMANAGER_BACKEND]
+
+FILE_TYPE = "File"
+DIRECTORY_TYPE = "Directory"
+RECORD_TYPE = "record"
+PASSTHROUGH_TYPE = "passthrough"
+
+# Input keys come from a small, fixed vocabulary, so we only ever convert each key once
+SNAKE_CASE_CACHE_MAX_SIZE = 1024
 
-REFERENCE_FILE_KEYS = [
-    "referenceFasta",
-    "annotationGtf",
-    "cytobandsTsv",
-    "proteinDomainsGff3",
-    "blacklistTsv",
-]
+# Map each (ascii) upper case character to '_' + its lower case character
+SNAKE_CASE_TRANSLATION_TABLE = str.maketrans({
+    char_iter_: '_' + char_iter_.lower()
+    for char_iter_ in string.ascii_uppercase
+})
 
 
+@lru_cache(maxsize=SNAKE_CASE_CACHE_MAX_SIZE)
 def to_snake_case(s: str) -> str:
     """
     Convert a string to snake_case.
     :param s: The input string.
     :return: The snake_case version of the input string.
     """
+    if s.isascii():
+        return s.translate(SNAKE_CASE_TRANSLATION_TABLE).lstrip('_')
     return ''.join(['_' + c.lower() if c.isupper() else c for c in s]).lstrip('_')
 
 
-def recursive_snake_case(d: Union[Dict[str, Any] | List[Any] | str]) -> Any:
+def snake_case_keys(
+        d: Union[Dict[str, Any] | List[Any] | str],
+        in_place: bool = False
+) -> Any:
     """
-    Convert all keys in a dictionary to snake_case recursively.
-    If the value is a list, we also need to convert each item in the list if it is a dictionary.
+    Convert all keys in a dictionary to snake_case, including dictionaries nested in lists.
+
+    The traversal is iterative, so deeply nested inputs are safe.
+
+    By default a new object is returned and the input is left untouched.
+    In place, the input is updated and returned, dictionaries whose keys are already snake_case
+    are left as is, otherwise their keys are replaced (keeping key order) in the same dictionary object.
     :param d:
+    :param in_place:
     :return:
     """
-    if not isinstance(d, dict) and not isinstance(d, list):
+    if not isinstance(d, (dict, list)):
         return d
 
-    if isinstance(d, dict):
-        return {to_snake_case(k): recursive_snake_case(v) for k, v in d.items()}
+    if in_place:
+        stack: List[Any] = [d]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                for key in node:
+                    if to_snake_case(key) != key:
+                        items_list = list(node.items())
+                        node.clear()
+                        node.update((to_snake_case(k), v) for k, v in items_list)
+                        break
+                values = node.values()
+            else:
+                values = node
+            for value in values:
+                if isinstance(value, (dict, list)):
+                    stack.append(value)
+        return d
 
-    return [recursive_snake_case(item) for item in d]
+    root: Union[Dict[str, Any] | List[Any]] = {} if isinstance(d, dict) else []
+    copy_stack: List[Tuple[Any, Any]] = [(d, root)]
+    while copy_stack:
+        source, target = copy_stack.pop()
+        items = (
+            ((to_snake_case(k), v) for k, v in source.items())
+            if isinstance(source, dict)
+            else enumerate(source)
+        )
+        for key, value in items:
+            if isinstance(value, (dict, list)):
+                new_value = {} if isinstance(value, dict) else []
+                copy_stack.append((value, new_value))
+            else:
+                new_value = value
+            if isinstance(target, dict):
+                target[key] = new_value
+            else:
+                target.append(new_value)
+    return root
 
 
 def cwlify_file(file_uri: str) -> Dict[str, str]:
@@ -104,6 +187,114 @@ def cwlify_file(file_uri: str) -> Dict[str, str]:
     }
 
 
+def cwlify_directory(directory_uri: str) -> Dict[str, str]:
+    return {
+        "class": "Directory",
+        "location": directory_uri
+    }
+
+
+def get_secondary_file_location(location: str, pattern: str) -> str:
+    """
+    Get the location of a secondary file from a CWL secondary file pattern,
+    each leading '^' removes an extension from the primary file location before the suffix is appended
+    :param location:
+    :param pattern:
+    :return:
+    """
+    suffix = pattern.lstrip('^')
+    for _ in range(len(pattern) - len(suffix)):
+        basename_idx = location.rfind('/') + 1
+        extension_idx = location.rfind('.')
+        if extension_idx > basename_idx:
+            location = location[:extension_idx]
+    return location + suffix
+
+
+def compile_field_transformer(field_spec: Dict[str, Any]) -> Callable[[Any], Any]:
+    """
+    Compile a single field spec into a function that converts the field value
+    :param field_spec:
+    :return:
+    """
+    field_type = field_spec.get("type", PASSTHROUGH_TYPE)
+
+    if field_type == FILE_TYPE:
+        secondary_file_patterns: List[str] = field_spec.get("secondaryFiles", [])
+
+        if not secondary_file_patterns:
+            return cwlify_file
+
+        def _file_transformer(value: str) -> Dict[str, Any]:
+            return {
+                **cwlify_file(value),
+                "secondaryFiles": [
+                    cwlify_file(get_secondary_file_location(value, pattern_iter_))
+                    for pattern_iter_ in secondary_file_patterns
+                ]
+            }
+
+        return _file_transformer
+
+    if field_type == DIRECTORY_TYPE:
+        return cwlify_directory
+
+    if field_type == RECORD_TYPE:
+        return compile_record_transformer(field_spec)
+
+    if field_type == PASSTHROUGH_TYPE:
+        # The handler owns the event, so passthrough values are converted in place rather than copied
+        return partial(snake_case_keys, in_place=True)
+
+    raise ValueError(f"Unknown field type '{field_type}' in the cwl input mapping spec")
+
+
+def compile_record_transformer(record_spec: Dict[str, Any]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Compile a record spec (an object of field specs) into a single-pass transformer,
+    every field is looked up once and converted once, in input order
+    :param record_spec:
+    :return:
+    """
+    field_transformers: Dict[str, Tuple[str, Callable[[Any], Any]]] = {
+        key: (field_spec.get("name", to_snake_case(key)), compile_field_transformer(field_spec))
+        for key, field_spec in record_spec.get("fields", {}).items()
+    }
+    default_transformer = compile_field_transformer({"type": record_spec.get("defaultFieldType", PASSTHROUGH_TYPE)})
+    required_keys = [
+        key
+        for key, field_spec in record_spec.get("fields", {}).items()
+        if field_spec.get("required", False)
+    ]
+
+    def _record_transformer(record: Dict[str, Any]) -> Dict[str, Any]:
+        for key in required_keys:
+            if key not in record:
+                raise KeyError(key)
+
+        output: Dict[str, Any] = {}
+        for key, value in record.items():
+            field_transformer: Optional[Tuple[str, Callable[[Any], Any]]] = field_transformers.get(key, None)
+            if field_transformer is None:
+                output[to_snake_case(key)] = default_transformer(value)
+            else:
+                output[field_transformer[0]] = field_transformer[1](value)
+        return output
+
+    return _record_transformer
+
+
+@lru_cache(maxsize=1)
+def get_cwl_input_transformer() -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Load and compile the cwl input mapping spec, once per container
+    :return:
+    """
+    with open(CWL_INPUT_MAPPING_SPEC_PATH) as spec_h:
+        return compile_record_transformer(json.load(spec_h))
+
+
+@instrument_handler
 def handler(event, context) -> Dict[str, Any]:
     """
     Convert the BCLConvert InteropQC ready event to an ICAv2 WES request event detail.
@@ -111,34 +302,18 @@ def handler(event, context) -> Dict[str, Any]:
     :param context:
     :return:
     """
-    inputs = event['inputs']
-
-    # cwl-ify the inputs
-    inputs['alignmentData'] = (
-        {k: cwlify_file(v) for k, v in inputs['alignmentData'].items()}
-    )
-
-    # cwl-ify the reference data
-    for key in REFERENCE_FILE_KEYS:
-        if key not in inputs:
-            continue
-        inputs[key] = cwlify_file(inputs[key])
-
-    inputs = recursive_snake_case(inputs)
-
-    # Add in the bam index
-    if 'bam_input' in inputs.get('alignment_data', {}):
-        bam_input = inputs['alignment_data']['bam_input']
-        bam_index = bam_input['location'] + '.bai'
-        bam_input['secondaryFiles'] = [cwlify_file(bam_index)]
-        inputs['alignment_data']['bam_input'] = bam_input
-
-    # Add the fai index
-    if 'reference_fasta' in inputs:
-        reference_fasta = inputs['reference_fasta']
-        reference_fai = reference_fasta['location'] + '.fai'
-        reference_fasta['secondaryFiles'] = [cwlify_file(reference_fai)]
-        inputs['reference_fasta'] = reference_fasta
+    # Convert the inputs in a single pass, passthrough values are converted in place
+    inputs = get_cwl_input_transformer()(event['inputs'])
+
+    # Optionally check the input files exist before we submit the analysis
+    preflight_backend = environ.get(CWL_INPUTS_PREFLIGHT_BACKEND_ENV_VAR, None)
+    if preflight_backend:
+        if preflight_backend not in SUPPORTED_CWL_INPUTS_PREFLIGHT_BACKEND_LIST:
+            raise ValueError(
+                f"Unsupported {CWL_INPUTS_PREFLIGHT_BACKEND_ENV_VAR} '{preflight_backend}', "
+                f"expected one of {', '.join(SUPPORTED_CWL_INPUTS_PREFLIGHT_BACKEND_LIST)}"
+            )
+        check_cwl_inputs_exist(inputs, backend=preflight_backend)
 
     # Return the inputs
     return {
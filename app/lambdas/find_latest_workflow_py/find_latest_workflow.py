@@ -4,17 +4,68 @@
 Given an upstream portal run id,
 find the draft workflow object for sash
 
+Workflow runs are returned latest first (by orcabus id, which is time-ordered).
+
+If latestOnly is set, only the latest matching workflow run is returned (as a single item list),
+so callers that only need the latest run do not receive the whole history.
 """
 # Standard imports
-from typing import List
+import typing
+from typing import List, Optional
+
+# Layer imports
+from arriba_wgts_rna_tools.metrics import instrument_handler
+from arriba_wgts_rna_tools.workflow import get_workflow_runs_from_metadata
+
+# Type checking imports
+if typing.TYPE_CHECKING:
+    from orcabus_api_tools.workflow.models import WorkflowRunDetail
+
+
+def get_workflow_run_sort_key(workflow_run: 'WorkflowRunDetail') -> str:
+    return workflow_run['orcabusId']
+
+
+def filter_workflow_runs_by_status(
+        workflows_list: List['WorkflowRunDetail'],
+        workflow_status: Optional[str]
+) -> List['WorkflowRunDetail']:
+    """
+    Filter the workflow runs to the status in a single pass.
+
+    If the status is SUCCEEDED, and the latest workflow run (of any status) is not the succeeded one,
+    i.e a workflow run has been started since the last succeeded run, no workflow runs are returned.
+    :param workflows_list:
+    :param workflow_status:
+    :return:
+    """
+    if workflow_status is None:
+        return list(workflows_list)
+
+    latest_workflow_run: Optional['WorkflowRunDetail'] = None
+    matching_workflows_list: List['WorkflowRunDetail'] = []
+    for workflow_iter_ in workflows_list:
+        if (
+                latest_workflow_run is None or
+                get_workflow_run_sort_key(workflow_iter_) > get_workflow_run_sort_key(latest_workflow_run)
+        ):
+            latest_workflow_run = workflow_iter_
+        if workflow_iter_['currentState']['status'] == workflow_status:
+            matching_workflows_list.append(workflow_iter_)
+
+    # We need to make sure that we dont have any workflows that are still running
+    # That were started AFTER the last succeeded one
+    if (
+            workflow_status == 'SUCCEEDED' and
+            latest_workflow_run is not None and
+            latest_workflow_run['currentState']['status'] != workflow_status
+    ):
+        return []
 
-# Local imports
-from orcabus_api_tools.workflow import (
-    get_workflow_runs_from_metadata
-)
-from orcabus_api_tools.workflow.models import WorkflowRunDetail
+    return matching_workflows_list
 
 
+@instrument_handler
 def handler(event, context):
     """
     Get the latest payload from the portal run id
@@ -23,7 +74,6 @@ def handler(event, context):
     :return:
     """
     # Get the upstream events
-
     # Get the workflow type, name is mandatory
     workflow_name = event['workflowName']
     workflow_version = event.get('workflowVersion', None)
@@ -37,12 +87,15 @@ def handler(event, context):
     libraries = event.get('libraries', None)
     rgid_list = event.get('rgidList', None)
 
+    # Only return the latest workflow run
+    latest_only = event.get('latestOnly', False)
+
     # Check not both analysis run id and libraries are None
     if analysis_run_id is None and libraries is None:
         raise ValueError("Either analysisRunId or libraries must be provided")
 
     # Now we have our workflows, filter to the correct workflow name (and version if provided)
-    workflows_list: List[WorkflowRunDetail]
+    workflows_list: List['WorkflowRunDetail']
     workflows_list = get_workflow_runs_from_metadata(
         analysis_run_id=analysis_run_id,
         workflow_name=workflow_name,
@@ -55,46 +108,30 @@ def handler(event, context):
     )
 
     # Filter to workflow state if provided
-    if workflow_status is not None:
-    # We need to make sure that we dont have any workflows that are still running
-    # That were started AFTER the last succeeded one
-        if (
-            workflow_status == 'SUCCEEDED' and
-            len(list(workflows_list)) > 1
-        ):
-            # We need to make sure that we dont have any workflows that are still running
-            # That were started AFTER the last succeeded one
-            if (
-                    sorted(
-                        workflows_list,
-                        key=lambda workflow_iter_: workflow_iter_['orcabusId'],
-                        reverse=True
-                    )[0]['currentState']['status'] != workflow_status
-            ):
-                return {
-                    "workflowRunList": []
-                }
-
-    workflows_list = list(filter(
-        lambda workflow_iter_: workflow_iter_['currentState']['status'] == workflow_status,
-        workflows_list
-    ))
-
+    workflows_list = filter_workflow_runs_by_status(workflows_list, workflow_status)
 
     if len(workflows_list) == 0:
         return {
             "workflowRunList": []
         }
 
-    # Get the latest draft workflow for the given workflow name
+    # Get the latest workflow for the given workflow name
+    if latest_only:
+        return {
+            "workflowRunList": [
+                max(workflows_list, key=get_workflow_run_sort_key)
+            ]
+        }
+
     return {
         "workflowRunList": sorted(
             workflows_list,
-            key=lambda workflow_iter_: workflow_iter_['orcabusId'],
+            key=get_workflow_run_sort_key,
             reverse=True
         )
     }
 
+
 # if __name__ == "__main__":
 #     import json
 #     from os import environ
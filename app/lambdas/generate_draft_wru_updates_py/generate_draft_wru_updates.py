@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+"""
+Generate the draft WRU updates for a list of draft portal run ids
+
+Given an upstream (DRAGEN WGTS RNA) portal run id and a list of draft arriba portal run ids,
+for each draft
+  1. Get the draft payload
+  2. Drop the draft if the upstream event is a replay
+     (the upstream portal run id matches the upstream fingerprint recorded on the draft,
+     and the draft data still matches its data fingerprint)
+  3. Merge the DRAGEN WGTS RNA outputs into the draft payload
+  4. Generate the WRU event object
+  5. Compare the new payload to the draft payload
+
+This runs the whole pipeline in-process, the DRAGEN outputs are only collected once,
+and only if at least one draft is not a replay (a replay to every draft makes no upstream lookups),
+workflow run / payload objects are shared between drafts through the workflow api cache.
+
+Inputs are as follows:
+
+{
+  "upstreamPortalRunId": "20250617ac346b29",  // pragma: allowlist secret
+  "draftPortalRunIdList": [
+    "20250618abcd1234"  // pragma: allowlist secret
+  ]
+}
+
+With the outputs as follows:
+
+{
+  "draftUpdateList": [
+    {
+      "portalRunId": "20250618abcd1234",  // pragma: allowlist secret
+      "hasChanged": true,
+      // Null if the draft was dropped as a replay
+      "workflowRunUpdate": {...}
+    }
+  ]
+}
+"""
+
+# Standard imports
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from os import environ
+from typing import Any, Dict, Optional
+
+# Layer imports
+from arriba_wgts_rna_tools.compare import get_upstream_fingerprint, payload_has_changed
+from arriba_wgts_rna_tools.dragen import get_alignment_data
+from arriba_wgts_rna_tools.draft import get_draft_payload, generate_workflow_run_update, is_unchanged_replay
+from arriba_wgts_rna_tools.metrics import instrument_handler
+
+# Globals
+MAX_CONCURRENCY_ENV_VAR = "MAX_CONCURRENCY"
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+def get_draft_update(
+        draft_portal_run_id: str,
+        draft_payload: Dict[str, Any],
+        upstream_data: Optional[Dict[str, Any]],
+        upstream_fingerprint: str,
+) -> Dict[str, Any]:
+    """
+    Generate the WRU event object for a single draft, and whether it differs to the current draft payload
+    :param draft_portal_run_id:
+    :param draft_payload:
+    :param upstream_data: None if every draft is a replay
+    :param upstream_fingerprint:
+    :return:
+    """
+    # We have already merged this upstream event into the draft, and nobody has modified the draft since
+    if is_unchanged_replay(draft_payload, upstream_fingerprint):
+        return {
+            "portalRunId": draft_portal_run_id,
+            "hasChanged": False,
+            "workflowRunUpdate": None,
+        }
+
+    # The payload is merged in place, so we keep the original draft payload for the comparison
+    workflow_run_update = generate_workflow_run_update(
+        portal_run_id=draft_portal_run_id,
+        payload=deepcopy(draft_payload),
+        upstream_data=upstream_data,
+        upstream_fingerprint=upstream_fingerprint,
+    )
+
+    return {
+        "portalRunId": draft_portal_run_id,
+        "hasChanged": payload_has_changed(draft_payload, workflow_run_update['payload']),
+        "workflowRunUpdate": workflow_run_update,
+    }
+
+
+@instrument_handler
+def handler(event, context):
+    """
+    Generate the WRU event objects for each draft portal run id
+    :param event:
+    :param context:
+    :return:
+    """
+    upstream_portal_run_id = event['upstreamPortalRunId']
+    draft_portal_run_id_list = event.get('draftPortalRunIdList', [])
+
+    if len(draft_portal_run_id_list) == 0:
+        return {
+            "draftUpdateList": []
+        }
+
+    upstream_fingerprint = get_upstream_fingerprint({
+        "upstreamPortalRunId": upstream_portal_run_id
+    })
+
+    max_concurrency = max(1, int(environ.get(MAX_CONCURRENCY_ENV_VAR, DEFAULT_MAX_CONCURRENCY)))
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(draft_portal_run_id_list))) as executor:
+        draft_payload_list = list(executor.map(get_draft_payload, draft_portal_run_id_list))
+
+        # The upstream outputs are the same for every draft, so we only collect them once,
+        # and not at all if the upstream event is a replay to every draft
+        upstream_data = None
+        if not all(map(
+            lambda draft_payload_iter_: is_unchanged_replay(draft_payload_iter_, upstream_fingerprint),
+            draft_payload_list
+        )):
+            upstream_data = {
+                "alignmentData": get_alignment_data(upstream_portal_run_id)
+            }
+
+        draft_update_list = list(executor.map(
+            lambda draft_iter_: get_draft_update(
+                draft_iter_[0],
+                draft_payload=draft_iter_[1],
+                upstream_data=upstream_data,
+                upstream_fingerprint=upstream_fingerprint,
+            ),
+            zip(draft_portal_run_id_list, draft_payload_list)
+        ))
+
+    return {
+        "draftUpdateList": draft_update_list
+    }
@@ -6,25 +6,121 @@ Get the fastq ids from the rgid list
 Given the rgid list, return the fastq ids that are associated with these rgids.
 """
 
-from orcabus_api_tools.fastq import get_fastq_by_rgid
+# Standard imports
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from typing import Dict, List, Optional, Tuple
+import logging
 
+# Layer imports
+from arriba_wgts_rna_tools.fastq import get_fastq_by_rgid
+from arriba_wgts_rna_tools.metrics import instrument_handler
 
+# Globals
+MAX_CONCURRENCY_ENV_VAR = "MAX_CONCURRENCY"
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def get_max_concurrency(event_max_concurrency: Optional[int] = None) -> int:
+    """
+    Get the maximum number of concurrent fastq api requests,
+    the event value takes precedence over the environment variable
+    :param event_max_concurrency:
+    :return:
+    """
+    if event_max_concurrency is not None:
+        return max(1, int(event_max_concurrency))
+    return max(1, int(environ.get(MAX_CONCURRENCY_ENV_VAR, DEFAULT_MAX_CONCURRENCY)))
+
+
+def resolve_fastq_id_from_rgid(fastq_rgid: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Resolve a single rgid to its fastq id, errors are returned rather than raised
+    so that one bad rgid does not fail the whole batch
+    :param fastq_rgid:
+    :return: A tuple of (rgid, fastq id, error message)
+    """
+    try:
+        return fastq_rgid, get_fastq_by_rgid(fastq_rgid)['id'], None
+    except Exception as e:
+        logger.warning("Could not resolve fastq id for rgid %s: %s", fastq_rgid, e)
+        return fastq_rgid, None, str(e)
+
+
+def resolve_fastq_ids_from_rgid_list(
+        fastq_rgid_list: List[str],
+        max_concurrency: int
+) -> Tuple[Dict[str, str], List[Dict[str, str]]]:
+    """
+    Resolve all rgids to fastq ids with a bounded thread pool.
+    Duplicate rgids are only resolved once.
+    :param fastq_rgid_list:
+    :param max_concurrency:
+    :return: A tuple of (rgid to fastq id mapping, list of failed rgids)
+    """
+    unique_rgid_list = list(dict.fromkeys(fastq_rgid_list))
+
+    if len(unique_rgid_list) == 0:
+        return {}, []
+
+    # No need to spin up a pool for a single rgid (the most common case from the step function map)
+    if len(unique_rgid_list) == 1 or max_concurrency == 1:
+        results = list(map(resolve_fastq_id_from_rgid, unique_rgid_list))
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(unique_rgid_list))) as executor:
+            results = list(executor.map(resolve_fastq_id_from_rgid, unique_rgid_list))
+
+    fastq_id_by_rgid: Dict[str, str] = {}
+    failed_rgid_list: List[Dict[str, str]] = []
+    for fastq_rgid, fastq_id, error_message in results:
+        if error_message is not None:
+            failed_rgid_list.append({
+                "rgid": fastq_rgid,
+                "errorMessage": error_message,
+            })
+            continue
+        fastq_id_by_rgid[fastq_rgid] = fastq_id
+
+    return fastq_id_by_rgid, failed_rgid_list
+
+
+@instrument_handler
 def handler(event, context):
     """
     Given a list of fastq RGIDs, return the corresponding fastq IDs.
-    :param event: A dictionary containing the key "fastqRgidList", which is a list of fastq RGIDs.
+    :param event: A dictionary containing the key "fastqRgidList", which is a list of fastq RGIDs,
+      and optionally "maxConcurrency", the maximum number of concurrent fastq api requests.
     :param context: AWS Lambda context object (not used in this function).
-    :return: A dictionary with the key "fastqIdList", which is a list of fastq IDs corresponding to the input RGIDs.
+    :return: A dictionary with the key "fastqIdList", which is a list of fastq IDs corresponding to the input RGIDs,
+      "readsetList", the list of rgid / orcabusId pairs for each resolved RGID,
+      and "failedRgidList", the list of RGIDs that could not be resolved along with the error message.
     """
     fastq_rgid_list = event.get("fastqRgidList", [])
+    max_concurrency = get_max_concurrency(event.get("maxConcurrency", None))
 
-    all_fastq_ids = sorted(list(map(
-        lambda fastq_rgid_iter_: get_fastq_by_rgid(fastq_rgid_iter_)['id'],
-        fastq_rgid_list
-    )))
+    fastq_id_by_rgid, failed_rgid_list = resolve_fastq_ids_from_rgid_list(
+        fastq_rgid_list,
+        max_concurrency=max_concurrency
+    )
 
     return {
-        "fastqIdList": all_fastq_ids
+        "fastqIdList": sorted(
+            fastq_id_by_rgid[fastq_rgid]
+            for fastq_rgid in fastq_rgid_list
+            if fastq_rgid in fastq_id_by_rgid
+        ),
+        "readsetList": list(map(
+            lambda kv_iter_: {
+                "orcabusId": kv_iter_[1],
+                "rgid": kv_iter_[0],
+            },
+            fastq_id_by_rgid.items()
+        )),
+        "failedRgidList": failed_rgid_list,
     }
 
 
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+"""
+Get the library context for a draft
+
+Given the linked libraries of a draft (exactly one library is expected), resolve in a single invocation
+  1. The library object
+  2. The library tags (libraryId, subjectId, individualId)
+  3. The readsets (fastq id and rgid) of the current fastq set of the library (unless an rgid list is provided)
+
+The library and fastq set lookups are independent and run concurrently.
+
+If an rgid list is provided, the readsets are taken from the library readsets (where available).
+Callers can use the readset list directly rather than looking up the fastq id of each rgid.
+
+Inputs are as follows:
+
+{
+  "libraries": [
+    {
+      "libraryId": "L2500373",
+      "orcabusId": "lib.01JQ6MK7RZK96ZFH1C812FGCWJ"
+    }
+  ],
+  // Optional, if the rgids are already known (i.e from the library readsets)
+  "rgidList": null
+}
+
+With the outputs as follows:
+
+{
+  "libraryObj": {...},
+  "readsetList": [
+    {
+      "orcabusId": "fqr.01JQ6MKE2Q1D7F5B1J5XZ1N8VQ",
+      "rgid": "CTGCTTCC+GATCTATC.4.250328_A01052_0258_AHFGM7DSXF"
+    }
+  ],
+  "tags": {
+    "libraryId": "L2500373",
+    "subjectId": "AIRSPACE-194-5",
+    "individualId": "SBJ06472",
+    "fastqRgidList": [
+      "CTGCTTCC+GATCTATC.4.250328_A01052_0258_AHFGM7DSXF"
+    ]
+  }
+}
+"""
+
+# Standard imports
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+# Layer imports
+from arriba_wgts_rna_tools.fastq import get_current_fastq_set_readset_list
+from arriba_wgts_rna_tools.metadata import get_library_from_library_orcabus_id
+from arriba_wgts_rna_tools.metrics import instrument_handler
+
+
+def get_individual_id_from_library_obj(library_obj: Dict[str, Any]) -> str:
+    """
+    Get the individual id of the library subject, falling back to the subject id
+    :param library_obj:
+    :return:
+    """
+    individual_set = library_obj['subject'].get('individualSet', None) or []
+    if len(individual_set) > 0:
+        return individual_set[0]['individualId']
+    return library_obj['subject']['subjectId']
+
+
+def get_readset_list_from_library(library: Dict[str, Any], rgid_list: List[str]) -> List[Dict[str, str]]:
+    """
+    Get the readsets of the library for the rgid list, rgids without a known readset are skipped
+    :param library:
+    :param rgid_list:
+    :return:
+    """
+    readset_by_rgid = {
+        readset_iter_['rgid']: readset_iter_
+        for readset_iter_ in (library.get('readsets', None) or [])
+        if readset_iter_.get('rgid', None) is not None and readset_iter_.get('orcabusId', None) is not None
+    }
+    return list(map(
+        lambda rgid_iter_: {
+            "orcabusId": readset_by_rgid[rgid_iter_]['orcabusId'],
+            "rgid": rgid_iter_,
+        },
+        filter(
+            lambda rgid_iter_: rgid_iter_ in readset_by_rgid,
+            rgid_list
+        )
+    ))
+
+
+@instrument_handler
+def handler(event, context):
+    """
+    Get the library object, tags and current fastq set readsets for the draft library
+    :param event:
+    :param context:
+    :return:
+    """
+    libraries: List[Dict[str, Any]] = event.get("libraries", None) or []
+    rgid_list: Optional[List[str]] = event.get("rgidList", None)
+
+    # Check the cardinality before we make any api calls
+    if not libraries:
+        raise ValueError("No libraries provided in the input")
+    if len(libraries) != 1:
+        raise ValueError("Exactly one library must be provided in the input")
+
+    library = libraries[0]
+
+    # The library and fastq set lookups only need the ids we already have, so run them together
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        library_obj_future = executor.submit(get_library_from_library_orcabus_id, library['orcabusId'])
+        readset_list_future = (
+            executor.submit(get_current_fastq_set_readset_list, library['libraryId'])
+            if rgid_list is None
+            else None
+        )
+
+        library_obj = library_obj_future.result()
+        if readset_list_future is not None:
+            readset_list = readset_list_future.result()
+            rgid_list = list(map(
+                lambda readset_iter_: readset_iter_['rgid'],
+                readset_list
+            ))
+        else:
+            readset_list = get_readset_list_from_library(library, rgid_list)
+
+    return {
+        "libraryObj": library_obj,
+        "readsetList": readset_list,
+        "tags": {
+            "libraryId": library_obj['libraryId'],
+            "subjectId": library_obj['subject']['subjectId'],
+            "individualId": get_individual_id_from_library_obj(library_obj),
+            "fastqRgidList": rgid_list,
+        }
+    }
+
+
+# if __name__ == "__main__":
+#     import json
+#     from os import environ
+#     environ['AWS_PROFILE'] = 'umccr-production'
+#     environ['HOSTNAME_SSM_PARAMETER_NAME'] = '/hosted_zone/umccr/name'
+#     environ['ORCABUS_TOKEN_SECRET_ID'] = 'orcabus/token-service-jwt'
+#     print(json.dumps(
+#         handler(
+#             {
+#                 "libraries": [
+#                     {
+#                         "libraryId": "L2500373",
+#                         "orcabusId": "lib.01JQ6MK7RZK96ZFH1C812FGCWJ"
+#                     }
+#                 ]
+#             },
+#             None
+#         ),
+#         indent=4
+#     ))
@@ -5,14 +5,20 @@ Get the workflow run object
 """
 
 # Standard library imports
+import typing
 from typing import Dict
 
 # Layer imports
-from orcabus_api_tools.workflow import get_workflow_run_from_portal_run_id
-from orcabus_api_tools.workflow.models import WorkflowRunDetail
+from arriba_wgts_rna_tools.workflow import get_workflow_run_from_portal_run_id
+from arriba_wgts_rna_tools.metrics import instrument_handler
 
+# Type checking imports
+if typing.TYPE_CHECKING:
+    from orcabus_api_tools.workflow.models import WorkflowRunDetail
 
-def handler(event, context) -> Dict[str, WorkflowRunDetail]:
+
+@instrument_handler
+def handler(event, context) -> Dict[str, 'WorkflowRunDetail']:
     """
     Given a portal run id, return the workflow run object
     :param event:
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+"""
+Summarise Arriba Fusions
+
+Given the WRSC event of a SUCCEEDED analysis, stream the fusions.tsv from S3 in fixed-size chunks,
+write a compact columnar summary (the ARFS sidecar, see arriba_wgts_rna_tools.fusions) next to it,
+and add the sidecar uri and the headline counts to the outputs.
+
+{
+  "workflowRunStateChangeEvent": {
+    "status": "SUCCEEDED",
+    "portalRunId": "20250618abcd1234",  // pragma: allowlist secret
+    ...
+    "payload": {
+      "version": "2025.06.18",
+      "data": {
+        ...
+        "engineParameters": {
+          "outputUri": "s3://pipeline-prod-cache-503977275616-ap-southeast-2/byob-icav2/production/analysis/arriba-wgts-rna/20250618abcd1234/",
+          ...
+        },
+        "outputs": {
+          "arribaRnaFusionCallingOutputRelPath": "L2500373_arriba/"
+        }
+      }
+    }
+  }
+}
+
+TO
+
+{
+  "workflowRunStateChangeEvent": {
+    ...
+    "payload": {
+      "version": "2025.06.18",
+      "data": {
+        ...
+        "outputs": {
+          "arribaRnaFusionCallingOutputRelPath": "L2500373_arriba/",
+          "arribaRnaFusionSummaryRelPath": "L2500373_arriba/fusions.summary.arfs",
+          "arribaRnaFusionSummaryCounts": {
+            "fusionCount": 42,
+            "lowConfidenceFusionCount": 30,
+            "mediumConfidenceFusionCount": 8,
+            "highConfidenceFusionCount": 4,
+            "geneCount": 71
+          }
+        }
+      }
+    }
+  }
+}
+
+The fusions.tsv uri is taken from the output manifest if present (arribaRnaFusionCallingOutputManifest),
+otherwise it is the fusions.tsv under the arriba output rel path.
+
+The sidecar is spooled to a local temporary file (a few tens of bytes per fusion) and uploaded once complete,
+so memory stays bounded however large the fusions.tsv is.
+
+The chunk size can be set with the FUSIONS_SUMMARY_CHUNK_SIZE_BYTES environment variable (default 1 MiB)
+"""
+
+# Standard imports
+import logging
+from os import environ
+from pathlib import PurePosixPath
+from tempfile import TemporaryFile
+from typing import Any, Dict, Iterator
+from urllib.parse import urlparse
+
+# Layer imports
+from arriba_wgts_rna_tools.fusions import DEFAULT_CHUNK_SIZE_BYTES, summarise_fusions_tsv
+from arriba_wgts_rna_tools.preflight import get_s3_client
+from arriba_wgts_rna_tools.metrics import instrument_handler
+
+# Globals
+FUSIONS_TSV_FILE_NAME = "fusions.tsv"
+FUSIONS_SUMMARY_FILE_NAME = "fusions.summary.arfs"
+FUSIONS_SUMMARY_CHUNK_SIZE_BYTES_ENV_VAR = "FUSIONS_SUMMARY_CHUNK_SIZE_BYTES"
+
+# Set logger
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def get_fusions_tsv_uri(output_uri: str, outputs: Dict[str, Any]) -> str:
+    """
+    Get the fusions.tsv uri, from the output manifest if we have one
+    :param output_uri:
+    :param outputs:
+    :return:
+    """
+    output_manifest_files = outputs.get('arribaRnaFusionCallingOutputManifest', {}).get('files', {})
+    if 'fusionsTsv' in output_manifest_files:
+        return output_manifest_files['fusionsTsv']['s3Uri']
+
+    return output_uri.rstrip("/") + "/" + outputs['arribaRnaFusionCallingOutputRelPath'] + FUSIONS_TSV_FILE_NAME
+
+
+def iter_s3_object_chunks(s3_uri: str, chunk_size: int) -> Iterator[bytes]:
+    """
+    Stream the object body in fixed-size chunks
+    :param s3_uri:
+    :param chunk_size:
+    :return:
+    """
+    s3_obj = urlparse(s3_uri)
+    response = get_s3_client().get_object(Bucket=s3_obj.netloc, Key=s3_obj.path.lstrip("/"))
+    try:
+        yield from response['Body'].iter_chunks(chunk_size=chunk_size)
+    finally:
+        response['Body'].close()
+
+
+@instrument_handler
+def handler(event, context):
+    """
+    Perform the following steps:
+    1. Get the fusions.tsv uri from the WRSC event outputs
+    2. Stream the fusions.tsv into the ARFS sidecar (in a temporary file)
+    3. Upload the sidecar next to the fusions.tsv
+    4. Add the sidecar rel path and the headline counts to the outputs
+    :param event:
+    :param context:
+    :return:
+    """
+    workflow_run_state_change_event = event['workflowRunStateChangeEvent']
+    payload_data = workflow_run_state_change_event['payload']['data']
+    output_uri = payload_data['engineParameters']['outputUri']
+
+    fusions_tsv_uri = get_fusions_tsv_uri(output_uri, payload_data['outputs'])
+    fusions_tsv_s3_obj = urlparse(fusions_tsv_uri)
+    fusions_summary_s3_obj = fusions_tsv_s3_obj._replace(
+        path=str(PurePosixPath(fusions_tsv_s3_obj.path).with_name(FUSIONS_SUMMARY_FILE_NAME))
+    )
+
+    chunk_size = int(environ.get(FUSIONS_SUMMARY_CHUNK_SIZE_BYTES_ENV_VAR, DEFAULT_CHUNK_SIZE_BYTES))
+
+    with TemporaryFile() as fusions_summary_h:
+        headline_counts = summarise_fusions_tsv(
+            iter_s3_object_chunks(fusions_tsv_uri, chunk_size),
+            fusions_summary_h
+        )
+        fusions_summary_h.seek(0)
+        get_s3_client().upload_fileobj(
+            fusions_summary_h,
+            fusions_summary_s3_obj.netloc,
+            fusions_summary_s3_obj.path.lstrip("/"),
+        )
+
+    logger.info(f"Summarised {headline_counts['fusionCount']} fusions from {fusions_tsv_uri}")
+
+    # Add the sidecar (relative to the output uri, as with the other outputs) and the headline counts
+    payload_data['outputs']['arribaRnaFusionSummaryRelPath'] = str(
+        PurePosixPath(fusions_summary_s3_obj.path).relative_to(
+            PurePosixPath(urlparse(output_uri).path)
+        )
+    )
+    payload_data['outputs']['arribaRnaFusionSummaryCounts'] = headline_counts
+
+    return {
+        "workflowRunStateChangeEvent": workflow_run_state_change_event
+    }
+
+
+# if __name__ == "__main__":
+#     import json
+#     from os import environ
+#     environ['AWS_PROFILE'] = 'umccr-production'
+#     environ['AWS_REGION'] = 'ap-southeast-2'
+#
+#     print(json.dumps(
+#         handler(
+#             {
+#                 "workflowRunStateChangeEvent": {
+#                     "status": "SUCCEEDED",
+#                     "portalRunId": "20250618abcd1234",  # pragma: allowlist secret
+#                     "payload": {
+#                         "version": "2025.06.18",
+#                         "data": {
+#                             "engineParameters": {
+#                                 "outputUri": "s3://pipeline-prod-cache-503977275616-ap-southeast-2/byob-icav2/production/analysis/arriba-wgts-rna/20250618abcd1234/"
+#                             },
+#                             "outputs": {
+#                                 "arribaRnaFusionCallingOutputRelPath": "L2500373_arriba/"
+#                             }
+#                         }
+#                     }
+#                 }
+#             },
+#             None
+#         ),
+#         indent=4
+#     ))
+#
+#     # {
+#     #     "workflowRunStateChangeEvent": {
+#     #         ...
+#     #         "payload": {
+#     #             "version": "2025.06.18",
+#     #             "data": {
+#     #                 "engineParameters": {...},
+#     #                 "outputs": {
+#     #                     "arribaRnaFusionCallingOutputRelPath": "L2500373_arriba/",
+#     #                     "arribaRnaFusionSummaryRelPath": "L2500373_arriba/fusions.summary.arfs",
+#     #                     "arribaRnaFusionSummaryCounts": {
+#     #                         "fusionCount": 42,
+#     #                         "lowConfidenceFusionCount": 30,
+#     #                         "mediumConfidenceFusionCount": 8,
+#     #                         "highConfidenceFusionCount": 4,
+#     #                         "geneCount": 71
+#     #                     }
+#     #                 }
+#     #             }
+#     #         }
+#     #     }
+#     # }
@@ -6,28 +6,79 @@ Download the draft schema, validate it against the current schema, and print the
 
 # Imports
 import json
-import boto3
 import typing
-import jsonschema
 from os import environ
-from typing import Dict
+from pathlib import Path
+from time import monotonic
+from functools import lru_cache
+from typing import Dict, Optional, Tuple, Any, List, Union
 import logging
-from jsonschema import ValidationError
+
+# Layer imports
+from arriba_wgts_rna_tools.lazy import lazy_import
+from arriba_wgts_rna_tools.transport import instrument_boto3_client
+from arriba_wgts_rna_tools.metrics import instrument_handler
+
+# Heavy imports, only loaded on first use (i.e on a schema cache miss)
+boto3 = lazy_import("boto3")
+jsonschema = lazy_import("jsonschema")
 
 # Type checking imports
 if typing.TYPE_CHECKING:
     from mypy_boto3_schemas import SchemasClient
     from mypy_boto3_ssm import SSMClient
+    from jsonschema import ValidationError
+    from jsonschema.protocols import Validator
 
 # Globals
 SSM_REGISTRY_NAME_ENV_VAR = "SSM_REGISTRY_NAME"
 SSM_SCHEMA_NAME_ENV_VAR = "SSM_SCHEMA_NAME"
+SCHEMA_CACHE_TTL_SECONDS_ENV_VAR = "SCHEMA_CACHE_TTL_SECONDS"
+# Optional, validate against a local copy of complete-data-draft-schema.json instead of the registry
+LOCAL_SCHEMA_PATH_ENV_VAR = "LOCAL_SCHEMA_PATH"
+DEFAULT_SCHEMA_CACHE_TTL_SECONDS = 300
+
+# Module level schema cache, persists across warm invocations of the same container
+# Holds the resolved registry / schema names, the schema version, the raw schema text
+# and the compiled validator for that schema version
+SCHEMA_CACHE: Dict[str, Any] = {
+    "schemaKey": None,
+    "schemaContent": None,
+    "validator": None,
+    "expiresAt": 0.0,
+}
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+@lru_cache(maxsize=1)
+def get_ssm_client() -> 'SSMClient':
+    """
+    Get the ssm client, reused across warm invocations
+    :return:
+    """
+    return instrument_boto3_client(boto3.client("ssm"))
+
+
+@lru_cache(maxsize=1)
+def get_schemas_client() -> 'SchemasClient':
+    """
+    Get the schemas client, reused across warm invocations
+    :return:
+    """
+    return instrument_boto3_client(boto3.client("schemas"))
+
+
+def get_schema_cache_ttl_seconds() -> float:
+    """
+    Get the number of seconds a resolved schema is trusted before we re-check the SSM parameters
+    :return:
+    """
+    return float(environ.get(SCHEMA_CACHE_TTL_SECONDS_ENV_VAR, DEFAULT_SCHEMA_CACHE_TTL_SECONDS))
+
+
 def get_ssm_parameter_value(parameter_name: str) -> str:
     """
     Get the SSM parameter for the schema.
@@ -35,7 +86,7 @@ def get_ssm_parameter_value(parameter_name: str) -> str:
     """
 
     # Get the ssm client
-    ssm_client: SSMClient = boto3.client("ssm")
+    ssm_client: SSMClient = get_ssm_client()
 
     # Get the SSM parameter value
     response = ssm_client.get_parameter(
@@ -48,67 +99,175 @@ def get_ssm_parameter_value(parameter_name: str) -> str:
 
 def get_schema_from_registry(
         registry_name: str,
-        schema_name: str
+        schema_name: str,
+        schema_version: Optional[str] = None
 ) -> str:
     """
     Get the schema from the schema registry.
     :param registry_name: The name of the schema registry.
     :param schema_name: The name of the schema.
+    :param schema_version: The version of the schema, defaults to the latest version.
     :return: The schema as a string.
     """
 
     # Get the schemas client
-    schemas_client: SchemasClient = boto3.client("schemas")
+    schemas_client: SchemasClient = get_schemas_client()
 
     # Get the schema from the registry
-    response = schemas_client.describe_schema(
-        RegistryName=registry_name,
-        SchemaName=schema_name
-    )
+    describe_schema_kwargs = {
+        "RegistryName": registry_name,
+        "SchemaName": schema_name,
+    }
+    if schema_version is not None:
+        describe_schema_kwargs["SchemaVersion"] = schema_version
+
+    response = schemas_client.describe_schema(**describe_schema_kwargs)
 
     return response["Content"]
 
 
-def validate_draft_schema(
-        json_schema: str,
-        json_body: str
-) -> bool:
+def get_schema_key() -> Tuple[str, str, Optional[Union[str, float]]]:
+    """
+    Resolve the registry name, schema name and schema version from SSM.
+    The schema version is part of the key so that a schema version bump invalidates the cached validator.
+
+    If a local schema path is set, the key is the path and the file modification time instead.
+    :return:
+    """
+    if environ.get(LOCAL_SCHEMA_PATH_ENV_VAR, None) is not None:
+        local_schema_path = Path(environ[LOCAL_SCHEMA_PATH_ENV_VAR])
+        return (
+            "local",
+            str(local_schema_path),
+            local_schema_path.stat().st_mtime
+        )
+
+    schema_registry = get_ssm_parameter_value(environ[SSM_REGISTRY_NAME_ENV_VAR])
+    schema_ssm_value = json.loads(get_ssm_parameter_value(environ[SSM_SCHEMA_NAME_ENV_VAR]))
+
+    return (
+        schema_registry,
+        schema_ssm_value['schemaName'],
+        schema_ssm_value.get('schemaVersion', None)
+    )
+
+
+def compile_schema_validator(json_schema: str) -> 'Validator':
+    """
+    Compile the schema into a validator, the metaschema is only checked once here
+    rather than on every validation
+    :param json_schema:
+    :return:
+    """
+    schema = json.loads(json_schema)
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def get_current_schema_validator() -> 'Validator':
     """
-    Download the draft schema, validate it against the current schema, and print the results.
+    Get the validator for the current schema.
+
+    Within the TTL, warm invocations make no network calls at all.
+    Once the TTL has expired, we re-resolve the SSM parameters, and only call describe_schema
+    and recompile the validator if the registry / schema name / schema version has changed.
+    :return:
     """
-    try:
-        jsonschema.validate(
-            instance=json.loads(json_body),
-            schema=json.loads(json_schema)
+    if SCHEMA_CACHE['validator'] is not None and monotonic() < SCHEMA_CACHE['expiresAt']:
+        return SCHEMA_CACHE['validator']
+
+    schema_key = get_schema_key()
+
+    if schema_key != SCHEMA_CACHE['schemaKey'] or SCHEMA_CACHE['validator'] is None:
+        registry_name, schema_name, schema_version = schema_key
+        logger.info(
+            "Loading schema %s (version %s) from registry %s",
+            schema_name, schema_version, registry_name
         )
-    except ValidationError as e:
-        logger.info("Validation error: %s", e)
-        return False
-    return True
+        if registry_name == "local":
+            schema_content = Path(schema_name).read_text()
+        else:
+            schema_content = get_schema_from_registry(
+                registry_name=registry_name,
+                schema_name=schema_name,
+                schema_version=schema_version
+            )
+        SCHEMA_CACHE['validator'] = compile_schema_validator(schema_content)
+        SCHEMA_CACHE['schemaContent'] = schema_content
+        SCHEMA_CACHE['schemaKey'] = schema_key
+
+    SCHEMA_CACHE['expiresAt'] = monotonic() + get_schema_cache_ttl_seconds()
+
+    return SCHEMA_CACHE['validator']
+
+
+def get_validation_errors(
+        validator: 'Validator',
+        instance: Dict[str, Any]
+) -> List[Dict[str, str]]:
+    """
+    Collect every validation error rather than stopping at the first one.
+    Errors are returned in JSON path order, i.e
+    [
+        {
+            "path": "$.inputs.alignmentData",
+            "message": "{} is not valid under any of the given schemas"
+        }
+    ]
+    :param validator:
+    :param instance:
+    :return:
+    """
+    validation_errors: List['ValidationError'] = sorted(
+        validator.iter_errors(instance),
+        key=lambda error_iter_: (error_iter_.json_path, error_iter_.message)
+    )
+
+    return list(map(
+        lambda error_iter_: {
+            "path": error_iter_.json_path,
+            "message": error_iter_.message,
+        },
+        validation_errors
+    ))
+
+
+def validate_draft_schema(
+        validator: 'Validator',
+        instance: Dict[str, Any]
+) -> List[Dict[str, str]]:
+    """
+    Validate the draft data against the compiled current schema validator, and log the results.
+    The draft data is validated as is, there's no need to serialise / deserialise the event.
+    :return: The list of validation errors, empty if the draft is valid
+    """
+    validation_errors = get_validation_errors(validator, instance)
 
+    for validation_error in validation_errors:
+        logger.info("Validation error at %s: %s", validation_error['path'], validation_error['message'])
 
-def handler(event, context) -> Dict[str, bool]:
+    return validation_errors
+
+
+@instrument_handler
+def handler(event, context) -> Dict[str, Union[bool, List[Dict[str, str]]]]:
     """
     Given a draft schema, validate it against the current schema and print the results.
     :return:
     """
-    # Get the SSM parameters
-    schema_registry = get_ssm_parameter_value(environ[SSM_REGISTRY_NAME_ENV_VAR])
-    schema_name = json.loads(get_ssm_parameter_value(environ[SSM_SCHEMA_NAME_ENV_VAR]))['schemaName']
+    # Get the current schema validator (cached across warm invocations)
+    current_schema_validator = get_current_schema_validator()
 
-    # Get the current schema from the schema registry
-    current_schema = get_schema_from_registry(
-        registry_name=schema_registry,
-        schema_name=schema_name
+    # Validate the draft data against the current schema
+    validation_errors = validate_draft_schema(
+        current_schema_validator,
+        event
     )
 
-    # Get the draft schema from the schema registry
     return {
-        "isValid": validate_draft_schema(
-            current_schema,
-            # Assuming the event contains the draft schema as a JSON string
-            json.dumps(event)
-        )
+        "isValid": len(validation_errors) == 0,
+        "validationErrors": validation_errors,
     }
 
 
@@ -122,3 +281,55 @@ def handler(event, context) -> Dict[str, bool]:
 #         handler({}, None),
 #         indent=4
 #     ))
+
+
+# Micro-benchmark, compiled validator vs the one-shot jsonschema.validate with a json round trip
+# if __name__ == "__main__":
+#     import timeit
+#     from os import environ
+#     environ[LOCAL_SCHEMA_PATH_ENV_VAR] = str(
+#         Path(__file__).absolute().parent.parent.parent / "event-schemas" / "complete-data-draft-schema.json"
+#     )
+#     draft_data = {
+#         "inputs": {
+#             "sampleName": "L2500373",
+#             "alignmentData": {
+#                 "bamInput": "s3://pipeline-prod-cache-503977275616-ap-southeast-2/byob-icav2/production/analysis/dragen-wgts-rna/20250617ac346b29/L2500373_dragen_variant_calling/L2500373.bam"
+#             },
+#             "referenceFasta": "s3://reference-data-503977275616-ap-southeast-2/refdata/genomes/GRCh38_umccr/GRCh38_full_analysis_set_plus_decoy_hla.fa",
+#             "annotationGtf": "s3://reference-data-503977275616-ap-southeast-2/refdata/gencode/hg38/v44/gencode.v44.annotation.gtf.gz",
+#             "cytobandsTsv": "s3://reference-data-503977275616-ap-southeast-2/refdata/arriba/2-5-0/cytobands_hg38_GRCh38_v2.5.0.tsv",
+#             "proteinDomainsGff3": "s3://reference-data-503977275616-ap-southeast-2/refdata/arriba/2-5-0/protein_domains_hg38_GRCh38_v2.5.0.gff3",
+#             "blacklistTsv": "s3://reference-data-503977275616-ap-southeast-2/refdata/arriba/2-5-0/blacklist_hg38_GRCh38_v2.5.0.tsv.gz"
+#         },
+#         "engineParameters": {
+#             "projectId": "eba5c946-1677-441d-bbce-6a11baadecbb",
+#             "pipelineId": "372b7fbd-d4f5-4ed4-8e75-d773971ed25f",
+#             "outputUri": "s3://pipeline-prod-cache-503977275616-ap-southeast-2/byob-icav2/production/analysis/arriba-wgts-rna/20250617abcd1234/",
+#             "logsUri": "s3://pipeline-prod-cache-503977275616-ap-southeast-2/byob-icav2/production/logs/arriba-wgts-rna/20250617abcd1234/"
+#         },
+#         "tags": {
+#             "libraryId": "L2500373",
+#             "subjectId": "AIRSPACE-194-5",
+#             "individualId": "SBJ06472",
+#             "fastqRgidList": [
+#                 "CTGCTTCC+GATCTATC.4.250328_A01052_0258_AHFGM7DSXF"
+#             ]
+#         }
+#     }
+#     schema_text = Path(environ[LOCAL_SCHEMA_PATH_ENV_VAR]).read_text()
+#     validator = get_current_schema_validator()
+#
+#     def one_shot():
+#         try:
+#             jsonschema.validate(instance=json.loads(json.dumps(draft_data)), schema=json.loads(schema_text))
+#         except jsonschema.ValidationError:
+#             return False
+#         return True
+#
+#     for name, func in [
+#         ("jsonschema.validate + json round trip", one_shot),
+#         ("compiled validator", lambda: validate_draft_schema(validator, draft_data)),
+#     ]:
+#         number = 1000
+#         print(f"{name}: {min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6:.1f} us per draft")
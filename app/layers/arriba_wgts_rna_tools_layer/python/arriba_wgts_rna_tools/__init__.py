@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+
+"""
+Shared helpers for the Arriba WGTS RNA pipeline manager lambdas
+
+Deployed as a lambda layer so that every lambda in app/lambdas can import it
+"""
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""
+Memoising cache with a TTL, an LRU size bound and request coalescing.
+
+Module level caches persist across warm invocations of the same lambda container,
+unless they are created with invocation_scoped=True, in which case they are cleared at the start of each invocation
+(by instrument_handler, see metrics.py), i.e for objects that may change between invocations such as the latest payload.
+
+Concurrent requests for the same key (i.e from a thread pool) are coalesced,
+only the first caller performs the lookup, the others wait on its result.
+
+Every cache registers itself on creation, so the hit / miss counters of all caches
+in the container can be collected with get_all_cache_stats.
+"""
+
+# Standard imports
+from collections import OrderedDict
+from concurrent.futures import Future
+from copy import deepcopy
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+from weakref import WeakSet
+
+# Globals
+DEFAULT_TTL_SECONDS = 30
+DEFAULT_MAX_SIZE = 128
+
+T = TypeVar("T")
+
+# All caches created in this container
+_CACHE_REGISTRY: "WeakSet[MemoisingCache]" = WeakSet()
+
+
+class MemoisingCache:
+    """
+    A thread-safe TTL + LRU cache with request coalescing and hit / miss counters
+    """
+
+    def __init__(
+            self,
+            name: str,
+            ttl_seconds: float = DEFAULT_TTL_SECONDS,
+            max_size: int = DEFAULT_MAX_SIZE,
+            invocation_scoped: bool = False
+    ):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.invocation_scoped = invocation_scoped
+
+        # Key -> (expires at, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Key -> future of the in-flight lookup
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        _CACHE_REGISTRY.add(self)
+
+    def get_or_set(self, key: Hashable, lookup: Callable[[], T]) -> T:
+        """
+        Return the cached value for the key, otherwise run the lookup and cache the result.
+        Values are deep-copied on the way out so callers may mutate them freely.
+        Exceptions are not cached.
+        :param key:
+        :param lookup:
+        :return:
+        """
+        is_owner = False
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None and monotonic() < entry[0]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return deepcopy(entry[1])
+
+            in_flight_future = self._in_flight.get(key, None)
+            if in_flight_future is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                in_flight_future = Future()
+                self._in_flight[key] = in_flight_future
+                is_owner = True
+
+        # Another caller is already looking up this key, wait on their result
+        if not is_owner:
+            return deepcopy(in_flight_future.result())
+
+        try:
+            value = lookup()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight_future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._in_flight.pop(key, None)
+        in_flight_future.set_result(value)
+
+        return deepcopy(value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get the cached value for the key (if not expired), without performing a lookup
+        :param key:
+        :param default:
+        :return:
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None or monotonic() >= entry[0]:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return deepcopy(entry[1])
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Seed the cache with a value we already have (i.e the same object under a second key)
+        :param key:
+        :param value:
+        :return:
+        """
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl_seconds, deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """
+        Drop a single key, or the whole cache if no key is provided
+        :param key:
+        :return:
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get the hit / miss counters for this cache
+        :return:
+        """
+        with self._lock:
+            return {
+                "name": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "size": len(self._entries),
+            }
+
+
+def get_all_cache_stats() -> List[Dict[str, Any]]:
+    """
+    Get the hit / miss counters of every cache in this container
+    :return:
+    """
+    return sorted(
+        map(lambda cache_iter_: cache_iter_.get_stats(), list(_CACHE_REGISTRY)),
+        key=lambda stats_iter_: stats_iter_['name']
+    )
+
+
+def clear_invocation_scoped_caches():
+    """
+    Clear every invocation scoped cache in this container, called at the start of each invocation
+    :return:
+    """
+    for cache in list(_CACHE_REGISTRY):
+        if cache.invocation_scoped:
+            cache.invalidate()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+Coalesce bursts of ICAv2 WES state change events, per portal run
+
+An ICAv2 analysis emits a burst of state changes (SUBMITTED, QUEUED, INITIALIZING ... SUCCEEDED),
+often within seconds of each other and not necessarily in order.
+Converting each one means a workflow manager lookup (and a WRSC event) per status,
+most of which are superseded before the workflow manager has even processed them.
+
+Given a batch of queued events (i.e from an SQS batching window),
+  * events are grouped by tags.portalRunId
+  * only the most advanced status of each group is forwarded (ties go to the most recently sent event),
+    the rest of the group is superseded
+  * a group whose status is no more advanced than the status last forwarded for that portal run
+    (i.e a RUNNING event arriving after SUCCEEDED) is stale, and is dropped
+
+Events without a portal run id, or with a status we do not know how to rank, are always forwarded as is.
+
+The last forwarded status of each portal run is kept in a per-container cache,
+so stale events are only dropped on a best-effort basis across batches,
+the workflow manager remains the source of truth for the order of states.
+
+The TTL and size bound of the last forwarded status cache can be set with the following environment variables
+  * ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_TTL_SECONDS (default 3600)
+  * ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_MAX_SIZE (default 4096)
+"""
+
+# Standard imports
+from os import environ
+from typing import Any, Dict, List, Optional
+
+# Local imports
+from .cache import MemoisingCache
+
+# Globals
+ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_TTL_SECONDS_ENV_VAR = "ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_TTL_SECONDS"
+ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_MAX_SIZE_ENV_VAR = "ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_MAX_SIZE"
+DEFAULT_ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_TTL_SECONDS = 3600
+DEFAULT_ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_MAX_SIZE = 4096
+
+# The order in which an ICAv2 WES analysis moves through its states,
+# all terminal states share the highest rank (an analysis only ever reaches one of them)
+ICAV2_WES_STATUS_RANK = {
+    "SUBMITTED": 0,
+    "PENDING": 1,
+    "QUEUED": 1,
+    "INITIALIZING": 2,
+    "PREPARING_INPUTS": 3,
+    "IN_PROGRESS": 4,
+    "RUNNING": 4,
+    "GENERATING_OUTPUTS": 5,
+    "ABORTING": 6,
+    "SUCCEEDED": 7,
+    "FAILED": 7,
+    "ABORTED": 7,
+}
+
+# Portal run id -> rank of the last forwarded status
+LAST_FORWARDED_STATUS_RANK_CACHE = MemoisingCache(
+    name="icav2WesLastForwardedStatus",
+    ttl_seconds=float(environ.get(
+        ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_TTL_SECONDS_ENV_VAR,
+        DEFAULT_ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_TTL_SECONDS
+    )),
+    max_size=int(environ.get(
+        ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_MAX_SIZE_ENV_VAR,
+        DEFAULT_ICAV2_WES_LAST_FORWARDED_STATUS_CACHE_MAX_SIZE
+    )),
+)
+
+
+def get_portal_run_id(icav2_wes_event: Dict[str, Any]) -> Optional[str]:
+    return (icav2_wes_event.get("tags", None) or {}).get("portalRunId", None)
+
+
+def get_status_rank(status: Optional[str]) -> Optional[int]:
+    """
+    Get the rank of the status, None if we do not know the status
+    :param status:
+    :return:
+    """
+    if not isinstance(status, str):
+        return None
+    return ICAV2_WES_STATUS_RANK.get(status.upper(), None)
+
+
+def coalesce_state_change_events(queued_event_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Collapse a batch of queued ICAv2 WES state change events to the newest status per portal run.
+
+    Each queued event is a dict with the keys
+      * messageId: the queue message id
+      * sentTimestamp: when the event was queued (epoch milliseconds)
+      * event: the ICAv2 WES state change event (the event detail)
+
+    Returns one group per event to forward, in the order each group was first seen, with the keys
+      * portalRunId: may be None for events we cannot coalesce
+      * event: the event to forward
+      * messageIdList: the message ids of every event in the group (forwarded and superseded)
+      * supersededCount: the number of events in the group that are not forwarded
+
+    :param queued_event_list:
+    :return:
+    """
+    group_list: List[Dict[str, Any]] = []
+    group_by_portal_run_id: Dict[str, Dict[str, Any]] = {}
+
+    for queued_event in queued_event_list:
+        portal_run_id = get_portal_run_id(queued_event['event'])
+        status_rank = get_status_rank(queued_event['event'].get("status", None))
+
+        # Nothing to coalesce on, forward as is
+        if portal_run_id is None or status_rank is None:
+            group_list.append({
+                "portalRunId": portal_run_id,
+                "event": queued_event['event'],
+                "messageIdList": [queued_event['messageId']],
+                "supersededCount": 0,
+            })
+            continue
+
+        group = group_by_portal_run_id.get(portal_run_id, None)
+        if group is None:
+            group = {
+                "portalRunId": portal_run_id,
+                "event": queued_event['event'],
+                "messageIdList": [queued_event['messageId']],
+                "supersededCount": 0,
+                "_statusRank": status_rank,
+                "_sentTimestamp": queued_event['sentTimestamp'],
+            }
+            group_by_portal_run_id[portal_run_id] = group
+            group_list.append(group)
+            continue
+
+        group['messageIdList'].append(queued_event['messageId'])
+        group['supersededCount'] += 1
+        if (
+                (status_rank, queued_event['sentTimestamp']) >
+                (group['_statusRank'], group['_sentTimestamp'])
+        ):
+            group['event'] = queued_event['event']
+            group['_statusRank'] = status_rank
+            group['_sentTimestamp'] = queued_event['sentTimestamp']
+
+    return list(map(
+        lambda group_iter_: dict(filter(
+            lambda kv_iter_: not kv_iter_[0].startswith("_"),
+            group_iter_.items()
+        )),
+        group_list
+    ))
+
+
+def is_stale_status(portal_run_id: Optional[str], status: Optional[str]) -> bool:
+    """
+    A status is stale if it is no more advanced than the last status forwarded for the portal run
+    :param portal_run_id:
+    :param status:
+    :return:
+    """
+    status_rank = get_status_rank(status)
+    if portal_run_id is None or status_rank is None:
+        return False
+
+    last_forwarded_status_rank = LAST_FORWARDED_STATUS_RANK_CACHE.get(portal_run_id, None)
+    if last_forwarded_status_rank is None:
+        return False
+
+    return status_rank <= last_forwarded_status_rank
+
+
+def set_last_forwarded_status(portal_run_id: Optional[str], status: Optional[str]):
+    """
+    Record the status as the last forwarded for the portal run (only if it has moved forward)
+    :param portal_run_id:
+    :param status:
+    :return:
+    """
+    status_rank = get_status_rank(status)
+    if portal_run_id is None or status_rank is None:
+        return
+
+    last_forwarded_status_rank = LAST_FORWARDED_STATUS_RANK_CACHE.get(portal_run_id, None)
+    if last_forwarded_status_rank is None or status_rank > last_forwarded_status_rank:
+        LAST_FORWARDED_STATUS_RANK_CACHE.set(portal_run_id, status_rank)
+
+
+def clear_last_forwarded_statuses():
+    """
+    Clear the last forwarded status cache
+    :return:
+    """
+    LAST_FORWARDED_STATUS_RANK_CACHE.invalidate()
+
+
+# if __name__ == "__main__":
+#     queued_event_list = [
+#         {"messageId": "1", "sentTimestamp": 1, "event": {"status": "QUEUED", "tags": {"portalRunId": "20250617ac346b29"}}},  # pragma: allowlist secret
+#         {"messageId": "2", "sentTimestamp": 3, "event": {"status": "SUCCEEDED", "tags": {"portalRunId": "20250617ac346b29"}}},  # pragma: allowlist secret
+#         {"messageId": "3", "sentTimestamp": 4, "event": {"status": "RUNNING", "tags": {"portalRunId": "20250617ac346b29"}}},  # pragma: allowlist secret
+#     ]
+#     for group in coalesce_state_change_events(queued_event_list):
+#         print(group['event']['status'], group['messageIdList'], group['supersededCount'])
+#     # SUCCEEDED ['1', '2', '3'] 2
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+"""
+Compare the payload of the original portal run id and that of the new object
+
+We dont want to accidentally end up in an infinite loop, so we only want to push a WRU / WRSC event if
+the payload has changed
+
+Payloads are plain JSON objects, so rather than building a full DeepDiff report we
+walk both payloads together and stop at the first difference.
+Like DeepDiff, values of different types are treated as different (i.e 1 vs 1.0 vs True).
+
+A payload can also be reduced to a canonical digest (sha256 of the sorted-key, compact JSON),
+so that a digest can be stored and compared against later without the original payload.
+
+The digest of the payload data is recorded in the draft tags as the data fingerprint,
+alongside the digest of the upstream event inputs that were merged in (the upstream fingerprint),
+so that a replayed upstream event (whose inputs match the recorded upstream fingerprint, on a draft whose
+data still matches the recorded data fingerprint) can be dropped before the upstream data is resolved.
+The fingerprint tags are not forwarded to the ICAv2 WES request.
+"""
+
+# Standard imports
+import json
+from hashlib import sha256
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Globals
+DATA_FINGERPRINT_TAG_KEY = "dataFingerprint"
+UPSTREAM_FINGERPRINT_TAG_KEY = "upstreamFingerprint"
+FINGERPRINT_TAG_KEYS = [DATA_FINGERPRINT_TAG_KEY, UPSTREAM_FINGERPRINT_TAG_KEY]
+
+
+def get_payload_digest(payload: Any) -> str:
+    """
+    Get the canonical digest of a payload, stable across key ordering
+    :param payload:
+    :return:
+    """
+    return sha256(
+        json.dumps(
+            payload,
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def get_payload_data_fingerprint(data: Dict[str, Any]) -> str:
+    """
+    Get the fingerprint of the payload data, the fingerprint tags themselves are excluded
+    :param data:
+    :return:
+    """
+    tags = data.get("tags", None)
+    if tags is None or not any(map(lambda tag_key_iter_: tag_key_iter_ in tags, FINGERPRINT_TAG_KEYS)):
+        return get_payload_digest(data)
+
+    return get_payload_digest({
+        **data,
+        "tags": dict(filter(
+            lambda kv_iter_: kv_iter_[0] not in FINGERPRINT_TAG_KEYS,
+            tags.items()
+        ))
+    })
+
+
+def get_upstream_fingerprint(upstream_inputs: Dict[str, Any]) -> str:
+    """
+    Get the fingerprint of the upstream event inputs merged into a draft, i.e {"upstreamPortalRunId": "..."}
+    :param upstream_inputs:
+    :return:
+    """
+    return get_payload_digest(upstream_inputs)
+
+
+def add_payload_data_fingerprint(data: Dict[str, Any], upstream_fingerprint: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Record the fingerprint of the payload data (and the upstream fingerprint if provided) in the payload data tags
+    :param data:
+    :param upstream_fingerprint:
+    :return:
+    """
+    # Replace rather than update the tags, as the tags object may be shared with the original payload
+    data["tags"] = {
+        **(data.get("tags", None) or {}),
+        DATA_FINGERPRINT_TAG_KEY: get_payload_data_fingerprint(data),
+    }
+    if upstream_fingerprint is not None:
+        data["tags"][UPSTREAM_FINGERPRINT_TAG_KEY] = upstream_fingerprint
+    return data
+
+
+def has_matching_payload_data_fingerprint(data: Dict[str, Any]) -> bool:
+    """
+    Check the fingerprint recorded in the payload data tags still matches the payload data,
+    i.e this is a draft we have populated that has not been modified since
+    :param data:
+    :return:
+    """
+    recorded_fingerprint = (data.get("tags", None) or {}).get(DATA_FINGERPRINT_TAG_KEY, None)
+    if recorded_fingerprint is None:
+        return False
+    return recorded_fingerprint == get_payload_data_fingerprint(data)
+
+
+def has_matching_upstream_fingerprint(data: Dict[str, Any], upstream_fingerprint: str) -> bool:
+    """
+    Check the upstream event inputs have already been merged into the payload data,
+    and the payload data has not been modified since
+    :param data:
+    :param upstream_fingerprint:
+    :return:
+    """
+    recorded_upstream_fingerprint = (data.get("tags", None) or {}).get(UPSTREAM_FINGERPRINT_TAG_KEY, None)
+    if recorded_upstream_fingerprint is None or recorded_upstream_fingerprint != upstream_fingerprint:
+        return False
+    return has_matching_payload_data_fingerprint(data)
+
+
+def _extend_json_path(json_path: str, key: Any) -> str:
+    if isinstance(key, int):
+        return f"{json_path}[{key}]"
+    return f"{json_path}.{key}"
+
+
+def iter_payload_differences(old_payload: Any, new_payload: Any) -> Iterator[str]:
+    """
+    Walk both payloads (iteratively, so deeply nested payloads are safe)
+    and yield the JSON path of every difference, as soon as it is found.
+
+    Paths are reported at the level the difference is found, i.e a key missing from one
+    payload yields the path of that key, a list length change yields the path of the list.
+    :param old_payload:
+    :param new_payload:
+    :return:
+    """
+    stack: List[Tuple[str, Any, Any]] = [("$", old_payload, new_payload)]
+
+    while stack:
+        json_path, old_value, new_value = stack.pop()
+
+        if type(old_value) is not type(new_value):
+            yield json_path
+            continue
+
+        if isinstance(old_value, dict):
+            children = []
+            for key in old_value.keys() | new_value.keys():
+                if key not in old_value or key not in new_value:
+                    yield _extend_json_path(json_path, key)
+                    continue
+                children.append((_extend_json_path(json_path, key), old_value[key], new_value[key]))
+            stack.extend(children)
+            continue
+
+        if isinstance(old_value, list):
+            if len(old_value) != len(new_value):
+                yield json_path
+                continue
+            stack.extend(
+                (_extend_json_path(json_path, idx), old_item, new_item)
+                for idx, (old_item, new_item) in enumerate(zip(old_value, new_value))
+            )
+            continue
+
+        if old_value != new_value:
+            yield json_path
+
+
+def get_payload_differences(old_payload: Any, new_payload: Any) -> List[str]:
+    """
+    Get the JSON paths of all differences between the two payloads (explain mode)
+    :param old_payload:
+    :param new_payload:
+    :return:
+    """
+    return sorted(iter_payload_differences(old_payload, new_payload))
+
+
+def payload_has_changed(
+        old_payload: Optional[Dict[str, Any]],
+        new_payload: Dict[str, Any],
+        old_payload_digest: Optional[str] = None,
+) -> bool:
+    """
+    Compare the old payload to the new payload, exiting on the first difference.
+    If the digest of the old payload is provided instead, compare digests.
+    :param old_payload:
+    :param new_payload:
+    :param old_payload_digest:
+    :return:
+    """
+    if old_payload_digest is not None:
+        return get_payload_digest(new_payload) != old_payload_digest
+
+    return next(iter_payload_differences(old_payload, new_payload), None) is not None
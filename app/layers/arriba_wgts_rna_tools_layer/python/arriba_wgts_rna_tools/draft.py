@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+Draft workflow run helpers
+
+* Get the latest version of the draft payload
+* Generate a WRU event object with the draft payload merged with the upstream data
+* Recognise a replayed upstream event, whose inputs match the upstream fingerprint recorded on the draft,
+  before the upstream data is resolved
+
+The fingerprints are only recorded when the merge changes the draft data,
+a draft we return unchanged is returned as is (with or without fingerprints).
+"""
+
+# Standard imports
+from typing import Any, Dict, List, Optional
+
+# Local imports
+from .compare import add_payload_data_fingerprint, has_matching_upstream_fingerprint
+from .workflow import (
+    get_latest_payload_from_portal_run_id,
+    get_workflow_run_from_portal_run_id
+)
+
+
+def get_draft_payload(portal_run_id: str) -> Dict[str, Any]:
+    """
+    Get the latest payload from the portal run id
+
+    If genomes.GRCh38Umccr is a key, we switch it to genomes.GRCh38_umccr
+    The orcabusId and payloadRefId are stripped from the payload
+
+    Transient api errors are retried by the transport, any other error is raised
+    rather than handing back an empty payload to merge into
+    :param portal_run_id:
+    :return:
+    """
+    payload = get_latest_payload_from_portal_run_id(portal_run_id)
+
+    # Get the genomes.GRCh38Umccr key and change it to genomes.GRCh38_umccr
+    if "GRCh38Umccr" in payload.get("data", {}).get("inputs", {}).get("genomes", {}):
+        payload["data"]["inputs"]["genomes"]["GRCh38_umccr"] = payload["data"]["inputs"]["genomes"].pop("GRCh38Umccr")
+
+    # Strip orcabusId and the payload ref id from the payload
+    if "orcabusId" in payload:
+        del payload['orcabusId']
+
+    # Strip the payload ref id
+    if "payloadRefId" in payload:
+        del payload['payloadRefId']
+
+    return payload
+
+
+def merge_upstream_data(data: Dict[str, Any], upstream_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merge the upstream data into the draft payload data (in place),
+    existing alignment data is never overwritten
+    :param data:
+    :param upstream_data:
+    :return:
+    """
+    if data.get("inputs", None) is None:
+        data["inputs"] = {}
+
+    if data["inputs"].get("alignmentData", None) is None:
+        data["inputs"]["alignmentData"] = upstream_data.get('alignmentData', None)
+
+    return data
+
+
+def is_unchanged_replay(payload: Dict[str, Any], upstream_fingerprint: str) -> bool:
+    """
+    Check if the upstream event inputs have already been merged into the draft,
+    i.e the upstream event is a replay, and the draft has not been modified since.
+    Only the draft payload is needed, so this is checked before the upstream data is resolved
+    :param payload:
+    :param upstream_fingerprint: See compare.get_upstream_fingerprint
+    :return:
+    """
+    return has_matching_upstream_fingerprint(payload['data'], upstream_fingerprint)
+
+
+def generate_workflow_run_update(
+        portal_run_id: str,
+        payload: Dict[str, Any],
+        upstream_data: Dict[str, Any],
+        libraries: Optional[List[Dict[str, Any]]] = None,
+        upstream_fingerprint: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Generate WRU event object with merged data,
+    if the merge changes the payload data, the fingerprint of the merged data
+    (and the upstream fingerprint if provided) is recorded in the payload data tags
+    :param portal_run_id:
+    :param payload:
+    :param upstream_data:
+    :param libraries:
+    :param upstream_fingerprint: See compare.get_upstream_fingerprint
+    :return:
+    """
+    # Create a copy of the oncoanalyser draft workflow run object to update
+    draft_workflow_run = get_workflow_run_from_portal_run_id(
+        portal_run_id=portal_run_id
+    )
+
+    # Make a copy
+    draft_workflow_update = draft_workflow_run.copy()
+
+    # Remove 'currentState' and replace with 'status'
+    draft_workflow_update['status'] = draft_workflow_update.pop('currentState')['status']
+
+    # Add in the libraries if provided
+    if libraries is not None:
+        draft_workflow_update["libraries"] = list(map(
+            lambda library_iter: {
+                "libraryId": library_iter['libraryId'],
+                "orcabusId": library_iter['orcabusId'],
+                "readsets": library_iter.get('readsets', [])
+            },
+            libraries
+        ))
+
+    # First check if the oncoanalyser draft workflow object has the fields we would update with the
+
+    # Generate a workflow run update object with the merged data
+    if (
+            (
+                    payload['data'].get("inputs", {}).get("alignmentData", None) is not None
+            )
+    ):
+        # Return the OG, we dont want to overwrite existing data
+        draft_workflow_update["payload"] = {
+            "version": payload['version'],
+            "data": payload['data']
+        }
+        return draft_workflow_update
+
+    # Merge the data from the dragen draft payload into the oncoanalyser draft payload
+    new_data_object = merge_upstream_data(payload['data'].copy(), upstream_data)
+
+    # Update the inputs with the dragen draft payload data
+    draft_workflow_update["payload"] = {
+        "version": payload['version'],
+        "data": add_payload_data_fingerprint(new_data_object, upstream_fingerprint)
+    }
+
+    return draft_workflow_update
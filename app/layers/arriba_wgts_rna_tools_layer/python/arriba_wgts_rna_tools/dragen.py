@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+DRAGEN WGTS RNA output helpers
+
+1 Get the analysis root prefix of a DRAGEN WGTS RNA portal run id
+2 Get the BAM file from that workflow
+"""
+
+# Standard imports
+from os import environ
+from typing import Dict, Iterable, Optional
+from pathlib import Path
+from urllib.parse import urlparse, urlunparse
+
+# Local imports
+from .cache import MemoisingCache
+from .filemanager import iter_files_from_portal_run_id
+from .workflow import get_latest_payload_from_portal_run_id
+
+# Globals
+DRAGEN_WGTS_RNA_WORKFLOW_RUN_NAME = "dragen-wgts-rna"
+ROOT_PREFIX_INDEX_TTL_SECONDS_ENV_VAR = "ROOT_PREFIX_INDEX_TTL_SECONDS"
+DEFAULT_ROOT_PREFIX_INDEX_TTL_SECONDS = 3600
+ROOT_PREFIX_INDEX_MAX_SIZE = 1024
+
+# Portal run id -> analysis root prefix
+# The root prefix of a succeeded portal run does not change, so we can hold on to it
+# for the life of the container
+ROOT_PREFIX_INDEX = MemoisingCache(
+    name="portalRunIdRootPrefix",
+    ttl_seconds=float(environ.get(ROOT_PREFIX_INDEX_TTL_SECONDS_ENV_VAR, DEFAULT_ROOT_PREFIX_INDEX_TTL_SECONDS)),
+    max_size=ROOT_PREFIX_INDEX_MAX_SIZE,
+)
+
+def extend_s3_uri_path(analysis_root_prefix: str, path: str) -> str:
+    s3_obj = urlparse(analysis_root_prefix)
+
+    return str(urlunparse((
+        s3_obj.scheme, s3_obj.netloc,
+        str(Path(s3_obj.path) / path) + ("/" if path.endswith("/") else ""),
+        None, None, None
+    )))
+
+def get_first_analysis_file(file_list: Iterable[Dict]) -> Optional[Dict]:
+    """
+    Get the first non-cache file, we stop as soon as we find one
+    rather than filtering (or requesting) the whole (potentially thousands of files) list
+    :param file_list:
+    :return:
+    """
+    return next(
+        filter(
+            lambda file_iter_: '/cache/' not in file_iter_['key'],
+            file_list
+        ),
+        None
+    )
+
+
+def get_portal_run_id_root_prefix(portal_run_id: str) -> str:
+    """
+    Get the analysis root prefix for the portal run id,
+    repeat lookups are served from the root prefix index rather than the file manager
+    :param portal_run_id:
+    :return:
+    """
+    return ROOT_PREFIX_INDEX.get_or_set(
+        portal_run_id,
+        lambda: _get_portal_run_id_root_prefix_from_file_manager(portal_run_id)
+    )
+
+
+def _get_portal_run_id_root_prefix_from_file_manager(portal_run_id: str) -> str:
+    # Get portal run id midfix from portal_run_id
+    portal_run_id_analysis_file = get_first_analysis_file(
+        iter_files_from_portal_run_id(
+            portal_run_id
+        )
+    )
+
+    if portal_run_id_analysis_file is None:
+        raise ValueError(f"No files found for portal run id {portal_run_id}")
+
+    # Get root for the portal run id
+    parts_list = []
+    for idx, part in enumerate(Path(portal_run_id_analysis_file['key']).parts):
+        if part == portal_run_id:
+            parts_list.append(part)
+            break
+        else:
+            parts_list.append(part)
+    return str(urlunparse((
+        "s3", portal_run_id_analysis_file['bucket'], str("/".join(parts_list)), None, None, None
+    )))
+
+
+def get_alignment_data(
+        portal_run_id: str,
+) -> Dict[str, str]:
+
+    # Portal run id prefix
+    portal_run_id_analysis_root_prefix = get_portal_run_id_root_prefix(portal_run_id)
+
+    latest_payload_data = get_latest_payload_from_portal_run_id(
+        portal_run_id=portal_run_id
+    )['data']
+
+    # Get output relative path
+    output_relative_path = Path(latest_payload_data['outputs']['dragenRnaVariantCallingOutputRelPath'])
+
+    # Get the bam file path
+    bam_file = str(output_relative_path / (latest_payload_data['inputs']['sampleName'] + ".bam"))
+
+    return {
+        "bamInput": extend_s3_uri_path(portal_run_id_analysis_root_prefix, bam_file)
+    }
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+"""
+Fastq helpers
+
+Get the readsets (fastq id and rgid pairs) of the current fastq set of a library.
+
+Rgids are returned in the format '<index>+<index2>.<lane>.<instrument_run_id>'
+
+Only the id, index, lane and instrumentRunId of each fastq list row are needed for a readset,
+so the fastq list rows of a fastq set are paged through (FASTQ_LIST_ROWS_PER_PAGE rows at a time),
+and each page is projected to its readsets before the next page is requested,
+at most one page of full fastq objects (file / qc details) is held at a time.
+The fastq api has no field selection, so the rows of each page are still returned in full.
+
+Since we already have the fastq ids, callers do not need to look them back up from the rgids.
+
+Requests go through the shared transport (see transport.py).
+
+The readsets of a fastq set are cached per container, keyed by the fastq set id,
+the TTL and size bound can be set with the following environment variables
+  * FASTQ_SET_READSET_CACHE_TTL_SECONDS (default 300)
+  * FASTQ_SET_READSET_CACHE_MAX_SIZE (default 128)
+  * FASTQ_LIST_ROWS_PER_PAGE (default 100)
+"""
+
+# Standard imports
+import typing
+from os import environ
+from typing import Dict, Iterable, Iterator, List
+
+# Local imports
+from .cache import MemoisingCache, DEFAULT_MAX_SIZE
+from .transport import iter_api_results
+
+# Type checking imports
+if typing.TYPE_CHECKING:
+    from orcabus_api_tools.fastq.models import Fastq
+
+# Globals
+FASTQ_SUBDOMAIN = "fastq"
+FASTQ_ENDPOINT = "api/v1/fastq"
+FASTQ_SET_ENDPOINT = "api/v1/fastqSet"
+FASTQ_SET_READSET_CACHE_TTL_SECONDS_ENV_VAR = "FASTQ_SET_READSET_CACHE_TTL_SECONDS"
+FASTQ_SET_READSET_CACHE_MAX_SIZE_ENV_VAR = "FASTQ_SET_READSET_CACHE_MAX_SIZE"
+FASTQ_LIST_ROWS_PER_PAGE_ENV_VAR = "FASTQ_LIST_ROWS_PER_PAGE"
+DEFAULT_FASTQ_SET_READSET_CACHE_TTL_SECONDS = 300
+DEFAULT_FASTQ_LIST_ROWS_PER_PAGE = 100
+
+# Fastq set id -> readset list
+FASTQ_SET_READSET_CACHE = MemoisingCache(
+    name="fastqSetReadsets",
+    ttl_seconds=float(environ.get(FASTQ_SET_READSET_CACHE_TTL_SECONDS_ENV_VAR, DEFAULT_FASTQ_SET_READSET_CACHE_TTL_SECONDS)),
+    max_size=int(environ.get(FASTQ_SET_READSET_CACHE_MAX_SIZE_ENV_VAR, DEFAULT_MAX_SIZE)),
+)
+
+
+def get_rgid_from_fastq_obj(fastq_obj: 'Fastq') -> str:
+    return ".".join([
+        fastq_obj['index'],
+        str(fastq_obj['lane']),
+        fastq_obj['instrumentRunId']
+    ])
+
+
+def get_fastq_by_rgid(rgid: str) -> 'Fastq':
+    """
+    Get the (current) fastq object from its rgid
+    :param rgid:
+    :return:
+    """
+    fastq_list = list(iter_api_results(
+        "fastq.get_fastq_by_rgid",
+        FASTQ_SUBDOMAIN, FASTQ_ENDPOINT,
+        params={"rgid": rgid}
+    ))
+
+    if len(fastq_list) != 1:
+        raise ValueError(f"Expected exactly one fastq for rgid {rgid}, found {len(fastq_list)}")
+
+    return fastq_list[0]
+
+
+def iter_fastq_list_rows_in_fastq_set(fastq_set_id: str) -> Iterator['Fastq']:
+    """
+    Iterate over the fastq list rows in the fastq set,
+    the next page is only requested once the rows of the current page have been consumed
+    :param fastq_set_id:
+    :return:
+    """
+    return iter_api_results(
+        "fastq.get_fastq_list_rows_in_fastq_set",
+        FASTQ_SUBDOMAIN, FASTQ_ENDPOINT,
+        params={"fastqSetId": fastq_set_id},
+        rows_per_page=int(environ.get(FASTQ_LIST_ROWS_PER_PAGE_ENV_VAR, DEFAULT_FASTQ_LIST_ROWS_PER_PAGE)),
+    )
+
+
+def iter_readsets_from_fastq_list(fastqs_list: Iterable['Fastq']) -> Iterator[Dict[str, str]]:
+    """
+    Project each fastq list row to its readset, one row at a time
+    :param fastqs_list:
+    :return:
+    """
+    for fastq_obj in fastqs_list:
+        yield {
+            "orcabusId": fastq_obj['id'],
+            "rgid": get_rgid_from_fastq_obj(fastq_obj),
+        }
+
+
+def get_fastq_set_readset_list(fastq_set_id: str) -> List[Dict[str, str]]:
+    """
+    Get the readsets (fastq id and rgid) of the fastq list rows in the fastq set,
+    projected page by page as the rows are read
+    :param fastq_set_id:
+    :return:
+    """
+    return FASTQ_SET_READSET_CACHE.get_or_set(
+        fastq_set_id,
+        lambda: list(iter_readsets_from_fastq_list(
+            iter_fastq_list_rows_in_fastq_set(fastq_set_id)
+        ))
+    )
+
+
+def get_current_fastq_set_readset_list(library_id: str) -> List[Dict[str, str]]:
+    """
+    Given a library id, use the fastq set endpoint to collect all readsets in the current fastq set of the library
+    :param library_id:
+    :return:
+    """
+    fastq_sets = list(iter_api_results(
+        "fastq.get_fastq_sets",
+        FASTQ_SUBDOMAIN, FASTQ_SET_ENDPOINT,
+        params={
+            "library": library_id,
+            "currentFastqSet": "true",
+        }
+    ))
+
+    if len(fastq_sets) != 1:
+        raise ValueError(f"Expected exactly one current fastq set for library {library_id}, found {len(fastq_sets)}")
+
+    # Get the readsets of the fastqs in the fastq set
+    return get_fastq_set_readset_list(fastq_sets[0]['id'])
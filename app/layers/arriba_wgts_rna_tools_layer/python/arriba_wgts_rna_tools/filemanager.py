@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""
+OrcaBus filemanager lookups used by the lambdas
+
+* Iterate over the (current) files of a portal run, one page at a time
+* Get the (current) file objects of an s3 uri
+
+Requests go through the shared transport (see transport.py),
+so listings can be stopped early, i.e as soon as the first analysis file is found.
+"""
+
+# Standard imports
+from typing import Any, Dict, Iterator, List
+from urllib.parse import urlparse
+
+# Local imports
+from .transport import iter_api_results
+
+# Globals
+FILEMANAGER_SUBDOMAIN = "file"
+S3_ENDPOINT = "api/v1/s3"
+
+
+def iter_files_from_portal_run_id(portal_run_id: str) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the current file objects with the portal run id in their key,
+    the next page is only requested once the caller needs it
+    :param portal_run_id:
+    :return:
+    """
+    return iter_api_results(
+        "filemanager.list_files_from_portal_run_id",
+        FILEMANAGER_SUBDOMAIN, S3_ENDPOINT,
+        params={
+            "key": f"*{portal_run_id}*",
+            "currentState": "true",
+        }
+    )
+
+
+def get_file_objects_from_s3_uri(s3_uri: str) -> List[Dict[str, Any]]:
+    """
+    Get the current file objects of the s3 uri, an empty list if the file is not in the filemanager
+    :param s3_uri:
+    :return:
+    """
+    s3_obj = urlparse(s3_uri)
+    return list(iter_api_results(
+        "filemanager.get_file_object_from_s3_uri",
+        FILEMANAGER_SUBDOMAIN, S3_ENDPOINT,
+        params={
+            "bucket": s3_obj.netloc,
+            "key": s3_obj.path.lstrip("/"),
+            "currentState": "true",
+        }
+    ))
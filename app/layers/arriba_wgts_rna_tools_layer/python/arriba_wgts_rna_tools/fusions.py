@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+
+"""
+Streaming Arriba fusions.tsv summariser
+
+Reads an Arriba fusions.tsv as a stream of fixed-size byte chunks (i.e from an S3 object body),
+and writes a compact columnar summary of the fusion calls (the ARFS sidecar), along with headline counts.
+
+Only the leading columns of each line are parsed, the trailing columns
+(fusion_transcript, peptide_sequence and read_identifiers, which make up most of a large fusions.tsv)
+are skipped without being buffered, so memory is bounded by the chunk size, the row group size
+and the number of distinct genes, not by the size of the file (or of its longest line).
+
+The ARFS sidecar is laid out like a (much simpler) parquet file
+  * the magic bytes
+  * row groups, each a run of little-endian typed arrays, one per column
+  * a json footer with the column types, the row group offsets, the gene / chromosome dictionaries and the headline counts
+  * the footer length (uint64, little-endian), then the magic bytes again
+
+Columns
+  * gene1, gene2: uint32 index into the gene dictionary
+  * chromosome1, chromosome2: uint16 index into the chromosome dictionary
+  * position1, position2: uint32 breakpoint positions
+  * confidence: uint8 index into the confidence levels (low, medium, high), 255 if unknown
+  * splitReads1, splitReads2, discordantMates: uint32 read counts
+
+The sidecar can be read back with read_fusions_summary (column arrays per row group) or iter_fusions_summary_rows.
+"""
+
+# Standard imports
+import json
+import struct
+import sys
+from array import array
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Globals
+ARFS_MAGIC = b"ARFS0001"
+ARFS_FORMAT_VERSION = 1
+FOOTER_LENGTH_STRUCT = struct.Struct("<Q")
+
+DEFAULT_CHUNK_SIZE_BYTES = 1024 * 1024
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+UNKNOWN_CONFIDENCE_INDEX = 255
+CONFIDENCE_LEVELS = ["low", "medium", "high"]
+
+# Summary column -> (array typecode, arriba fusions.tsv column)
+SUMMARY_COLUMNS: Dict[str, Tuple[str, Optional[str]]] = {
+    "gene1": ("I", "gene1"),
+    "gene2": ("I", "gene2"),
+    "chromosome1": ("H", None),
+    "position1": ("I", "breakpoint1"),
+    "chromosome2": ("H", None),
+    "position2": ("I", "breakpoint2"),
+    "confidence": ("B", "confidence"),
+    "splitReads1": ("I", "split_reads1"),
+    "splitReads2": ("I", "split_reads2"),
+    "discordantMates": ("I", "discordant_mates"),
+}
+
+# The fusions.tsv columns we read, in the order we need them
+FUSIONS_TSV_COLUMNS = [
+    "gene1", "gene2", "breakpoint1", "breakpoint2",
+    "split_reads1", "split_reads2", "discordant_mates", "confidence",
+]
+
+
+class FusionsTsvFormatError(ValueError):
+    """
+    The input is not an Arriba fusions.tsv (or an ARFS sidecar)
+    """
+
+
+def _find_fields_end(buffer: bytes, start: int, end: int, tab_count: int) -> int:
+    """
+    Get the position of the tab_count-th tab in buffer[start:end], -1 if there are fewer tabs
+    :param buffer:
+    :param start:
+    :param end:
+    :param tab_count:
+    :return:
+    """
+    pos = start - 1
+    for _ in range(tab_count):
+        pos = buffer.find(b"\t", pos + 1, end)
+        if pos == -1:
+            return -1
+    return pos
+
+
+def _split_fields(line: bytes) -> List[bytes]:
+    return line.rstrip(b"\r").split(b"\t")
+
+
+def iter_leading_fields(chunk_iter: Iterable[bytes], field_count: int) -> Iterator[List[bytes]]:
+    """
+    Yield (up to) the first field_count tab separated fields of each line in the chunked stream.
+    The rest of each line is skipped without being copied, however long it is
+    :param chunk_iter:
+    :param field_count:
+    :return:
+    """
+    # The leading fields of a line that started in a previous chunk
+    carry: Optional[bytes] = None
+    # We have what we need from the current line, skip to the next newline
+    skip_to_newline = False
+
+    for chunk in chunk_iter:
+        pos = 0
+        chunk_len = len(chunk)
+
+        if skip_to_newline:
+            newline = chunk.find(b"\n")
+            if newline == -1:
+                continue
+            skip_to_newline = False
+            pos = newline + 1
+
+        if carry is not None:
+            newline = chunk.find(b"\n", pos)
+            segment_end = chunk_len if newline == -1 else newline
+            fields_end = _find_fields_end(chunk, pos, segment_end, field_count - carry.count(b"\t"))
+            if fields_end != -1:
+                yield _split_fields(carry + chunk[pos:fields_end])
+                carry = None
+                if newline == -1:
+                    skip_to_newline = True
+                    continue
+            else:
+                carry += chunk[pos:segment_end]
+                if newline == -1:
+                    continue
+                if carry:
+                    yield _split_fields(carry)
+                carry = None
+            pos = newline + 1
+
+        while pos < chunk_len:
+            newline = chunk.find(b"\n", pos)
+            segment_end = chunk_len if newline == -1 else newline
+            fields_end = _find_fields_end(chunk, pos, segment_end, field_count)
+
+            if newline == -1:
+                if fields_end != -1:
+                    yield _split_fields(chunk[pos:fields_end])
+                    skip_to_newline = True
+                else:
+                    carry = chunk[pos:segment_end]
+                break
+
+            if segment_end > pos:
+                yield _split_fields(chunk[pos:segment_end if fields_end == -1 else fields_end])
+            pos = newline + 1
+
+    if carry:
+        yield _split_fields(carry)
+
+
+def read_header(chunk_iter: Iterator[bytes]) -> Tuple[List[str], bytes]:
+    """
+    Read the header line of the fusions.tsv
+    :param chunk_iter:
+    :return: The column names, and the rest of the chunk the header ended in
+    """
+    buffer = b""
+    for chunk in chunk_iter:
+        buffer += chunk
+        newline = buffer.find(b"\n")
+        if newline != -1:
+            header_line, remainder = buffer[:newline], buffer[newline + 1:]
+            break
+        if len(buffer) > DEFAULT_CHUNK_SIZE_BYTES:
+            raise FusionsTsvFormatError("No header line found in the first chunk of the fusions.tsv")
+    else:
+        header_line, remainder = buffer, b""
+
+    column_names = list(map(
+        lambda column_iter_: column_iter_.decode().strip(),
+        header_line.rstrip(b"\r").lstrip(b"#").split(b"\t")
+    ))
+    missing_column_names = list(filter(
+        lambda column_name_iter_: column_name_iter_ not in column_names,
+        FUSIONS_TSV_COLUMNS
+    ))
+    if missing_column_names:
+        raise FusionsTsvFormatError(f"The fusions.tsv header is missing the columns {', '.join(missing_column_names)}")
+
+    return column_names, remainder
+
+
+def to_count(field: bytes) -> int:
+    try:
+        return int(field)
+    except ValueError:
+        # i.e '.'
+        return 0
+
+
+class FusionsSummaryWriter:
+    """
+    Write the summary columns to an ARFS sidecar, one row group at a time
+    """
+
+    def __init__(self, output_h: BinaryIO, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        self.output_h = output_h
+        self.row_group_size = row_group_size
+
+        self._gene_index: Dict[bytes, int] = {}
+        self._chromosome_index: Dict[bytes, int] = {}
+        self._confidence_index: Dict[bytes, int] = dict(map(
+            lambda level_iter_: (level_iter_[1].encode(), level_iter_[0]),
+            enumerate(CONFIDENCE_LEVELS)
+        ))
+
+        self._columns: Dict[str, array] = {}
+        self._row_group_list: List[Dict[str, Any]] = []
+        self._offset = 0
+
+        self.row_count = 0
+        self.confidence_counts = [0] * len(CONFIDENCE_LEVELS)
+
+        self._write(ARFS_MAGIC)
+        self._new_row_group()
+
+    def _write(self, data: bytes):
+        self.output_h.write(data)
+        self._offset += len(data)
+
+    def _new_row_group(self):
+        self._columns = {
+            column_name: array(typecode)
+            for column_name, (typecode, _) in SUMMARY_COLUMNS.items()
+        }
+
+    def _get_index(self, index: Dict[bytes, int], value: bytes) -> int:
+        value_index = index.get(value, None)
+        if value_index is None:
+            value_index = len(index)
+            index[value] = value_index
+        return value_index
+
+    def _get_breakpoint(self, breakpoint_field: bytes) -> Tuple[int, int]:
+        chromosome, _, position = breakpoint_field.rpartition(b":")
+        return self._get_index(self._chromosome_index, chromosome), to_count(position)
+
+    def add_row(self, gene1: bytes, gene2: bytes, breakpoint1: bytes, breakpoint2: bytes,
+                split_reads1: bytes, split_reads2: bytes, discordant_mates: bytes, confidence: bytes):
+        chromosome1, position1 = self._get_breakpoint(breakpoint1)
+        chromosome2, position2 = self._get_breakpoint(breakpoint2)
+        confidence_index = self._confidence_index.get(confidence, UNKNOWN_CONFIDENCE_INDEX)
+
+        columns = self._columns
+        columns["gene1"].append(self._get_index(self._gene_index, gene1))
+        columns["gene2"].append(self._get_index(self._gene_index, gene2))
+        columns["chromosome1"].append(chromosome1)
+        columns["position1"].append(position1)
+        columns["chromosome2"].append(chromosome2)
+        columns["position2"].append(position2)
+        columns["confidence"].append(confidence_index)
+        columns["splitReads1"].append(to_count(split_reads1))
+        columns["splitReads2"].append(to_count(split_reads2))
+        columns["discordantMates"].append(to_count(discordant_mates))
+
+        self.row_count += 1
+        if confidence_index != UNKNOWN_CONFIDENCE_INDEX:
+            self.confidence_counts[confidence_index] += 1
+
+        if len(columns["gene1"]) >= self.row_group_size:
+            self.flush_row_group()
+
+    def flush_row_group(self):
+        row_group_row_count = len(self._columns["gene1"])
+        if row_group_row_count == 0:
+            return
+
+        column_offsets = {}
+        for column_name, column_array in self._columns.items():
+            if sys.byteorder != "little":
+                column_array.byteswap()
+            column_bytes = column_array.tobytes()
+            column_offsets[column_name] = [self._offset, len(column_bytes)]
+            self._write(column_bytes)
+
+        self._row_group_list.append({
+            "rowCount": row_group_row_count,
+            "columns": column_offsets,
+        })
+        self._new_row_group()
+
+    def get_headline_counts(self) -> Dict[str, int]:
+        return {
+            "fusionCount": self.row_count,
+            **{
+                f"{level}ConfidenceFusionCount": self.confidence_counts[idx]
+                for idx, level in enumerate(CONFIDENCE_LEVELS)
+            },
+            "geneCount": len(self._gene_index),
+        }
+
+    def close(self) -> Dict[str, int]:
+        """
+        Flush the last row group and write the footer
+        :return: The headline counts
+        """
+        self.flush_row_group()
+
+        headline_counts = self.get_headline_counts()
+        footer_bytes = json.dumps({
+            "formatVersion": ARFS_FORMAT_VERSION,
+            "rowCount": self.row_count,
+            "columns": [
+                {"name": column_name, "type": typecode}
+                for column_name, (typecode, _) in SUMMARY_COLUMNS.items()
+            ],
+            "dictionaries": {
+                "gene": list(map(lambda gene_iter_: gene_iter_.decode(), self._gene_index.keys())),
+                "chromosome": list(map(lambda chromosome_iter_: chromosome_iter_.decode(), self._chromosome_index.keys())),
+                "confidence": CONFIDENCE_LEVELS,
+            },
+            "rowGroups": self._row_group_list,
+            "headlineCounts": headline_counts,
+        }, separators=(",", ":")).encode()
+
+        self._write(footer_bytes)
+        self._write(FOOTER_LENGTH_STRUCT.pack(len(footer_bytes)))
+        self._write(ARFS_MAGIC)
+
+        return headline_counts
+
+
+def summarise_fusions_tsv(
+        chunk_iter: Iterable[bytes],
+        output_h: BinaryIO,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> Dict[str, int]:
+    """
+    Stream the fusions.tsv chunks into an ARFS sidecar
+    :param chunk_iter: The fusions.tsv, as byte chunks
+    :param output_h: A binary file handle to write the sidecar to
+    :param row_group_size:
+    :return: The headline counts
+    """
+    chunk_iter = iter(chunk_iter)
+    column_names, remainder = read_header(chunk_iter)
+
+    # Positions of the columns we need, we only parse up to the last of them
+    column_positions = list(map(column_names.index, FUSIONS_TSV_COLUMNS))
+    field_count = max(column_positions) + 1
+
+    def _iter_chunks() -> Iterator[bytes]:
+        if remainder:
+            yield remainder
+        yield from chunk_iter
+
+    writer = FusionsSummaryWriter(output_h, row_group_size=row_group_size)
+    for fields in iter_leading_fields(_iter_chunks(), field_count):
+        if len(fields) < field_count:
+            raise FusionsTsvFormatError(
+                f"Expected at least {field_count} columns in row {writer.row_count + 1}, got {len(fields)}"
+            )
+        writer.add_row(*map(fields.__getitem__, column_positions))
+
+    return writer.close()
+
+
+def read_fusions_summary_footer(input_h: BinaryIO) -> Dict[str, Any]:
+    """
+    Read the footer of an ARFS sidecar
+    :param input_h: A seekable binary file handle
+    :return:
+    """
+    input_h.seek(-(FOOTER_LENGTH_STRUCT.size + len(ARFS_MAGIC)), 2)
+    footer_length_bytes = input_h.read(FOOTER_LENGTH_STRUCT.size)
+    if input_h.read(len(ARFS_MAGIC)) != ARFS_MAGIC:
+        raise FusionsTsvFormatError("Not an ARFS file")
+    footer_length = FOOTER_LENGTH_STRUCT.unpack(footer_length_bytes)[0]
+
+    input_h.seek(-(footer_length + FOOTER_LENGTH_STRUCT.size + len(ARFS_MAGIC)), 2)
+    return json.loads(input_h.read(footer_length))
+
+
+def read_fusions_summary(input_h: BinaryIO) -> Iterator[Dict[str, array]]:
+    """
+    Read the column arrays of an ARFS sidecar, one row group at a time
+    :param input_h: A seekable binary file handle
+    :return:
+    """
+    footer = read_fusions_summary_footer(input_h)
+    column_types = dict(map(
+        lambda column_iter_: (column_iter_['name'], column_iter_['type']),
+        footer['columns']
+    ))
+
+    for row_group in footer['rowGroups']:
+        columns = {}
+        for column_name, (offset, length) in row_group['columns'].items():
+            input_h.seek(offset)
+            column_array = array(column_types[column_name])
+            column_array.frombytes(input_h.read(length))
+            if sys.byteorder != "little":
+                column_array.byteswap()
+            columns[column_name] = column_array
+        yield columns
+
+
+def iter_fusions_summary_rows(input_h: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """
+    Read the rows of an ARFS sidecar, with the dictionary columns decoded
+    :param input_h: A seekable binary file handle
+    :return:
+    """
+    dictionaries = read_fusions_summary_footer(input_h)['dictionaries']
+    for columns in read_fusions_summary(input_h):
+        for idx in range(len(columns["gene1"])):
+            confidence_index = columns["confidence"][idx]
+            yield {
+                "gene1": dictionaries["gene"][columns["gene1"][idx]],
+                "gene2": dictionaries["gene"][columns["gene2"][idx]],
+                "breakpoint1": f"{dictionaries['chromosome'][columns['chromosome1'][idx]]}:{columns['position1'][idx]}",
+                "breakpoint2": f"{dictionaries['chromosome'][columns['chromosome2'][idx]]}:{columns['position2'][idx]}",
+                "confidence": (
+                    dictionaries["confidence"][confidence_index]
+                    if confidence_index != UNKNOWN_CONFIDENCE_INDEX else None
+                ),
+                "splitReads1": columns["splitReads1"][idx],
+                "splitReads2": columns["splitReads2"][idx],
+                "discordantMates": columns["discordantMates"][idx],
+            }
+
+
+# if __name__ == "__main__":
+#     import io
+#
+#     fusions_tsv = (
+#         b"#gene1\tgene2\tstrand1(gene/fusion)\tstrand2(gene/fusion)\tbreakpoint1\tbreakpoint2\tsite1\tsite2\ttype\t"
+#         b"split_reads1\tsplit_reads2\tdiscordant_mates\tcoverage1\tcoverage2\tconfidence\treading_frame\t"
+#         b"tags\tretained_protein_domains\tclosest_genomic_breakpoint1\tclosest_genomic_breakpoint2\t"
+#         b"gene_id1\tgene_id2\ttranscript_id1\ttranscript_id2\tdirection1\tdirection2\tfilters\t"
+#         b"fusion_transcript\tpeptide_sequence\tread_identifiers\n"
+#         b"BCR\tABL1\t+/+\t+/+\t22:23290413\t9:130854064\tsplice-site\tsplice-site\ttranslocation\t"
+#         b"12\t9\t20\t150\t120\thigh\tin-frame\t.\t.\t.\t.\t.\t.\t.\t.\tdownstream\tupstream\t.\t.\t.\tread1,read2\n"
+#     )
+#     summary_h = io.BytesIO()
+#     print(summarise_fusions_tsv(
+#         (fusions_tsv[idx:idx + 64] for idx in range(0, len(fusions_tsv), 64)),
+#         summary_h
+#     ))
+#     # {'fusionCount': 1, 'lowConfidenceFusionCount': 0, 'mediumConfidenceFusionCount': 0, 'highConfidenceFusionCount': 1, 'geneCount': 2}
+#     print(list(iter_fusions_summary_rows(summary_h)))
+#     # [{'gene1': 'BCR', 'gene2': 'ABL1', 'breakpoint1': '22:23290413', 'breakpoint2': '9:130854064', 'confidence': 'high', 'splitReads1': 12, 'splitReads2': 9, 'discordantMates': 20}]
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+"""
+Lazy module imports
+
+Heavy modules (boto3, jsonschema, requests) are expensive to import,
+and on a cold start every handler pays for every module it imports at load time,
+even if the invocation never touches that module.
+
+A lazy module is a placeholder that only imports the real module on first attribute access,
+i.e
+
+boto3 = lazy_import("boto3")
+
+def get_ssm_client():
+    return boto3.client("ssm")  # boto3 is imported here, on first use
+"""
+
+# Standard imports
+from importlib import import_module
+from threading import Lock
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule(ModuleType):
+    """
+    Placeholder for a module that is imported on first attribute access
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        # Set through the instance dict directly so __getattr__ is never triggered for these
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = Lock()
+
+    def _load(self) -> ModuleType:
+        module: Optional[ModuleType] = self.__dict__["_lazy_module"]
+        if module is not None:
+            return module
+
+        with self.__dict__["_lazy_lock"]:
+            if self.__dict__["_lazy_module"] is None:
+                self.__dict__["_lazy_module"] = import_module(self.__name__)
+            return self.__dict__["_lazy_module"]
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._load(), item)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        if self.__dict__["_lazy_module"] is None:
+            return f"<lazy module '{self.__name__}' (not loaded)>"
+        return repr(self.__dict__["_lazy_module"])
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Get a lazy placeholder for the module, the module is imported on first attribute access
+    :param name: The fully qualified module name, i.e 'jsonschema.validators'
+    :return:
+    """
+    return LazyModule(name)
+
+
+def is_loaded(module: Any) -> bool:
+    """
+    Check if a lazy module has been imported yet, regular modules are always loaded
+    :param module:
+    :return:
+    """
+    if isinstance(module, LazyModule):
+        return module.__dict__["_lazy_module"] is not None
+    return True
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+"""
+Arriba output manifest
+
+Given the Arriba output prefix of a succeeded analysis, list the prefix once and record the key files
+(fusions.tsv, fusions.discarded.tsv and the fusions pdf) with their sizes and ETags,
+so that downstream consumers do not need to list the output prefix again,
+and a missing or empty (truncated) key file is reported as soon as the analysis succeeds.
+
+The listing stops as soon as every key file has been found.
+
+Two backends are supported
+  * filemanager: the files of the portal run in the OrcaBus filemanager (no S3 permissions needed)
+  * s3: list the prefix directly, page by page (the lambda role needs s3:ListBucket on the bucket),
+        this backend can be tested against a local S3 stand-in such as moto
+
+{
+  "files": {
+    "fusionsTsv": {
+      "s3Uri": "s3://bucket/analysis/arriba-wgts-rna/20250618abcd1234/L2500373_arriba/fusions.tsv",
+      "size": 123456,
+      "eTag": "d41d8cd98f00b204e9800998ecf8427e"  // pragma: allowlist secret
+    },
+    ...
+  },
+  // Key files that were not found
+  "missingFiles": [],
+  // Key files that were found, but are empty
+  "emptyFiles": []
+}
+"""
+
+# Standard imports
+from pathlib import PurePosixPath
+from typing import Any, Callable, Dict, Iterator, Optional
+from urllib.parse import urlparse, urlunparse
+
+# Local imports
+from .filemanager import iter_files_from_portal_run_id
+from .preflight import get_s3_client, FILEMANAGER_BACKEND, S3_BACKEND
+
+# Globals
+S3_LIST_PAGE_SIZE = 1000
+
+# Output file name -> does this file name match
+ARRIBA_OUTPUT_FILE_MATCHERS: Dict[str, Callable[[str], bool]] = {
+    "fusionsTsv": lambda file_name: file_name == "fusions.tsv",
+    "fusionsDiscardedTsv": lambda file_name: file_name == "fusions.discarded.tsv",
+    "fusionsPdf": lambda file_name: file_name.endswith(".pdf"),
+}
+
+
+def get_s3_uri(bucket: str, key: str) -> str:
+    return str(urlunparse(("s3", bucket, key, None, None, None)))
+
+
+def iter_s3_objects(output_prefix_uri: str, portal_run_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    List the objects under the prefix, one page at a time, the next page is only requested once the caller needs it
+    :param output_prefix_uri:
+    :param portal_run_id: Unused, the prefix is listed directly
+    :return:
+    """
+    s3_obj = urlparse(output_prefix_uri)
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+            Bucket=s3_obj.netloc,
+            Prefix=s3_obj.path.lstrip("/"),
+            PaginationConfig={"PageSize": S3_LIST_PAGE_SIZE},
+    ):
+        for s3_object in page.get("Contents", []):
+            yield {
+                "bucket": s3_obj.netloc,
+                "key": s3_object['Key'],
+                "size": s3_object['Size'],
+                "eTag": s3_object.get('ETag', "").strip('"'),
+            }
+
+
+def iter_filemanager_objects(output_prefix_uri: str, portal_run_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Get the files of the portal run from the filemanager that are under the prefix
+    :param output_prefix_uri:
+    :param portal_run_id:
+    :return:
+    """
+    if portal_run_id is None:
+        raise ValueError("The filemanager backend requires the portal run id")
+
+    s3_obj = urlparse(output_prefix_uri)
+    prefix_key = s3_obj.path.lstrip("/")
+    for file_object in iter_files_from_portal_run_id(portal_run_id):
+        if file_object['bucket'] != s3_obj.netloc or not file_object['key'].startswith(prefix_key):
+            continue
+        yield {
+            "bucket": file_object['bucket'],
+            "key": file_object['key'],
+            "size": file_object.get('size', None),
+            "eTag": (file_object.get('eTag', None) or "").strip('"'),
+        }
+
+
+BACKEND_LIST_FUNCTIONS: Dict[str, Callable[[str, Optional[str]], Iterator[Dict[str, Any]]]] = {
+    FILEMANAGER_BACKEND: iter_filemanager_objects,
+    S3_BACKEND: iter_s3_objects,
+}
+
+
+def get_output_manifest(
+        output_prefix_uri: str,
+        portal_run_id: Optional[str] = None,
+        backend: str = FILEMANAGER_BACKEND,
+        output_file_matchers: Optional[Dict[str, Callable[[str], bool]]] = None,
+) -> Dict[str, Any]:
+    """
+    List the output prefix, stopping once every key file is found, and build the manifest.
+    Where more than one file matches, the first listed is used (for s3, the lexicographically smallest key)
+    :param output_prefix_uri:
+    :param portal_run_id:
+    :param backend:
+    :param output_file_matchers:
+    :return:
+    """
+    if backend not in BACKEND_LIST_FUNCTIONS:
+        raise ValueError(
+            f"Unknown manifest backend '{backend}', expected one of {', '.join(BACKEND_LIST_FUNCTIONS.keys())}"
+        )
+
+    if output_file_matchers is None:
+        output_file_matchers = ARRIBA_OUTPUT_FILE_MATCHERS
+
+    files: Dict[str, Dict[str, Any]] = {}
+    for s3_object in BACKEND_LIST_FUNCTIONS[backend](output_prefix_uri, portal_run_id):
+        file_name = PurePosixPath(s3_object['key']).name
+        for output_name, is_match in output_file_matchers.items():
+            if output_name in files or not is_match(file_name):
+                continue
+            files[output_name] = {
+                "s3Uri": get_s3_uri(s3_object['bucket'], s3_object['key']),
+                "size": s3_object['size'],
+                "eTag": s3_object['eTag'],
+            }
+            break
+
+        # Stop listing as soon as we have every key file
+        if len(files) == len(output_file_matchers):
+            break
+
+    return {
+        # Keep the files in the order of the matchers
+        "files": dict(map(
+            lambda output_name_iter_: (output_name_iter_, files[output_name_iter_]),
+            filter(lambda output_name_iter_: output_name_iter_ in files, output_file_matchers.keys())
+        )),
+        "missingFiles": list(filter(
+            lambda output_name_iter_: output_name_iter_ not in files,
+            output_file_matchers.keys()
+        )),
+        "emptyFiles": list(filter(
+            lambda output_name_iter_: output_name_iter_ in files and files[output_name_iter_]['size'] == 0,
+            output_file_matchers.keys()
+        )),
+    }
+
+
+# Local check against a moto S3 stand-in
+# if __name__ == "__main__":
+#     from os import environ
+#     from moto import mock_aws
+#
+#     environ['AWS_DEFAULT_REGION'] = 'ap-southeast-2'
+#
+#     with mock_aws():
+#         get_s3_client.cache_clear()
+#         get_s3_client().create_bucket(
+#             Bucket='pipeline-cache',
+#             CreateBucketConfiguration={'LocationConstraint': 'ap-southeast-2'}
+#         )
+#         output_prefix = 'analysis/arriba-wgts-rna/20250618abcd1234/L2500373_arriba/'  # pragma: allowlist secret
+#         for file_name, body in [
+#             ('fusions.discarded.tsv', b'#gene1\tgene2\n'),
+#             ('fusions.tsv', b''),
+#             ('L2500373.fusions.pdf', b'%PDF-1.4'),
+#         ]:
+#             get_s3_client().put_object(Bucket='pipeline-cache', Key=output_prefix + file_name, Body=body)
+#
+#         print(get_output_manifest(f's3://pipeline-cache/{output_prefix}', backend=S3_BACKEND))
+#         # {
+#         #   'files': {
+#         #     'fusionsTsv': {'s3Uri': 's3://pipeline-cache/.../fusions.tsv', 'size': 0, 'eTag': 'd41d8cd98f00b204e9800998ecf8427e'},  # pragma: allowlist secret
+#         #     'fusionsDiscardedTsv': {'s3Uri': 's3://pipeline-cache/.../fusions.discarded.tsv', 'size': 14, 'eTag': '...'},
+#         #     'fusionsPdf': {'s3Uri': 's3://pipeline-cache/.../L2500373.fusions.pdf', 'size': 8, 'eTag': '...'}
+#         #   },
+#         #   'missingFiles': [],
+#         #   'emptyFiles': ['fusionsTsv']
+#         # }
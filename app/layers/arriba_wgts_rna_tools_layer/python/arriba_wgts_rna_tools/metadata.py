@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+"""
+Memoised OrcaBus metadata manager library lookups used by the lambdas
+
+Library objects are cached per container, keyed by the library orcabus id.
+Lookups by library id are resolved through the same cache,
+so a library fetched by its orcabus id is not fetched again by its library id (and vice versa).
+Requests go through the shared transport (see transport.py).
+
+Multiple libraries can be fetched concurrently with get_libraries_from_library_orcabus_id_list.
+
+The TTL, size bound and concurrency can be set with the following environment variables
+  * METADATA_API_CACHE_TTL_SECONDS (default 30)
+  * METADATA_API_CACHE_MAX_SIZE (default 128)
+  * METADATA_API_MAX_CONCURRENCY (default 8)
+"""
+
+# Standard imports
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from typing import Any, Dict, List, Optional
+
+# Local imports
+from .cache import MemoisingCache, DEFAULT_TTL_SECONDS, DEFAULT_MAX_SIZE
+from .transport import api_get, iter_api_results
+
+# Type checking imports
+if typing.TYPE_CHECKING:
+    from orcabus_api_tools.metadata.models import LibraryBase
+
+# Globals
+METADATA_SUBDOMAIN = "metadata"
+LIBRARY_ENDPOINT = "api/v1/library"
+METADATA_API_CACHE_TTL_SECONDS_ENV_VAR = "METADATA_API_CACHE_TTL_SECONDS"
+METADATA_API_CACHE_MAX_SIZE_ENV_VAR = "METADATA_API_CACHE_MAX_SIZE"
+METADATA_API_MAX_CONCURRENCY_ENV_VAR = "METADATA_API_MAX_CONCURRENCY"
+DEFAULT_METADATA_API_MAX_CONCURRENCY = 8
+
+# Library orcabus id -> library object
+LIBRARY_CACHE = MemoisingCache(
+    name="library",
+    ttl_seconds=float(environ.get(METADATA_API_CACHE_TTL_SECONDS_ENV_VAR, DEFAULT_TTL_SECONDS)),
+    max_size=int(environ.get(METADATA_API_CACHE_MAX_SIZE_ENV_VAR, DEFAULT_MAX_SIZE)),
+)
+# Library id -> library orcabus id
+LIBRARY_ORCABUS_ID_CACHE = MemoisingCache(
+    name="libraryOrcabusId",
+    ttl_seconds=float(environ.get(METADATA_API_CACHE_TTL_SECONDS_ENV_VAR, DEFAULT_TTL_SECONDS)),
+    max_size=int(environ.get(METADATA_API_CACHE_MAX_SIZE_ENV_VAR, DEFAULT_MAX_SIZE)),
+)
+
+
+def _get_library_from_library_orcabus_id(library_orcabus_id: str) -> 'LibraryBase':
+    return api_get(
+        "metadata.get_library_from_library_orcabus_id",
+        METADATA_SUBDOMAIN, f"{LIBRARY_ENDPOINT}/{library_orcabus_id}"
+    )
+
+
+def _get_library_from_library_id(library_id: str) -> 'LibraryBase':
+    library_list = list(iter_api_results(
+        "metadata.get_library_from_library_id",
+        METADATA_SUBDOMAIN, LIBRARY_ENDPOINT,
+        params={"libraryId": library_id}
+    ))
+
+    if len(library_list) != 1:
+        raise ValueError(f"Expected exactly one library for library id {library_id}, found {len(library_list)}")
+
+    return library_list[0]
+
+
+def get_library_from_library_orcabus_id(library_orcabus_id: str) -> 'LibraryBase':
+    """
+    Get the library object from the library orcabus id
+    :param library_orcabus_id:
+    :return:
+    """
+    def _lookup() -> 'LibraryBase':
+        library_obj = _get_library_from_library_orcabus_id(library_orcabus_id)
+        LIBRARY_ORCABUS_ID_CACHE.set(library_obj['libraryId'], library_orcabus_id)
+        return library_obj
+
+    return LIBRARY_CACHE.get_or_set(library_orcabus_id, _lookup)
+
+
+def get_library_from_library_id(library_id: str) -> 'LibraryBase':
+    """
+    Get the library object from the library id,
+    served from the library cache if we have already seen this library (by either id)
+    :param library_id:
+    :return:
+    """
+    fetched_library_obj: Optional['LibraryBase'] = None
+
+    def _lookup_orcabus_id() -> str:
+        nonlocal fetched_library_obj
+        fetched_library_obj = _get_library_from_library_id(library_id)
+        LIBRARY_CACHE.set(fetched_library_obj['orcabusId'], fetched_library_obj)
+        return fetched_library_obj['orcabusId']
+
+    library_orcabus_id = LIBRARY_ORCABUS_ID_CACHE.get_or_set(library_id, _lookup_orcabus_id)
+
+    # We performed the lookup ourselves, no need to go back through the cache
+    if fetched_library_obj is not None:
+        return fetched_library_obj
+
+    return get_library_from_library_orcabus_id(library_orcabus_id)
+
+
+def get_libraries_from_library_orcabus_id_list(
+        library_orcabus_id_list: List[str],
+        max_concurrency: Optional[int] = None
+) -> List['LibraryBase']:
+    """
+    Get the library objects for each library orcabus id (in order), fetching concurrently.
+    Duplicate orcabus ids are only fetched once
+    :param library_orcabus_id_list:
+    :param max_concurrency:
+    :return:
+    """
+    unique_library_orcabus_id_list = list(dict.fromkeys(library_orcabus_id_list))
+
+    if max_concurrency is None:
+        max_concurrency = int(environ.get(METADATA_API_MAX_CONCURRENCY_ENV_VAR, DEFAULT_METADATA_API_MAX_CONCURRENCY))
+    max_concurrency = max(1, max_concurrency)
+
+    # No need to spin up a pool for a single library
+    if len(unique_library_orcabus_id_list) <= 1 or max_concurrency == 1:
+        library_obj_list = list(map(get_library_from_library_orcabus_id, unique_library_orcabus_id_list))
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(unique_library_orcabus_id_list))) as executor:
+            library_obj_list = list(executor.map(get_library_from_library_orcabus_id, unique_library_orcabus_id_list))
+
+    library_obj_by_orcabus_id = dict(zip(unique_library_orcabus_id_list, library_obj_list))
+
+    return list(map(
+        lambda library_orcabus_id_iter_: library_obj_by_orcabus_id[library_orcabus_id_iter_],
+        library_orcabus_id_list
+    ))
+
+
+def get_metadata_cache_stats() -> List[Dict[str, Any]]:
+    """
+    Get the hit / miss counters for the metadata api caches
+    :return:
+    """
+    return [
+        LIBRARY_CACHE.get_stats(),
+        LIBRARY_ORCABUS_ID_CACHE.get_stats(),
+    ]
+
+
+def clear_metadata_cache():
+    """
+    Clear the metadata api caches
+    :return:
+    """
+    LIBRARY_CACHE.invalidate()
+    LIBRARY_ORCABUS_ID_CACHE.invalidate()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+"""
+Handler metrics, emitted as CloudWatch Embedded Metric Format (EMF) log lines
+
+Decorate a handler with instrument_handler to record, per invocation
+  * Duration, and whether the invocation errored
+  * ColdStart (1 on the first invocation of the container, 0 otherwise)
+  * EventBytes / ResponseBytes, the size of the (json) event and response, if payload sizes are enabled
+    (the lambda runtime does not hand the handler the payload size, so sizing means serialising
+    the event and response again, off by default)
+  * ApiCalls / ApiRetries / ApiErrors / ApiTime, for each OrcaBus api request or boto3 call made (see transport.py)
+  * CacheHits / CacheMisses, for each memoising cache used (see cache.py)
+
+i.e
+
+@instrument_handler
+def handler(event, context):
+    ...
+
+One EMF line is written to stdout for the invocation (dimension FunctionName),
+then one line per api function called (dimensions FunctionName, ApiFunction)
+and one line per cache used (dimensions FunctionName, CacheName).
+CloudWatch extracts the metrics from the lambda log group, no api calls are made.
+
+Invocation scoped caches (see cache.py) are cleared at the start of each invocation, in either mode.
+
+The emitted log lines can be checked offline with app/benchmarks/check_handler_metrics.py
+
+The mode, namespace and payload sizes can be set with the following environment variables
+  * HANDLER_METRICS_MODE, 'emf' (default) or 'off' (the handler is called as is)
+  * HANDLER_METRICS_NAMESPACE (default 'OrcaBus/ArribaWgtsRnaPipelineManager')
+  * HANDLER_METRICS_PAYLOAD_SIZES, 'true' to record EventBytes / ResponseBytes (default 'false')
+"""
+
+# Standard imports
+import json
+import sys
+from functools import wraps
+from os import environ
+from time import perf_counter, time
+from typing import Any, Callable, Dict, List, Optional
+
+# Local imports
+from .cache import clear_invocation_scoped_caches, get_all_cache_stats
+from .transport import get_api_call_stats
+
+# Globals
+HANDLER_METRICS_MODE_ENV_VAR = "HANDLER_METRICS_MODE"
+HANDLER_METRICS_NAMESPACE_ENV_VAR = "HANDLER_METRICS_NAMESPACE"
+HANDLER_METRICS_PAYLOAD_SIZES_ENV_VAR = "HANDLER_METRICS_PAYLOAD_SIZES"
+EMF_MODE = "emf"
+OFF_MODE = "off"
+DEFAULT_HANDLER_METRICS_NAMESPACE = "OrcaBus/ArribaWgtsRnaPipelineManager"
+
+MILLISECONDS_UNIT = "Milliseconds"
+BYTES_UNIT = "Bytes"
+COUNT_UNIT = "Count"
+
+# Set to False after the first invocation of the container
+_IS_COLD_START = True
+
+
+def get_json_size(obj: Any) -> int:
+    return len(json.dumps(obj, default=str, separators=(",", ":")).encode())
+
+
+def is_payload_sizes_enabled() -> bool:
+    return environ.get(HANDLER_METRICS_PAYLOAD_SIZES_ENV_VAR, "false").lower() == "true"
+
+
+def get_function_name(handler: Callable, context: Any) -> str:
+    """
+    The lambda function name, falling back to the handler module name (i.e when run locally)
+    :param handler:
+    :param context:
+    :return:
+    """
+    return (
+        getattr(context, "function_name", None) or
+        environ.get("AWS_LAMBDA_FUNCTION_NAME", None) or
+        handler.__module__
+    )
+
+
+def get_stats_delta(
+        before_list: List[Dict[str, Any]],
+        after_list: List[Dict[str, Any]],
+        counter_keys: List[str]
+) -> List[Dict[str, Any]]:
+    """
+    Get the change in each named counter over the invocation, unchanged entries are dropped
+    :param before_list:
+    :param after_list:
+    :param counter_keys:
+    :return:
+    """
+    before_by_name = dict(map(lambda stats_iter_: (stats_iter_['name'], stats_iter_), before_list))
+
+    delta_list = []
+    for after in after_list:
+        before = before_by_name.get(after['name'], {})
+        delta = {
+            key: after.get(key, 0) - before.get(key, 0)
+            for key in counter_keys
+        }
+        if any(delta.values()):
+            delta_list.append({"name": after['name'], **delta})
+    return delta_list
+
+
+def build_emf_document(
+        namespace: str,
+        dimensions: Dict[str, str],
+        metrics: Dict[str, float],
+        units: Dict[str, str],
+        timestamp_ms: int,
+        properties: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Build an EMF log document
+    :param namespace:
+    :param dimensions: Dimension name -> value
+    :param metrics: Metric name -> value
+    :param units: Metric name -> unit
+    :param timestamp_ms:
+    :param properties: Extra (non-metric) fields, searchable in logs insights
+    :return:
+    """
+    return {
+        "_aws": {
+            "Timestamp": timestamp_ms,
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": namespace,
+                    "Dimensions": [list(dimensions.keys())],
+                    "Metrics": [
+                        {"Name": metric_name, "Unit": units[metric_name]}
+                        for metric_name in metrics.keys()
+                    ],
+                }
+            ],
+        },
+        **dimensions,
+        **metrics,
+        **(properties or {}),
+    }
+
+
+def build_invocation_emf_documents(
+        function_name: str,
+        duration_ms: float,
+        is_cold_start: bool,
+        is_error: bool,
+        event_bytes: Optional[int],
+        response_bytes: Optional[int],
+        api_call_delta_list: List[Dict[str, Any]],
+        cache_delta_list: List[Dict[str, Any]],
+        namespace: str,
+        timestamp_ms: int,
+) -> List[Dict[str, Any]]:
+    """
+    Build the EMF documents for a single invocation
+    :return:
+    """
+    function_metrics = {
+        "Duration": round(duration_ms, 3),
+        "ColdStart": int(is_cold_start),
+        "Errors": int(is_error),
+        "ApiCalls": sum(map(lambda delta_iter_: delta_iter_['calls'], api_call_delta_list)),
+        "ApiTime": round(sum(map(lambda delta_iter_: delta_iter_['totalMs'], api_call_delta_list)), 3),
+        "CacheHits": sum(map(lambda delta_iter_: delta_iter_['hits'], cache_delta_list)),
+        "CacheMisses": sum(map(lambda delta_iter_: delta_iter_['misses'], cache_delta_list)),
+    }
+    function_units = {
+        "Duration": MILLISECONDS_UNIT,
+        "ColdStart": COUNT_UNIT,
+        "Errors": COUNT_UNIT,
+        "EventBytes": BYTES_UNIT,
+        "ResponseBytes": BYTES_UNIT,
+        "ApiCalls": COUNT_UNIT,
+        "ApiTime": MILLISECONDS_UNIT,
+        "CacheHits": COUNT_UNIT,
+        "CacheMisses": COUNT_UNIT,
+    }
+    if event_bytes is not None:
+        function_metrics["EventBytes"] = event_bytes
+    if response_bytes is not None:
+        function_metrics["ResponseBytes"] = response_bytes
+
+    emf_documents = [
+        build_emf_document(
+            namespace=namespace,
+            dimensions={"FunctionName": function_name},
+            metrics=function_metrics,
+            units=function_units,
+            timestamp_ms=timestamp_ms,
+        )
+    ]
+
+    for api_call_delta in api_call_delta_list:
+        emf_documents.append(build_emf_document(
+            namespace=namespace,
+            dimensions={"FunctionName": function_name, "ApiFunction": api_call_delta['name']},
+            metrics={
+                "ApiCalls": api_call_delta['calls'],
+                "ApiRetries": api_call_delta['retries'],
+                "ApiErrors": api_call_delta['errors'],
+                "ApiTime": round(api_call_delta['totalMs'], 3),
+            },
+            units={
+                "ApiCalls": COUNT_UNIT,
+                "ApiRetries": COUNT_UNIT,
+                "ApiErrors": COUNT_UNIT,
+                "ApiTime": MILLISECONDS_UNIT,
+            },
+            timestamp_ms=timestamp_ms,
+        ))
+
+    for cache_delta in cache_delta_list:
+        emf_documents.append(build_emf_document(
+            namespace=namespace,
+            dimensions={"FunctionName": function_name, "CacheName": cache_delta['name']},
+            metrics={
+                "CacheHits": cache_delta['hits'],
+                "CacheMisses": cache_delta['misses'],
+            },
+            units={
+                "CacheHits": COUNT_UNIT,
+                "CacheMisses": COUNT_UNIT,
+            },
+            timestamp_ms=timestamp_ms,
+        ))
+
+    return emf_documents
+
+
+def instrument_handler(handler: Callable) -> Callable:
+    """
+    Record the handler metrics for each invocation and write them to stdout as EMF log lines
+    :param handler:
+    :return:
+    """
+    @wraps(handler)
+    def _instrumented_handler(event, context):
+        global _IS_COLD_START
+
+        clear_invocation_scoped_caches()
+
+        if environ.get(HANDLER_METRICS_MODE_ENV_VAR, EMF_MODE).lower() == OFF_MODE:
+            _IS_COLD_START = False
+            return handler(event, context)
+
+        is_cold_start = _IS_COLD_START
+        _IS_COLD_START = False
+
+        api_call_stats_before = get_api_call_stats()
+        cache_stats_before = get_all_cache_stats()
+        is_payload_sizes = is_payload_sizes_enabled()
+        event_bytes = get_json_size(event) if is_payload_sizes else None
+
+        start_time = perf_counter()
+        response = None
+        is_error = True
+        try:
+            response = handler(event, context)
+            is_error = False
+            return response
+        finally:
+            duration_ms = (perf_counter() - start_time) * 1e3
+
+            emf_documents = build_invocation_emf_documents(
+                function_name=get_function_name(handler, context),
+                duration_ms=duration_ms,
+                is_cold_start=is_cold_start,
+                is_error=is_error,
+                event_bytes=event_bytes,
+                response_bytes=get_json_size(response) if is_payload_sizes and not is_error else None,
+                api_call_delta_list=get_stats_delta(
+                    api_call_stats_before, get_api_call_stats(), ["calls", "errors", "retries", "totalMs"]
+                ),
+                cache_delta_list=get_stats_delta(
+                    cache_stats_before, get_all_cache_stats(), ["hits", "misses"]
+                ),
+                namespace=environ.get(HANDLER_METRICS_NAMESPACE_ENV_VAR, DEFAULT_HANDLER_METRICS_NAMESPACE),
+                timestamp_ms=int(time() * 1e3),
+            )
+
+            sys.stdout.write("".join(map(
+                lambda emf_document_iter_: json.dumps(emf_document_iter_, default=str) + "\n",
+                emf_documents
+            )))
+            sys.stdout.flush()
+
+    return _instrumented_handler
+
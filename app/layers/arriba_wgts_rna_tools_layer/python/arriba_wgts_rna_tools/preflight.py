@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+"""
+CWL input pre-flight checks
+
+Check that every File location in a set of CWL inputs (including secondary files) exists
+before we submit the analysis, rather than finding out after the ICAv2 analysis has been queued and failed.
+
+Lookups are de-duplicated and run concurrently, and all missing uris are reported together.
+
+Two backends are supported
+  * filemanager: look up each uri in the OrcaBus filemanager (no S3 permissions needed)
+  * s3: HEAD each object directly (the lambda role needs s3:GetObject on the buckets),
+        this backend can be tested against a local S3 stand-in such as moto
+
+The deployed convert ready event inputs lambda only supports the filemanager backend,
+its role has no S3 read access on the reference or input buckets.
+
+Only uris that exist are cached (per container), so reference data is only checked once per container,
+while a missing uri is checked again on the next invocation (it may have since been uploaded).
+
+The TTL, size bound and concurrency can be set with the following environment variables
+  * CWL_INPUTS_PREFLIGHT_CACHE_TTL_SECONDS (default 3600)
+  * CWL_INPUTS_PREFLIGHT_CACHE_MAX_SIZE (default 1024)
+  * CWL_INPUTS_PREFLIGHT_MAX_CONCURRENCY (default 16)
+"""
+
+# Standard imports
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from os import environ
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+# Local imports
+from .cache import MemoisingCache
+from .filemanager import get_file_objects_from_s3_uri
+from .lazy import lazy_import
+from .transport import instrument_boto3_client
+
+# Layer imports
+boto3 = lazy_import("boto3")
+
+# Globals
+FILEMANAGER_BACKEND = "filemanager"
+S3_BACKEND = "s3"
+
+CWL_INPUTS_PREFLIGHT_CACHE_TTL_SECONDS_ENV_VAR = "CWL_INPUTS_PREFLIGHT_CACHE_TTL_SECONDS"
+CWL_INPUTS_PREFLIGHT_CACHE_MAX_SIZE_ENV_VAR = "CWL_INPUTS_PREFLIGHT_CACHE_MAX_SIZE"
+CWL_INPUTS_PREFLIGHT_MAX_CONCURRENCY_ENV_VAR = "CWL_INPUTS_PREFLIGHT_MAX_CONCURRENCY"
+DEFAULT_CWL_INPUTS_PREFLIGHT_CACHE_TTL_SECONDS = 3600
+DEFAULT_CWL_INPUTS_PREFLIGHT_CACHE_MAX_SIZE = 1024
+DEFAULT_CWL_INPUTS_PREFLIGHT_MAX_CONCURRENCY = 16
+
+S3_NOT_FOUND_ERROR_CODES = ["404", "NoSuchKey", "NotFound"]
+
+# (Backend, uri) -> True, missing uris are never cached
+EXISTING_URI_CACHE = MemoisingCache(
+    name="cwlInputsPreflight",
+    ttl_seconds=float(environ.get(
+        CWL_INPUTS_PREFLIGHT_CACHE_TTL_SECONDS_ENV_VAR, DEFAULT_CWL_INPUTS_PREFLIGHT_CACHE_TTL_SECONDS
+    )),
+    max_size=int(environ.get(
+        CWL_INPUTS_PREFLIGHT_CACHE_MAX_SIZE_ENV_VAR, DEFAULT_CWL_INPUTS_PREFLIGHT_CACHE_MAX_SIZE
+    )),
+)
+
+
+class MissingInputFilesError(ValueError):
+    """
+    One or more CWL input locations do not exist
+    """
+    def __init__(self, missing_uri_list: List[str]):
+        self.missing_uri_list = missing_uri_list
+        super().__init__(
+            f"{len(missing_uri_list)} CWL input file(s) do not exist: {', '.join(missing_uri_list)}"
+        )
+
+
+class _UriNotFound(Exception):
+    """
+    Raised inside a cache lookup so that missing uris are not cached
+    """
+
+
+def iter_cwl_file_locations(cwl_inputs: Any) -> Iterator[str]:
+    """
+    Yield the location of every CWL File object (and its secondary files) in the inputs, in input order
+    :param cwl_inputs:
+    :return:
+    """
+    stack = [cwl_inputs]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            if value.get("class", None) == "File" and isinstance(value.get("location", None), str):
+                yield value["location"]
+            stack.extend(reversed(list(value.values())))
+        elif isinstance(value, list):
+            stack.extend(reversed(value))
+
+
+@lru_cache(maxsize=1)
+def get_s3_client():
+    return instrument_boto3_client(boto3.client("s3"))
+
+
+def s3_uri_exists(s3_uri: str) -> bool:
+    """
+    HEAD the object, a 404 means the object does not exist, any other error is raised
+    :param s3_uri:
+    :return:
+    """
+    s3_obj = urlparse(s3_uri)
+    try:
+        get_s3_client().head_object(Bucket=s3_obj.netloc, Key=s3_obj.path.lstrip("/"))
+    except Exception as e:
+        if getattr(e, "response", {}).get("Error", {}).get("Code", None) in S3_NOT_FOUND_ERROR_CODES:
+            return False
+        raise
+    return True
+
+
+def filemanager_uri_exists(s3_uri: str) -> bool:
+    """
+    Look up the object in the filemanager
+    :param s3_uri:
+    :return:
+    """
+    return len(get_file_objects_from_s3_uri(s3_uri)) > 0
+
+
+BACKEND_EXISTS_FUNCTIONS: Dict[str, Callable[[str], bool]] = {
+    FILEMANAGER_BACKEND: filemanager_uri_exists,
+    S3_BACKEND: s3_uri_exists,
+}
+
+
+def uri_exists(uri: str, backend: str) -> bool:
+    """
+    Check if the uri exists, served from the cache if we have already seen it
+    :param uri:
+    :param backend:
+    :return:
+    """
+    def _lookup() -> bool:
+        if not BACKEND_EXISTS_FUNCTIONS[backend](uri):
+            raise _UriNotFound(uri)
+        return True
+
+    try:
+        return EXISTING_URI_CACHE.get_or_set((backend, uri), _lookup)
+    except _UriNotFound:
+        return False
+
+
+def get_missing_uri_list(
+        uri_list: List[str],
+        backend: str = FILEMANAGER_BACKEND,
+        max_concurrency: Optional[int] = None
+) -> List[str]:
+    """
+    Check the uris concurrently, and return those that do not exist (in input order).
+    Duplicate uris are only checked once
+    :param uri_list:
+    :param backend:
+    :param max_concurrency:
+    :return:
+    """
+    if backend not in BACKEND_EXISTS_FUNCTIONS:
+        raise ValueError(
+            f"Unknown pre-flight backend '{backend}', expected one of {', '.join(BACKEND_EXISTS_FUNCTIONS.keys())}"
+        )
+
+    unique_uri_list = list(dict.fromkeys(uri_list))
+
+    if max_concurrency is None:
+        max_concurrency = int(environ.get(
+            CWL_INPUTS_PREFLIGHT_MAX_CONCURRENCY_ENV_VAR, DEFAULT_CWL_INPUTS_PREFLIGHT_MAX_CONCURRENCY
+        ))
+    max_concurrency = max(1, max_concurrency)
+
+    if len(unique_uri_list) <= 1 or max_concurrency == 1:
+        exists_list = list(map(lambda uri_iter_: uri_exists(uri_iter_, backend), unique_uri_list))
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(unique_uri_list))) as executor:
+            exists_list = list(executor.map(lambda uri_iter_: uri_exists(uri_iter_, backend), unique_uri_list))
+
+    return list(map(
+        lambda uri_exists_iter_: uri_exists_iter_[0],
+        filter(
+            lambda uri_exists_iter_: not uri_exists_iter_[1],
+            zip(unique_uri_list, exists_list)
+        )
+    ))
+
+
+def check_cwl_inputs_exist(
+        cwl_inputs: Dict[str, Any],
+        backend: str = FILEMANAGER_BACKEND,
+        max_concurrency: Optional[int] = None
+):
+    """
+    Check every File location in the CWL inputs exists
+    :param cwl_inputs:
+    :param backend:
+    :param max_concurrency:
+    :raises MissingInputFilesError: with the list of all missing uris
+    """
+    missing_uri_list = get_missing_uri_list(
+        list(iter_cwl_file_locations(cwl_inputs)),
+        backend=backend,
+        max_concurrency=max_concurrency,
+    )
+
+    if missing_uri_list:
+        raise MissingInputFilesError(missing_uri_list)
+
+
+def get_preflight_cache_stats() -> Dict[str, Any]:
+    """
+    Get the hit / miss counters for the pre-flight cache
+    :return:
+    """
+    return EXISTING_URI_CACHE.get_stats()
+
+
+def clear_preflight_cache():
+    """
+    Clear the pre-flight cache
+    :return:
+    """
+    EXISTING_URI_CACHE.invalidate()
+
+
+# Local check against a moto S3 stand-in
+# if __name__ == "__main__":
+#     from os import environ
+#     from moto import mock_aws
+#
+#     environ['AWS_DEFAULT_REGION'] = 'ap-southeast-2'
+#
+#     with mock_aws():
+#         get_s3_client.cache_clear()
+#         get_s3_client().create_bucket(
+#             Bucket='ref-databucket',
+#             CreateBucketConfiguration={'LocationConstraint': 'ap-southeast-2'}
+#         )
+#         get_s3_client().put_object(Bucket='ref-databucket', Key='path/to/reference/hg38.fa', Body=b'>chr1')
+#
+#         cwl_inputs = {
+#             "reference_fasta": {
+#                 "class": "File",
+#                 "location": "s3://ref-databucket/path/to/reference/hg38.fa",
+#                 "secondaryFiles": [
+#                     {
+#                         "class": "File",
+#                         "location": "s3://ref-databucket/path/to/reference/hg38.fa.fai"
+#                     }
+#                 ]
+#             }
+#         }
+#
+#         try:
+#             check_cwl_inputs_exist(cwl_inputs, backend=S3_BACKEND)
+#         except MissingInputFilesError as e:
+#             print(e.missing_uri_list)
+#             # ['s3://ref-databucket/path/to/reference/hg38.fa.fai']
+#
+#         get_s3_client().put_object(Bucket='ref-databucket', Key='path/to/reference/hg38.fa.fai', Body=b'')
+#         check_cwl_inputs_exist(cwl_inputs, backend=S3_BACKEND)
+#         print(get_preflight_cache_stats())
+#         # {'name': 'cwlInputsPreflight', 'hits': 1, 'misses': 3, 'coalesced': 0, 'size': 2}
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+
+"""
+Shared transport for the OrcaBus api requests made by the lambdas
+
+Every OrcaBus api request made through api_get / iter_api_results
+  * goes through an explicitly mounted, process-wide keep-alive connection pool,
+    each thread has its own requests Session (so cookies are never shared between threads),
+    and every thread session is mounted on the same HTTPAdapter (the urllib3 pool is thread-safe),
+    so connections are kept alive across threads and warm invocations
+  * is retried on its own (urllib3 Retry on the shared adapter) with full-jitter exponential backoff
+    on 429 / 5xx responses and connection errors, honouring the Retry-After header of a 429,
+    so a 429 on page n of a listing only requests page n again, other errors (i.e a 404) are raised straight away
+  * is authenticated with the OrcaBus token, which is cached across warm invocations until shortly before it expires
+    (and fetched again once if a request is rejected with a 401)
+  * is timed, with per-function call / error / retry counts and latencies available from get_api_call_stats
+
+i.e
+
+workflow_run_list = list(iter_api_results(
+    "workflow.get_workflow_run_from_portal_run_id",  # The name the call stats are recorded under
+    WORKFLOW_SUBDOMAIN, WORKFLOW_RUN_ENDPOINT,
+    params={"portalRunId": portal_run_id}
+))
+
+Listings are requested one page at a time, as the caller iterates,
+so callers may stop early, or project each page as it arrives rather than holding the whole listing.
+
+Nothing in requests (or any other library) is patched, requests made by anything else are untouched.
+requests, urllib3 and boto3 are only imported on first use.
+
+boto3 clients can be timed in the same way with instrument_boto3_client,
+calls are recorded under the service and operation name, i.e 'ssm.GetParameter'.
+
+The api hostname and token are read from the HOSTNAME_SSM_PARAMETER_NAME ssm parameter
+and the ORCABUS_TOKEN_SECRET_ID secret (set on every lambda with the orcabus api tools layer).
+The session factory, hostname and token can be swapped with set_api_transport, i.e for an offline stand-in.
+
+The retry policy, pool size and token cache can be set with the following environment variables
+  * ORCABUS_API_MAX_RETRIES (default 3)
+  * ORCABUS_API_RETRY_BASE_DELAY_SECONDS (default 0.2)
+  * ORCABUS_API_RETRY_MAX_DELAY_SECONDS (default 5)
+  * ORCABUS_API_POOL_MAX_SIZE (default 16)
+  * ORCABUS_API_TIMEOUT_SECONDS (default 30)
+  * ORCABUS_API_ROWS_PER_PAGE (default 1000)
+  * ORCABUS_TOKEN_CACHE_TTL_SECONDS (default 3600, the token is always refreshed a minute before it expires)
+"""
+
+# Standard imports
+import json
+import random
+from base64 import urlsafe_b64decode
+from functools import lru_cache
+from os import environ
+from threading import Lock, local
+from time import monotonic, perf_counter, time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+# Local imports
+from .lazy import lazy_import
+
+# Layer imports
+boto3 = lazy_import("boto3")
+
+# Globals
+T = TypeVar("T")
+
+ORCABUS_API_MAX_RETRIES_ENV_VAR = "ORCABUS_API_MAX_RETRIES"
+ORCABUS_API_RETRY_BASE_DELAY_SECONDS_ENV_VAR = "ORCABUS_API_RETRY_BASE_DELAY_SECONDS"
+ORCABUS_API_RETRY_MAX_DELAY_SECONDS_ENV_VAR = "ORCABUS_API_RETRY_MAX_DELAY_SECONDS"
+ORCABUS_API_POOL_MAX_SIZE_ENV_VAR = "ORCABUS_API_POOL_MAX_SIZE"
+ORCABUS_API_TIMEOUT_SECONDS_ENV_VAR = "ORCABUS_API_TIMEOUT_SECONDS"
+ORCABUS_API_ROWS_PER_PAGE_ENV_VAR = "ORCABUS_API_ROWS_PER_PAGE"
+ORCABUS_TOKEN_CACHE_TTL_SECONDS_ENV_VAR = "ORCABUS_TOKEN_CACHE_TTL_SECONDS"
+HOSTNAME_SSM_PARAMETER_NAME_ENV_VAR = "HOSTNAME_SSM_PARAMETER_NAME"
+ORCABUS_TOKEN_SECRET_ID_ENV_VAR = "ORCABUS_TOKEN_SECRET_ID"
+DEFAULT_ORCABUS_API_MAX_RETRIES = 3
+DEFAULT_ORCABUS_API_RETRY_BASE_DELAY_SECONDS = 0.2
+DEFAULT_ORCABUS_API_RETRY_MAX_DELAY_SECONDS = 5
+DEFAULT_ORCABUS_API_POOL_MAX_SIZE = 16
+DEFAULT_ORCABUS_API_TIMEOUT_SECONDS = 30
+DEFAULT_ORCABUS_API_ROWS_PER_PAGE = 1000
+DEFAULT_ORCABUS_TOKEN_CACHE_TTL_SECONDS = 3600
+# Refresh the token this long before it expires
+ORCABUS_TOKEN_EXPIRY_MARGIN_SECONDS = 60
+
+RETRYABLE_STATUS_CODES = [429, 500, 502, 503, 504]
+UNAUTHORIZED_STATUS_CODE = 401
+ROWS_PER_PAGE_PARAM = "rowsPerPage"
+
+# Per thread session
+_THREAD_STATE = local()
+
+# (expires at, token)
+_TOKEN_CACHE: Optional[Tuple[float, str]] = None
+_TOKEN_LOCK = Lock()
+
+# Session factory / hostname / token overrides, see set_api_transport
+_SESSION_FACTORY: Optional[Callable[[], Any]] = None
+_GET_HOSTNAME: Optional[Callable[[], str]] = None
+_GET_TOKEN: Optional[Callable[[bool], str]] = None
+
+# Function name -> call stats
+_API_CALL_STATS: Dict[str, Dict[str, Any]] = {}
+_API_CALL_STATS_LOCK = Lock()
+
+
+@lru_cache(maxsize=1)
+def get_retry_class():
+    """
+    urllib3 Retry with full jitter (urllib3 only adds a bounded jitter to the exponential backoff),
+    a Retry-After header still takes precedence over the backoff
+    :return:
+    """
+    from urllib3.util.retry import Retry
+
+    class FullJitterRetry(Retry):
+        def get_backoff_time(self) -> float:
+            backoff_time = super().get_backoff_time()
+            if backoff_time <= 0:
+                return 0
+            return random.uniform(0, backoff_time)
+
+    return FullJitterRetry
+
+
+def get_retry_policy():
+    """
+    The per-request retry policy of the shared adapter
+    :return:
+    """
+    max_retries = int(environ.get(ORCABUS_API_MAX_RETRIES_ENV_VAR, DEFAULT_ORCABUS_API_MAX_RETRIES))
+    retry_kwargs = dict(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        status_forcelist=RETRYABLE_STATUS_CODES,
+        backoff_factor=float(environ.get(
+            ORCABUS_API_RETRY_BASE_DELAY_SECONDS_ENV_VAR, DEFAULT_ORCABUS_API_RETRY_BASE_DELAY_SECONDS
+        )),
+        respect_retry_after_header=True,
+        # Hand back the last response once we are out of retries, we raise from its status code
+        raise_on_status=False,
+    )
+
+    retry_class = get_retry_class()
+    max_delay = float(environ.get(
+        ORCABUS_API_RETRY_MAX_DELAY_SECONDS_ENV_VAR, DEFAULT_ORCABUS_API_RETRY_MAX_DELAY_SECONDS
+    ))
+    # backoff_max is only an init argument from urllib3 2.0
+    if "backoff_max" in retry_class.__init__.__code__.co_varnames:
+        return retry_class(**retry_kwargs, backoff_max=max_delay)
+    retry_class.DEFAULT_BACKOFF_MAX = max_delay
+    return retry_class(**retry_kwargs)
+
+
+@lru_cache(maxsize=1)
+def get_shared_adapter():
+    """
+    The keep-alive connection pool shared by every thread session, with the per-request retry policy
+    :return:
+    """
+    from requests.adapters import HTTPAdapter
+
+    pool_max_size = int(environ.get(ORCABUS_API_POOL_MAX_SIZE_ENV_VAR, DEFAULT_ORCABUS_API_POOL_MAX_SIZE))
+    return HTTPAdapter(
+        pool_connections=pool_max_size,
+        pool_maxsize=pool_max_size,
+        max_retries=get_retry_policy(),
+    )
+
+
+def new_pooled_session():
+    """
+    Create a session mounted on the shared connection pool
+    :return:
+    """
+    import requests
+
+    session = requests.Session()
+    session.mount("https://", get_shared_adapter())
+    session.mount("http://", get_shared_adapter())
+    return session
+
+
+def get_thread_session():
+    """
+    Get the api session of the current thread
+    :return:
+    """
+    session = getattr(_THREAD_STATE, "session", None)
+    if session is None:
+        session = (_SESSION_FACTORY or new_pooled_session)()
+        _THREAD_STATE.session = session
+    return session
+
+
+@lru_cache(maxsize=1)
+def get_ssm_client():
+    return instrument_boto3_client(boto3.client("ssm"))
+
+
+@lru_cache(maxsize=1)
+def get_secretsmanager_client():
+    return instrument_boto3_client(boto3.client("secretsmanager"))
+
+
+@lru_cache(maxsize=1)
+def get_ssm_hostname() -> str:
+    """
+    The OrcaBus api hostname, once per container
+    :return:
+    """
+    return get_ssm_client().get_parameter(
+        Name=environ[HOSTNAME_SSM_PARAMETER_NAME_ENV_VAR]
+    )['Parameter']['Value']
+
+
+def get_hostname() -> str:
+    return (_GET_HOSTNAME or get_ssm_hostname)()
+
+
+def get_token_expiry(token: str) -> Optional[float]:
+    """
+    Read the expiry (epoch seconds) from the jwt claims, the signature is not checked, that is up to the api
+    :param token:
+    :return:
+    """
+    try:
+        claims_b64 = token.split(".")[1]
+        return float(json.loads(urlsafe_b64decode(claims_b64 + "=" * (-len(claims_b64) % 4)))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def get_secret_token(force_refresh: bool = False) -> str:
+    """
+    Get the OrcaBus token from secrets manager, cached across warm invocations
+    until the cache TTL is up or the token is about to expire
+    :param force_refresh: Fetch the token again, i.e after a 401
+    :return:
+    """
+    global _TOKEN_CACHE
+
+    with _TOKEN_LOCK:
+        if not force_refresh and _TOKEN_CACHE is not None and monotonic() < _TOKEN_CACHE[0]:
+            return _TOKEN_CACHE[1]
+
+        token = json.loads(get_secretsmanager_client().get_secret_value(
+            SecretId=environ[ORCABUS_TOKEN_SECRET_ID_ENV_VAR]
+        )['SecretString'])['id_token']
+
+        ttl_seconds = float(environ.get(
+            ORCABUS_TOKEN_CACHE_TTL_SECONDS_ENV_VAR, DEFAULT_ORCABUS_TOKEN_CACHE_TTL_SECONDS
+        ))
+        token_expiry = get_token_expiry(token)
+        if token_expiry is not None:
+            ttl_seconds = min(ttl_seconds, token_expiry - time() - ORCABUS_TOKEN_EXPIRY_MARGIN_SECONDS)
+
+        _TOKEN_CACHE = (monotonic() + max(0.0, ttl_seconds), token)
+        return token
+
+
+def get_token(force_refresh: bool = False) -> str:
+    return (_GET_TOKEN or get_secret_token)(force_refresh)
+
+
+def clear_token_cache():
+    """
+    Drop the cached token
+    :return:
+    """
+    global _TOKEN_CACHE
+
+    with _TOKEN_LOCK:
+        _TOKEN_CACHE = None
+
+
+def set_api_transport(
+        session_factory: Optional[Callable[[], Any]] = None,
+        get_hostname_func: Optional[Callable[[], str]] = None,
+        get_token_func: Optional[Callable[[bool], str]] = None,
+):
+    """
+    Swap the session factory, hostname and token lookups (i.e for an offline stand-in),
+    call with no arguments to go back to the pooled session, ssm hostname and secrets manager token.
+    Sessions already created are dropped
+    :param session_factory: Returns an object with a requests.Session compatible get method
+    :param get_hostname_func:
+    :param get_token_func: Takes force_refresh
+    :return:
+    """
+    global _SESSION_FACTORY, _GET_HOSTNAME, _GET_TOKEN, _THREAD_STATE
+
+    _SESSION_FACTORY = session_factory
+    _GET_HOSTNAME = get_hostname_func
+    _GET_TOKEN = get_token_func
+    _THREAD_STATE = local()
+
+
+def get_api_url(subdomain: str, endpoint: str) -> str:
+    """
+    Get the url of the api endpoint, i.e https://workflow.<hostname>/api/v1/workflowrun
+    :param subdomain: The api subdomain, i.e 'workflow'
+    :param endpoint: i.e 'api/v1/workflowrun'
+    :return:
+    """
+    return f"https://{subdomain}.{get_hostname()}/{endpoint}"
+
+
+def get_response_retries(response: Any) -> int:
+    """
+    The number of retries urllib3 made for the response
+    :param response:
+    :return:
+    """
+    return len(getattr(getattr(getattr(response, "raw", None), "retries", None), "history", None) or ())
+
+
+def send_api_request(func_name: str, url: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    GET the url with the OrcaBus token, and return the decoded json response.
+    Transient errors are retried by the adapter, any other error (i.e a 404) is raised
+    :param func_name: The name the call stats are recorded under
+    :param url:
+    :param params:
+    :return:
+    """
+    session = get_thread_session()
+    timeout = float(environ.get(ORCABUS_API_TIMEOUT_SECONDS_ENV_VAR, DEFAULT_ORCABUS_API_TIMEOUT_SECONDS))
+
+    start_time = perf_counter()
+    retries = 0
+    try:
+        response = session.get(
+            url,
+            params=params,
+            headers={"Accept": "application/json", "Authorization": f"Bearer {get_token()}"},
+            timeout=timeout,
+        )
+        retries += get_response_retries(response)
+
+        # The token may have been rotated since we cached it
+        if response.status_code == UNAUTHORIZED_STATUS_CODE:
+            response = session.get(
+                url,
+                params=params,
+                headers={"Accept": "application/json", "Authorization": f"Bearer {get_token(True)}"},
+                timeout=timeout,
+            )
+            retries += 1 + get_response_retries(response)
+
+        response.raise_for_status()
+        response_json = response.json()
+    except Exception:
+        record_api_call(func_name, (perf_counter() - start_time) * 1e3, retries, True)
+        raise
+
+    record_api_call(func_name, (perf_counter() - start_time) * 1e3, retries, False)
+    return response_json
+
+
+def api_get(
+        func_name: str,
+        subdomain: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None
+) -> Any:
+    """
+    GET a single api object
+    :param func_name: The name the call stats are recorded under, i.e 'workflow.get_workflow_run'
+    :param subdomain:
+    :param endpoint:
+    :param params:
+    :return:
+    """
+    return send_api_request(func_name, get_api_url(subdomain, endpoint), params)
+
+
+def iter_api_results(
+        func_name: str,
+        subdomain: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        rows_per_page: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the results of an api listing, the next page is only requested once the current page is consumed.
+    Each page is its own request (and is retried on its own).
+    An endpoint that returns a plain list (or a single object) is treated as a single page
+    :param func_name: The name the call stats are recorded under, i.e 'workflow.get_workflow_runs'
+    :param subdomain:
+    :param endpoint:
+    :param params:
+    :param rows_per_page:
+    :return:
+    """
+    if rows_per_page is None:
+        rows_per_page = int(environ.get(ORCABUS_API_ROWS_PER_PAGE_ENV_VAR, DEFAULT_ORCABUS_API_ROWS_PER_PAGE))
+
+    next_url: Optional[str] = get_api_url(subdomain, endpoint)
+    next_params: Optional[Dict[str, Any]] = {**(params or {}), ROWS_PER_PAGE_PARAM: rows_per_page}
+
+    while next_url is not None:
+        page = send_api_request(func_name, next_url, next_params)
+
+        if isinstance(page, list):
+            yield from page
+            return
+
+        if 'results' not in page:
+            yield page
+            return
+
+        yield from page['results']
+
+        # The next link already carries the query parameters
+        next_url = (page.get('links', None) or {}).get('next', None)
+        next_params = None
+
+
+def record_api_call(func_name: str, duration_ms: float, retries: int, is_error: bool):
+    with _API_CALL_STATS_LOCK:
+        stats = _API_CALL_STATS.setdefault(func_name, {
+            "name": func_name,
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "totalMs": 0.0,
+            "maxMs": 0.0,
+        })
+        stats["calls"] += 1
+        stats["errors"] += int(is_error)
+        stats["retries"] += retries
+        stats["totalMs"] += duration_ms
+        stats["maxMs"] = max(stats["maxMs"], duration_ms)
+
+
+def instrument_boto3_client(client: T) -> T:
+    """
+    Record the latency of every call made with the boto3 client (botocore handles its own retries)
+    :param client:
+    :return:
+    """
+    service_name = client.meta.service_model.service_name
+
+    def _before_call(context: Dict[str, Any], **kwargs):
+        context["apiCallStartTime"] = perf_counter()
+
+    def _after_call(context: Dict[str, Any], model, http_response, **kwargs):
+        start_time = context.get("apiCallStartTime", None)
+        if start_time is None:
+            return
+        record_api_call(
+            f"{service_name}.{model.name}",
+            (perf_counter() - start_time) * 1e3,
+            int(context.get("retries", {}).get("attempt", 1)) - 1,
+            http_response.status_code >= 400
+        )
+
+    client.meta.events.register(f"before-call.{service_name}", _before_call)
+    client.meta.events.register(f"after-call.{service_name}", _after_call)
+
+    return client
+
+
+def get_api_call_stats() -> List[Dict[str, Any]]:
+    """
+    Get the call / error / retry counts and latencies of each api function called in this container
+    :return:
+    """
+    with _API_CALL_STATS_LOCK:
+        return list(map(
+            lambda stats_iter_: {
+                **stats_iter_,
+                "totalMs": round(stats_iter_["totalMs"], 3),
+                "maxMs": round(stats_iter_["maxMs"], 3),
+            },
+            _API_CALL_STATS.values()
+        ))
+
+
+def reset_api_call_stats():
+    """
+    Reset the api call stats
+    :return:
+    """
+    with _API_CALL_STATS_LOCK:
+        _API_CALL_STATS.clear()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+"""
+Memoised OrcaBus workflow manager lookups used by the lambdas
+
+Within an invocation, repeated lookups of the same portal run id / workflow run
+are served from memory for a short TTL, rather than hitting the workflow manager again.
+The workflow run and latest payload caches are cleared at the start of each invocation,
+as drafts are updated within seconds of each other (a warm container must never merge into a replaced payload).
+
+The TTL and size bound can be set with the following environment variables
+  * WORKFLOW_API_CACHE_TTL_SECONDS (default 30)
+  * WORKFLOW_API_CACHE_MAX_SIZE (default 128)
+
+The workflow run skeleton (the parts of a workflow run that never change after READY,
+its workflow, run name and libraries) is the only workflow object cached across invocations, as set with
+  * WORKFLOW_RUN_SKELETON_CACHE_TTL_SECONDS (default 3600)
+  * WORKFLOW_RUN_SKELETON_CACHE_MAX_SIZE (default 1024)
+
+Requests go through the shared transport (see transport.py).
+The latest payload of a workflow run is the payload of its most recent state that has one.
+"""
+
+# Standard imports
+import typing
+from os import environ
+from typing import Any, Dict, List, Optional
+
+# Local imports
+from .cache import MemoisingCache, DEFAULT_TTL_SECONDS, DEFAULT_MAX_SIZE
+from .transport import api_get, iter_api_results
+
+# Type checking imports
+if typing.TYPE_CHECKING:
+    from orcabus_api_tools.workflow.models import WorkflowRunDetail
+
+# Globals
+WORKFLOW_SUBDOMAIN = "workflow"
+WORKFLOW_RUN_ENDPOINT = "api/v1/workflowrun"
+PAYLOAD_ENDPOINT = "api/v1/payload"
+
+WORKFLOW_API_CACHE_TTL_SECONDS_ENV_VAR = "WORKFLOW_API_CACHE_TTL_SECONDS"
+WORKFLOW_API_CACHE_MAX_SIZE_ENV_VAR = "WORKFLOW_API_CACHE_MAX_SIZE"
+WORKFLOW_RUN_SKELETON_CACHE_TTL_SECONDS_ENV_VAR = "WORKFLOW_RUN_SKELETON_CACHE_TTL_SECONDS"
+WORKFLOW_RUN_SKELETON_CACHE_MAX_SIZE_ENV_VAR = "WORKFLOW_RUN_SKELETON_CACHE_MAX_SIZE"
+DEFAULT_WORKFLOW_RUN_SKELETON_CACHE_TTL_SECONDS = 3600
+DEFAULT_WORKFLOW_RUN_SKELETON_CACHE_MAX_SIZE = 1024
+
+WORKFLOW_RUN_CACHE = MemoisingCache(
+    name="workflowRun",
+    ttl_seconds=float(environ.get(WORKFLOW_API_CACHE_TTL_SECONDS_ENV_VAR, DEFAULT_TTL_SECONDS)),
+    max_size=int(environ.get(WORKFLOW_API_CACHE_MAX_SIZE_ENV_VAR, DEFAULT_MAX_SIZE)),
+    invocation_scoped=True,
+)
+PAYLOAD_CACHE = MemoisingCache(
+    name="payload",
+    ttl_seconds=float(environ.get(WORKFLOW_API_CACHE_TTL_SECONDS_ENV_VAR, DEFAULT_TTL_SECONDS)),
+    max_size=int(environ.get(WORKFLOW_API_CACHE_MAX_SIZE_ENV_VAR, DEFAULT_MAX_SIZE)),
+    invocation_scoped=True,
+)
+
+# Portal run id -> workflow run skeleton
+WORKFLOW_RUN_SKELETON_CACHE = MemoisingCache(
+    name="workflowRunSkeleton",
+    ttl_seconds=float(environ.get(
+        WORKFLOW_RUN_SKELETON_CACHE_TTL_SECONDS_ENV_VAR, DEFAULT_WORKFLOW_RUN_SKELETON_CACHE_TTL_SECONDS
+    )),
+    max_size=int(environ.get(
+        WORKFLOW_RUN_SKELETON_CACHE_MAX_SIZE_ENV_VAR, DEFAULT_WORKFLOW_RUN_SKELETON_CACHE_MAX_SIZE
+    )),
+)
+
+
+def _get_workflow_run_from_portal_run_id(portal_run_id: str) -> 'WorkflowRunDetail':
+    workflow_run_list = list(iter_api_results(
+        "workflow.get_workflow_run_from_portal_run_id",
+        WORKFLOW_SUBDOMAIN, WORKFLOW_RUN_ENDPOINT,
+        params={"portalRunId": portal_run_id}
+    ))
+
+    if len(workflow_run_list) != 1:
+        raise ValueError(
+            f"Expected exactly one workflow run for portal run id {portal_run_id}, found {len(workflow_run_list)}"
+        )
+
+    return workflow_run_list[0]
+
+
+def _get_latest_payload_from_workflow_run(workflow_run_orcabus_id: str) -> Dict[str, Any]:
+    state_list = list(filter(
+        lambda state_iter_: state_iter_.get('payload', None) is not None,
+        iter_api_results(
+            "workflow.get_workflow_run_states",
+            WORKFLOW_SUBDOMAIN, f"{WORKFLOW_RUN_ENDPOINT}/{workflow_run_orcabus_id}/state",
+        )
+    ))
+
+    if len(state_list) == 0:
+        raise ValueError(f"No payload found for workflow run {workflow_run_orcabus_id}")
+
+    # The state payload is either the payload orcabus id, or the payload object
+    latest_state_payload = max(state_list, key=lambda state_iter_: state_iter_['timestamp'])['payload']
+    if isinstance(latest_state_payload, dict):
+        latest_state_payload = latest_state_payload['orcabusId']
+
+    return api_get(
+        "workflow.get_payload",
+        WORKFLOW_SUBDOMAIN, f"{PAYLOAD_ENDPOINT}/{latest_state_payload}"
+    )
+
+
+def get_workflow_run_from_portal_run_id(portal_run_id: str) -> 'WorkflowRunDetail':
+    """
+    Get the workflow run object from the portal run id
+    :param portal_run_id:
+    :return:
+    """
+    return WORKFLOW_RUN_CACHE.get_or_set(
+        ("portalRunId", portal_run_id),
+        lambda: _get_workflow_run_from_portal_run_id(portal_run_id)
+    )
+
+
+def get_latest_payload_from_workflow_run(workflow_run_orcabus_id: str) -> Dict[str, Any]:
+    """
+    Get the latest payload from the workflow run orcabus id
+    :param workflow_run_orcabus_id:
+    :return:
+    """
+    return PAYLOAD_CACHE.get_or_set(
+        ("workflowRunOrcabusId", workflow_run_orcabus_id),
+        lambda: _get_latest_payload_from_workflow_run(workflow_run_orcabus_id)
+    )
+
+
+def get_latest_payload_from_portal_run_id(portal_run_id: str) -> Dict[str, Any]:
+    """
+    Get the latest payload from the portal run id
+    :param portal_run_id:
+    :return:
+    """
+    return get_latest_payload_from_workflow_run(
+        get_workflow_run_from_portal_run_id(portal_run_id)['orcabusId']
+    )
+
+
+def get_workflow_runs_from_metadata(
+        workflow_name: str,
+        workflow_version: Optional[str] = None,
+        analysis_run_id: Optional[str] = None,
+        library_id_list: Optional[List[str]] = None,
+        rgid_list: Optional[List[str]] = None,
+) -> List['WorkflowRunDetail']:
+    """
+    Get the workflow runs of the workflow (and version if provided), that ran on the analysis run,
+    or on any of the libraries (using all of the rgids if provided), not cached.
+    The filters are applied to the results as well, so they hold even if the api does not filter on them
+    :param workflow_name:
+    :param workflow_version:
+    :param analysis_run_id: Takes preference over the library id list
+    :param library_id_list:
+    :param rgid_list:
+    :return:
+    """
+    params: Dict[str, Any] = {"workflow__workflowName": workflow_name}
+    if workflow_version is not None:
+        params["workflow__workflowVersion"] = workflow_version
+    if analysis_run_id is not None:
+        params["analysisRun__analysisRunId"] = analysis_run_id
+    elif library_id_list:
+        params["libraries__libraryId"] = library_id_list
+
+    def _is_match(workflow_run: 'WorkflowRunDetail') -> bool:
+        if workflow_run['workflow']['workflowName'] != workflow_name:
+            return False
+        if workflow_version is not None and workflow_run['workflow']['workflowVersion'] != workflow_version:
+            return False
+        if analysis_run_id is not None:
+            return (workflow_run.get('analysisRun', None) or {}).get('analysisRunId', None) == analysis_run_id
+        if library_id_list and not any(map(
+                lambda library_iter_: library_iter_['libraryId'] in library_id_list,
+                workflow_run['libraries']
+        )):
+            return False
+        if rgid_list:
+            workflow_run_rgid_list = [
+                readset_iter_['rgid']
+                for library_iter_ in workflow_run['libraries']
+                for readset_iter_ in library_iter_.get('readsets', [])
+            ]
+            return all(map(lambda rgid_iter_: rgid_iter_ in workflow_run_rgid_list, rgid_list))
+        return True
+
+    return list(filter(
+        _is_match,
+        iter_api_results(
+            "workflow.get_workflow_runs_from_metadata",
+            WORKFLOW_SUBDOMAIN, WORKFLOW_RUN_ENDPOINT,
+            params=params
+        )
+    ))
+
+
+def get_wrsc_workflow(workflow: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rename the workflow run 'workflowName' and 'workflowVersion' keys to the WRSC 'name' and 'version' keys
+    :param workflow:
+    :return:
+    """
+    return dict(map(
+        lambda kv_iter_: (
+            {"workflowName": "name", "workflowVersion": "version"}.get(kv_iter_[0], kv_iter_[0]),
+            kv_iter_[1]
+        ),
+        workflow.items()
+    ))
+
+
+def get_workflow_run_skeleton(portal_run_id: str) -> Dict[str, Any]:
+    """
+    Get the parts of the workflow run that do not change after READY, with the workflow in WRSC form
+
+    {
+      "orcabusId": "wfr.01JY07DV46QMQJWH1J1Y8YFR27",
+      "workflow": {
+        "orcabusId": "wfl.01JY07D115NZ0F4G1RKXMFEH46",
+        "name": "arriba-wgts-rna",
+        "version": "2.5.0",
+        ...
+      },
+      "workflowRunName": "umccr--automated--arriba-wgts-rna--2-5-0--20250618abcd1234",
+      "libraries": [
+        {
+          "orcabusId": "lib.01JQ6MK7RZK96ZFH1C812FGCWJ",
+          "libraryId": "L2500373"
+        }
+      ]
+    }
+
+    :param portal_run_id:
+    :return:
+    """
+    def _lookup() -> Dict[str, Any]:
+        workflow_run = _get_workflow_run_from_portal_run_id(portal_run_id)
+        return {
+            "orcabusId": workflow_run['orcabusId'],
+            "workflow": get_wrsc_workflow(workflow_run['workflow']),
+            "workflowRunName": workflow_run['workflowRunName'],
+            "libraries": workflow_run['libraries'],
+        }
+
+    return WORKFLOW_RUN_SKELETON_CACHE.get_or_set(portal_run_id, _lookup)
+
+
+def get_workflow_cache_stats() -> List[Dict[str, Any]]:
+    """
+    Get the hit / miss counters for the workflow api caches
+    :return:
+    """
+    return [
+        WORKFLOW_RUN_CACHE.get_stats(),
+        PAYLOAD_CACHE.get_stats(),
+        WORKFLOW_RUN_SKELETON_CACHE.get_stats(),
+    ]
+
+
+def clear_workflow_cache():
+    """
+    Clear the workflow api caches
+    :return:
+    """
+    WORKFLOW_RUN_CACHE.invalidate()
+    PAYLOAD_CACHE.invalidate()
+    WORKFLOW_RUN_SKELETON_CACHE.invalidate()
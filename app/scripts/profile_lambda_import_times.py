@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+"""
+Report the cold start import cost of each python lambda in app/lambdas
+
+For each lambda, the handler module is imported in a fresh interpreter with `python -X importtime`,
+with the lambda directory and the local layers on the path (as they would be in the lambda runtime).
+
+The total import time of the handler module is reported along with the heaviest imports.
+Budgets can be set to fail (exit code 1) if a lambda's init time exceeds a limit, i.e
+
+python3 app/scripts/profile_lambda_import_times.py \
+  --budget-ms 500 \
+  --lambda-budget-ms get_library_context=200
+
+Third party layers (i.e the orcabus api tools layer, which provides requests) are not part of this repository,
+use --extra-path to add their site-packages directory, otherwise the current environment is used.
+
+Each lambda is imported --repeat times and the fastest run is reported,
+as the first import also pays for compiling bytecode.
+"""
+
+# Standard imports
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Globals
+APP_DIR = Path(__file__).absolute().parent.parent
+LAMBDAS_DIR = APP_DIR / "lambdas"
+LAYERS_DIR = APP_DIR / "layers"
+LAMBDA_DIR_SUFFIX = "_py"
+DEFAULT_TOP_N = 5
+DEFAULT_REPEAT = 3
+
+
+def get_lambda_names() -> List[str]:
+    """
+    Each lambda lives at app/lambdas/<name>_py/<name>.py
+    :return:
+    """
+    return sorted(
+        lambda_dir_iter_.name[:-len(LAMBDA_DIR_SUFFIX)]
+        for lambda_dir_iter_ in LAMBDAS_DIR.iterdir()
+        if (
+            lambda_dir_iter_.is_dir() and
+            lambda_dir_iter_.name.endswith(LAMBDA_DIR_SUFFIX) and
+            (lambda_dir_iter_ / f"{lambda_dir_iter_.name[:-len(LAMBDA_DIR_SUFFIX)]}.py").is_file()
+        )
+    )
+
+
+def get_layer_python_paths() -> List[Path]:
+    """
+    Layers are bundled with a top level python/ directory
+    :return:
+    """
+    return sorted(LAYERS_DIR.glob("*/python"))
+
+
+def parse_import_time_output(stderr: str) -> List[Dict]:
+    """
+    Parse the output of python -X importtime, lines are of the form
+    import time: self [us] | cumulative | imported package
+    import time:       120 |        340 |   json.decoder
+    :param stderr:
+    :return:
+    """
+    imports_list = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_us, cumulative_us, module_name = line[len("import time:"):].split("|")
+            imports_list.append({
+                "module": module_name.strip(),
+                "depth": (len(module_name) - len(module_name.lstrip())) // 2,
+                "selfUs": int(self_us),
+                "cumulativeUs": int(cumulative_us),
+            })
+        except ValueError:
+            # The header line
+            continue
+    return imports_list
+
+
+def profile_lambda(lambda_name: str, extra_paths: List[str], top_n: int) -> Dict:
+    """
+    Import the lambda handler module in a fresh interpreter and collect its import times
+    :param lambda_name:
+    :param extra_paths:
+    :param top_n:
+    :return:
+    """
+    python_path = [
+        str(LAMBDAS_DIR / f"{lambda_name}{LAMBDA_DIR_SUFFIX}"),
+        *map(str, get_layer_python_paths()),
+        *extra_paths,
+    ]
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(python_path + list(filter(None, [os.environ.get("PYTHONPATH")]))),
+    }
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {lambda_name}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    imports_list = parse_import_time_output(proc.stderr)
+
+    if proc.returncode != 0:
+        return {
+            "lambdaName": lambda_name,
+            "error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error",
+        }
+
+    # The handler module is the last top level import,
+    # its imports are listed before it (back to the previous top level import)
+    handler_idx = max(
+        idx for idx, import_iter_ in enumerate(imports_list)
+        if import_iter_['module'] == lambda_name and import_iter_['depth'] == 0
+    )
+    handler_import = imports_list[handler_idx]
+    handler_children_list = []
+    for import_iter_ in reversed(imports_list[:handler_idx]):
+        if import_iter_['depth'] == 0:
+            break
+        handler_children_list.append(import_iter_)
+
+    # Direct imports made by the handler module
+    top_imports_list = sorted(
+        filter(
+            lambda import_iter_: import_iter_['depth'] == 1,
+            handler_children_list
+        ),
+        key=lambda import_iter_: import_iter_['cumulativeUs'],
+        reverse=True
+    )[:top_n]
+
+    return {
+        "lambdaName": lambda_name,
+        "initMs": round(handler_import['cumulativeUs'] / 1000, 1),
+        "topImports": list(map(
+            lambda import_iter_: {
+                "module": import_iter_['module'],
+                "cumulativeMs": round(import_iter_['cumulativeUs'] / 1000, 1),
+            },
+            top_imports_list
+        )),
+    }
+
+
+def profile_lambda_best_of(lambda_name: str, extra_paths: List[str], top_n: int, repeat: int) -> Dict:
+    """
+    Profile the lambda import repeat times, returning the fastest run
+    :param lambda_name:
+    :param extra_paths:
+    :param top_n:
+    :param repeat:
+    :return:
+    """
+    results_list = [
+        profile_lambda(lambda_name, extra_paths, top_n)
+        for _ in range(max(1, repeat))
+    ]
+    if any(map(lambda result_iter_: 'error' in result_iter_, results_list)):
+        return next(filter(lambda result_iter_: 'error' in result_iter_, results_list))
+    return min(results_list, key=lambda result_iter_: result_iter_['initMs'])
+
+
+def get_budget_ms(lambda_name: str, budget_ms: Optional[float], lambda_budgets_ms: Dict[str, float]) -> Optional[float]:
+    return lambda_budgets_ms.get(lambda_name, budget_ms)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Profile the import time of each python lambda")
+    parser.add_argument(
+        "--lambda-name", action="append", default=[],
+        help="Only profile this lambda (i.e get_library_context), may be repeated"
+    )
+    parser.add_argument(
+        "--extra-path", action="append", default=[],
+        help="Additional directories to add to the PYTHONPATH (i.e a layer's site-packages)"
+    )
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_N, help="Number of heaviest imports to report")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Report the fastest of n imports")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Init time budget for every lambda")
+    parser.add_argument(
+        "--lambda-budget-ms", action="append", default=[],
+        help="Init time budget for a single lambda, i.e get_library_context=200, may be repeated"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the results as json")
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    lambda_budgets_ms = dict(map(
+        lambda budget_iter_: (budget_iter_.split("=", 1)[0], float(budget_iter_.split("=", 1)[1])),
+        args.lambda_budget_ms
+    ))
+
+    lambda_names_list = args.lambda_name or get_lambda_names()
+
+    results_list = []
+    for lambda_name in lambda_names_list:
+        result = profile_lambda_best_of(lambda_name, args.extra_path, args.top, args.repeat)
+        budget_ms = get_budget_ms(lambda_name, args.budget_ms, lambda_budgets_ms)
+        result['budgetMs'] = budget_ms
+        result['overBudget'] = (
+            'error' not in result and
+            budget_ms is not None and
+            result['initMs'] > budget_ms
+        )
+        results_list.append(result)
+
+    if args.json:
+        print(json.dumps(results_list, indent=2))
+    else:
+        for result in results_list:
+            if 'error' in result:
+                print(f"{result['lambdaName']}: import failed, {result['error']}")
+                continue
+            budget_str = f" (budget {result['budgetMs']} ms)" if result['budgetMs'] is not None else ""
+            over_budget_str = " OVER BUDGET" if result['overBudget'] else ""
+            print(f"{result['lambdaName']}: {result['initMs']} ms{budget_str}{over_budget_str}")
+            for import_iter_ in result['topImports']:
+                print(f"    {import_iter_['cumulativeMs']:>8} ms  {import_iter_['module']}")
+
+    if any(map(lambda result_iter_: result_iter_['overBudget'] or 'error' in result_iter_, results_list)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ export const APP_ROOT = path.join(__dirname, '../../app');
 export const LAMBDA_DIR = path.join(APP_ROOT, 'lambdas');
 export const STEP_FUNCTIONS_DIR = path.join(APP_ROOT, 'step-functions-templates');
 export const EVENT_SCHEMAS_DIR = path.join(APP_ROOT, 'event-schemas');
+export const LAYERS_DIR = path.join(APP_ROOT, 'layers');
 
 /* Workflow constants */
 export const WORKFLOW_NAME = 'arriba-wgts-rna';
@@ -160,3 +161,14 @@ export const SSM_SCHEMA_ROOT = path.join(SSM_PARAMETER_PATH_PREFIX, 'schemas');
 
 // Used to group event rules and step functions
 export const STACK_PREFIX = 'orca-arriba-wgts-rna';
+
+/* Queue constants */
+// ICAv2 WES state change events are batched for up to this long, then coalesced per portal run
+export const ICAV2_WES_STATE_CHANGE_COALESCING_WINDOW_SECONDS = 10;
+export const ICAV2_WES_STATE_CHANGE_COALESCING_BATCH_SIZE = 100;
+// A message is dead-lettered after this many failed attempts
+export const ICAV2_WES_STATE_CHANGE_MAX_RECEIVE_COUNT = 3;
+
+/* Lambda constants */
+// Timeout for the lambdas that stream large outputs (i.e a multi-GB fusions.tsv), the default is 60 seconds
+export const EXTENDED_LAMBDA_TIMEOUT_SECONDS = 900;
@@ -1,4 +1,5 @@
 import {
+  AddQueueAsEventBridgeTargetProps,
   AddSfnAsEventBridgeTargetProps,
   eventBridgeTargetsNameList,
   EventBridgeTargetsProps,
@@ -16,13 +17,14 @@ export function buildWrscToSfnTarget(props: AddSfnAsEventBridgeTargetProps) {
   );
 }
 
-export function buildIcav2WesEventStateChangeToWrscSfnTarget(
-  props: AddSfnAsEventBridgeTargetProps
+export function buildIcav2WesEventStateChangeToCoalescingQueueTarget(
+  props: AddQueueAsEventBridgeTargetProps
 ) {
   // We take in the event detail from the icav2 wes state change event
+  // Events are queued and coalesced per portal run before the conversion state machine is started
   props.eventBridgeRuleObj.addTarget(
-    new eventsTargets.SfnStateMachine(props.stateMachineObj, {
-      input: events.RuleTargetInput.fromEventPath('$.detail'),
+    new eventsTargets.SqsQueue(props.queueObj, {
+      message: events.RuleTargetInput.fromEventPath('$.detail'),
     })
   );
 }
@@ -83,14 +85,14 @@ export function buildAllEventBridgeTargets(props: EventBridgeTargetsProps) {
       }
 
       // Post submitted
-      case 'icav2WesAnalysisStateChangeEventToWrscSfnTarget': {
-        buildIcav2WesEventStateChangeToWrscSfnTarget(<AddSfnAsEventBridgeTargetProps>{
+      case 'icav2WesAnalysisStateChangeEventToCoalescingQueueTarget': {
+        buildIcav2WesEventStateChangeToCoalescingQueueTarget(<AddQueueAsEventBridgeTargetProps>{
           eventBridgeRuleObj: props.eventBridgeRuleObjects.find(
             (eventBridgeObject) => eventBridgeObject.ruleName === 'icav2WesAnalysisStateChange'
           )?.ruleObject,
-          stateMachineObj: props.stepFunctionObjects.find(
-            (sfnObject) => sfnObject.stateMachineName === 'icav2WesAscEventToWorkflowRscEvent'
-          )?.sfnObject,
+          queueObj: props.queueObjects.find(
+            (queueObject) => queueObject.queueName === 'icav2WesStateChangeCoalescing'
+          )?.queueObject,
         });
         break;
       }
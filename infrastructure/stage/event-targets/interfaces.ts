@@ -2,6 +2,8 @@ import { StateMachine } from 'aws-cdk-lib/aws-stepfunctions';
 import { Rule } from 'aws-cdk-lib/aws-events';
 import { EventBridgeRuleObject } from '../event-rules/interfaces';
 import { StepFunctionObject } from '../step-functions/interfaces';
+import { QueueObject } from '../sqs/interfaces';
+import { Queue } from 'aws-cdk-lib/aws-sqs';
 
 /**
  * EventBridge Target Interfaces
@@ -16,7 +18,7 @@ export type EventBridgeTargetName =
   // Ready to ICAv2 WES Submitted
   | 'readyToIcav2WesSubmittedSfnTarget'
   // Post submission
-  | 'icav2WesAnalysisStateChangeEventToWrscSfnTarget';
+  | 'icav2WesAnalysisStateChangeEventToCoalescingQueueTarget';
 
 export const eventBridgeTargetsNameList: EventBridgeTargetName[] = [
   // Dragen WGTS Succeeded
@@ -28,7 +30,7 @@ export const eventBridgeTargetsNameList: EventBridgeTargetName[] = [
   // Ready to ICAv2 WES Submitted
   'readyToIcav2WesSubmittedSfnTarget',
   // Post submission
-  'icav2WesAnalysisStateChangeEventToWrscSfnTarget',
+  'icav2WesAnalysisStateChangeEventToCoalescingQueueTarget',
 ];
 
 export interface AddSfnAsEventBridgeTargetProps {
@@ -36,7 +38,13 @@ export interface AddSfnAsEventBridgeTargetProps {
   eventBridgeRuleObj: Rule;
 }
 
+export interface AddQueueAsEventBridgeTargetProps {
+  queueObj: Queue;
+  eventBridgeRuleObj: Rule;
+}
+
 export interface EventBridgeTargetsProps {
   eventBridgeRuleObjects: EventBridgeRuleObject[];
   stepFunctionObjects: StepFunctionObject[];
+  queueObjects: QueueObject[];
 }
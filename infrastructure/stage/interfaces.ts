@@ -28,4 +28,7 @@ export interface StatelessApplicationStackConfig {
 
   // Parameter paths
   ssmParameterPaths: SsmParameterPaths;
+
+  // Output prefix (s3 uri) of the analyses
+  outputPrefix: string;
 }
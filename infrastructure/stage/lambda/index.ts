@@ -1,4 +1,10 @@
-import { LambdaInput, lambdaNameList, LambdaObject, lambdaRequirementsMap } from './interfaces';
+import {
+  BuildAllLambdasProps,
+  BuildLambdaProps,
+  lambdaNameList,
+  LambdaObject,
+  lambdaRequirementsMap,
+} from './interfaces';
 import { PythonUvFunction } from '@orcabus/platform-cdk-constructs/lambda';
 import * as lambda from 'aws-cdk-lib/aws-lambda';
 import { Duration } from 'aws-cdk-lib';
@@ -8,10 +14,32 @@ import { camelCaseToKebabCase, camelCaseToSnakeCase } from '../utils';
 import * as path from 'path';
 import * as iam from 'aws-cdk-lib/aws-iam';
 import * as cdk from 'aws-cdk-lib';
-import { LAMBDA_DIR, SCHEMA_REGISTRY_NAME, SSM_SCHEMA_ROOT } from '../constants';
+import {
+  EXTENDED_LAMBDA_TIMEOUT_SECONDS,
+  LAMBDA_DIR,
+  LAYERS_DIR,
+  SCHEMA_REGISTRY_NAME,
+  SSM_SCHEMA_ROOT,
+} from '../constants';
 import { SchemaNames } from '../event-schemas/interfaces';
 
-function buildLambda(scope: Construct, props: LambdaInput): LambdaObject {
+/*
+  Shared python helpers for the lambdas in app/lambdas.
+  The layer is pure python (no third-party dependencies), so we can ship the directory as is,
+  python/ is added to the lambda PYTHONPATH by the lambda runtime.
+*/
+function buildArribaWgtsRnaToolsLayer(scope: Construct): lambda.LayerVersion {
+  return new lambda.LayerVersion(scope, 'ArribaWgtsRnaToolsLayer', {
+    code: lambda.Code.fromAsset(path.join(LAYERS_DIR, 'arriba_wgts_rna_tools_layer'), {
+      exclude: ['**/__pycache__', '**/*.pyc'],
+    }),
+    compatibleRuntimes: [lambda.Runtime.PYTHON_3_12],
+    compatibleArchitectures: [lambda.Architecture.ARM_64],
+    description: 'Shared python helpers for the arriba wgts rna pipeline manager lambdas',
+  });
+}
+
+function buildLambda(scope: Construct, props: BuildLambdaProps): LambdaObject {
   const lambdaNameToSnakeCase = camelCaseToSnakeCase(props.lambdaName);
   const lambdaRequirements = lambdaRequirementsMap[props.lambdaName];
 
@@ -22,7 +50,9 @@ function buildLambda(scope: Construct, props: LambdaInput): LambdaObject {
     architecture: lambda.Architecture.ARM_64,
     index: lambdaNameToSnakeCase + '.py',
     handler: 'handler',
-    timeout: Duration.seconds(60),
+    timeout: Duration.seconds(
+      lambdaRequirements.needsExtendedTimeout ? EXTENDED_LAMBDA_TIMEOUT_SECONDS : 60
+    ),
     memorySize: 2048,
     includeOrcabusApiToolsLayer: lambdaRequirements.needsOrcabusApiTools,
   });
@@ -44,6 +74,13 @@ function buildLambda(scope: Construct, props: LambdaInput): LambdaObject {
     true
   );
 
+  /*
+    Add in the shared arriba wgts rna tools layer
+    */
+  if (lambdaRequirements.needsArribaWgtsRnaToolsLayer) {
+    lambdaFunction.addLayers(props.arribaWgtsRnaToolsLayer);
+  }
+
   /*
     Add in SSM permissions for the lambda function
     */
@@ -99,6 +136,53 @@ function buildLambda(scope: Construct, props: LambdaInput): LambdaObject {
     );
   }
 
+  /*
+    Read and write access to the workflow output prefix, i.e to read the fusions.tsv
+    and write the summary sidecar next to it
+    */
+  if (lambdaRequirements.needsOutputPrefixReadWriteAccess) {
+    const outputPrefixUrl = new URL(props.outputPrefix);
+    lambdaFunction.addToRolePolicy(
+      new iam.PolicyStatement({
+        actions: ['s3:GetObject', 's3:PutObject'],
+        resources: [
+          `arn:aws:s3:::${outputPrefixUrl.host}/${outputPrefixUrl.pathname.replace(/^\//, '')}*`,
+        ],
+      })
+    );
+
+    /* We dont know the portal run ids ahead of time, so we give access to the whole output prefix */
+    NagSuppressions.addResourceSuppressions(
+      lambdaFunction,
+      [
+        {
+          id: 'AwsSolutions-IAM5',
+          reason: 'We need to give the lambda access to all analyses under the output prefix',
+        },
+      ],
+      true
+    );
+  }
+
+  /*
+    List access to the workflow output prefix, for the optional s3 backend of the arriba output manifest
+    (ARRIBA_OUTPUT_MANIFEST_BACKEND=s3), the filemanager backend needs no s3 permissions
+    */
+  if (lambdaRequirements.needsOutputPrefixListAccess) {
+    const outputPrefixUrl = new URL(props.outputPrefix);
+    lambdaFunction.addToRolePolicy(
+      new iam.PolicyStatement({
+        actions: ['s3:ListBucket'],
+        resources: [`arn:aws:s3:::${outputPrefixUrl.host}`],
+        conditions: {
+          StringLike: {
+            's3:prefix': [`${outputPrefixUrl.pathname.replace(/^\//, '')}*`],
+          },
+        },
+      })
+    );
+  }
+
   /*
     Special if the lambdaName is 'validateDraftCompleteSchema', we need to add in the ssm parameters
     to the REGISTRY_NAME and SCHEMA_NAME
@@ -119,13 +203,18 @@ function buildLambda(scope: Construct, props: LambdaInput): LambdaObject {
   };
 }
 
-export function buildAllLambdas(scope: Construct): LambdaObject[] {
+export function buildAllLambdas(scope: Construct, props: BuildAllLambdasProps): LambdaObject[] {
+  // Build the shared layer once, and attach it to the lambdas that need it
+  const arribaWgtsRnaToolsLayer = buildArribaWgtsRnaToolsLayer(scope);
+
   // Iterate over lambdaLayerToMapping and create the lambda functions
   const lambdaObjects: LambdaObject[] = [];
   for (const lambdaName of lambdaNameList) {
     lambdaObjects.push(
       buildLambda(scope, {
         lambdaName: lambdaName,
+        arribaWgtsRnaToolsLayer: arribaWgtsRnaToolsLayer,
+        outputPrefix: props.outputPrefix,
       })
     );
   }
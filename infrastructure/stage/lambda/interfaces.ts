@@ -1,4 +1,5 @@
 import { PythonUvFunction } from '@orcabus/platform-cdk-constructs/lambda';
+import * as lambda from 'aws-cdk-lib/aws-lambda';
 
 export type LambdaName =
   // Shared pre-ready lambdas
@@ -7,19 +8,19 @@ export type LambdaName =
   | 'comparePayload'
   | 'getWorkflowRunObject'
   | 'findLatestWorkflow'
-  | 'getDraftPayload'
   // Glue upstream
+  | 'generateDraftWruUpdates'
   // Draft to ready
-  | 'getLibraries'
-  | 'getFastqRgidsFromLibraryId'
-  | 'getMetadataTags'
+  | 'getLibraryContext'
   | 'getFastqIdListFromRgidList'
   // Validation
   | 'validateDraftDataCompleteSchema'
   // Ready to ICAv2 WES lambdas
   | 'convertReadyEventInputsToIcav2WesEventInputs'
   // ICAv2 WES to WRSC Event lambdas
-  | 'convertIcav2WesEventToWrscEvent';
+  | 'coalesceIcav2WesStateChangeEvents'
+  | 'convertIcav2WesEventToWrscEvent'
+  | 'summariseArribaFusions';
 
 export const lambdaNameList: LambdaName[] = [
   // Shared pre-ready lambdas
@@ -28,26 +29,30 @@ export const lambdaNameList: LambdaName[] = [
   'comparePayload',
   'getWorkflowRunObject',
   'findLatestWorkflow',
-  'getDraftPayload',
   // Glue upstream
+  'generateDraftWruUpdates',
   // Draft to ready
-  'getLibraries',
-  'getFastqRgidsFromLibraryId',
-  'getMetadataTags',
+  'getLibraryContext',
   'getFastqIdListFromRgidList',
   // Validation
   'validateDraftDataCompleteSchema',
   // Ready to ICAv2 WES lambdas
   'convertReadyEventInputsToIcav2WesEventInputs',
   // ICAv2 WES to WRSC Event lambdas
+  'coalesceIcav2WesStateChangeEvents',
   'convertIcav2WesEventToWrscEvent',
+  'summariseArribaFusions',
 ];
 
 // Requirements interface for Lambda functions
 export interface LambdaRequirements {
   needsOrcabusApiTools?: boolean;
+  needsArribaWgtsRnaToolsLayer?: boolean;
   needsSsmParametersAccess?: boolean;
   needsSchemaRegistryAccess?: boolean;
+  needsOutputPrefixListAccess?: boolean;
+  needsOutputPrefixReadWriteAccess?: boolean;
+  needsExtendedTimeout?: boolean;
 }
 
 // Lambda requirements mapping
@@ -55,44 +60,63 @@ export const lambdaRequirementsMap: Record<LambdaName, LambdaRequirements> = {
   // Shared pre-ready lambdas
   getDragenRnaOutputsFromPortalRunId: {
     needsOrcabusApiTools: true,
+    needsArribaWgtsRnaToolsLayer: true,
   },
   generateWruEventObjectWithMergedData: {
     needsOrcabusApiTools: true,
+    needsArribaWgtsRnaToolsLayer: true,
+  },
+  comparePayload: {
+    needsArribaWgtsRnaToolsLayer: true,
   },
-  comparePayload: {},
   getWorkflowRunObject: {
     needsOrcabusApiTools: true,
+    needsArribaWgtsRnaToolsLayer: true,
   },
   findLatestWorkflow: {
     needsOrcabusApiTools: true,
-  },
-  getDraftPayload: {
-    needsOrcabusApiTools: true,
+    needsArribaWgtsRnaToolsLayer: true,
   },
   // Glue upstream
-  // Draft to ready
-  getLibraries: {
+  generateDraftWruUpdates: {
     needsOrcabusApiTools: true,
+    needsArribaWgtsRnaToolsLayer: true,
   },
-  getFastqRgidsFromLibraryId: {
-    needsOrcabusApiTools: true,
-  },
-  getMetadataTags: {
+  // Draft to ready
+  getLibraryContext: {
     needsOrcabusApiTools: true,
+    needsArribaWgtsRnaToolsLayer: true,
   },
   getFastqIdListFromRgidList: {
     needsOrcabusApiTools: true,
+    needsArribaWgtsRnaToolsLayer: true,
   },
   // Validation
   validateDraftDataCompleteSchema: {
+    needsArribaWgtsRnaToolsLayer: true,
     needsSchemaRegistryAccess: true,
     needsSsmParametersAccess: true,
   },
-  // Convert ready to ICAv2 WES Event - no requirements
-  convertReadyEventInputsToIcav2WesEventInputs: {},
-  // Needs OrcaBus toolkit to get the wrsc event
+  // Convert ready to ICAv2 WES Event - needs the shared layer (and the OrcaBus toolkit) for the optional input pre-flight
+  convertReadyEventInputsToIcav2WesEventInputs: {
+    needsOrcabusApiTools: true,
+    needsArribaWgtsRnaToolsLayer: true,
+  },
+  // Coalesces the queued icav2 wes state change events, then starts the conversion state machine
+  coalesceIcav2WesStateChangeEvents: {
+    needsArribaWgtsRnaToolsLayer: true,
+  },
+  // Needs OrcaBus toolkit to get the wrsc event, and to list the output prefix for the (optional) s3 manifest backend
   convertIcav2WesEventToWrscEvent: {
     needsOrcabusApiTools: true,
+    needsArribaWgtsRnaToolsLayer: true,
+    needsOutputPrefixListAccess: true,
+  },
+  // Streams the fusions.tsv of a succeeded analysis, and writes the summary sidecar next to it
+  summariseArribaFusions: {
+    needsArribaWgtsRnaToolsLayer: true,
+    needsOutputPrefixReadWriteAccess: true,
+    needsExtendedTimeout: true,
   },
 };
 
@@ -100,6 +124,14 @@ export interface LambdaInput {
   lambdaName: LambdaName;
 }
 
+export interface BuildAllLambdasProps {
+  outputPrefix: string;
+}
+
+export interface BuildLambdaProps extends LambdaInput, BuildAllLambdasProps {
+  arribaWgtsRnaToolsLayer: lambda.ILayerVersion;
+}
+
 export interface LambdaObject extends LambdaInput {
   lambdaFunction: PythonUvFunction;
 }
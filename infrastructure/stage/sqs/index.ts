@@ -0,0 +1,80 @@
+import { Construct } from 'constructs';
+import { Duration } from 'aws-cdk-lib';
+import * as sqs from 'aws-cdk-lib/aws-sqs';
+import * as lambdaEventSources from 'aws-cdk-lib/aws-lambda-event-sources';
+import { NagSuppressions } from 'cdk-nag';
+import {
+  BuildCoalescingEventSourceProps,
+  QueueName,
+  queueNameList,
+  QueueObject,
+} from './interfaces';
+import {
+  ICAV2_WES_STATE_CHANGE_COALESCING_BATCH_SIZE,
+  ICAV2_WES_STATE_CHANGE_COALESCING_WINDOW_SECONDS,
+  ICAV2_WES_STATE_CHANGE_MAX_RECEIVE_COUNT,
+  STACK_PREFIX,
+} from '../constants';
+
+function buildQueue(scope: Construct, queueName: QueueName): QueueObject {
+  // Messages that fail repeatedly are moved to the dead letter queue
+  const deadLetterQueueObject = new sqs.Queue(scope, `${queueName}DeadLetterQueue`, {
+    queueName: `${STACK_PREFIX}-${queueName}-dlq`,
+    enforceSSL: true,
+    retentionPeriod: Duration.days(14),
+  });
+
+  // AwsSolutions-SQS3 - This is the dead letter queue
+  NagSuppressions.addResourceSuppressions(deadLetterQueueObject, [
+    {
+      id: 'AwsSolutions-SQS3',
+      reason: 'This is the dead letter queue',
+    },
+  ]);
+
+  const queueObject = new sqs.Queue(scope, `${queueName}Queue`, {
+    queueName: `${STACK_PREFIX}-${queueName}`,
+    enforceSSL: true,
+    // AWS recommends at least six times the lambda timeout (60 seconds) for an sqs event source
+    visibilityTimeout: Duration.seconds(360),
+    deadLetterQueue: {
+      queue: deadLetterQueueObject,
+      maxReceiveCount: ICAV2_WES_STATE_CHANGE_MAX_RECEIVE_COUNT,
+    },
+  });
+
+  return {
+    queueName: queueName,
+    queueObject: queueObject,
+    deadLetterQueueObject: deadLetterQueueObject,
+  };
+}
+
+export function buildCoalescingEventSource(props: BuildCoalescingEventSourceProps) {
+  /*
+    Events are batched for up to the coalescing window,
+    the lambda collapses each batch to the newest status per portal run,
+    then starts the state machine for each remaining event
+  */
+  props.lambdaFunction.addEventSource(
+    new lambdaEventSources.SqsEventSource(props.queueObject, {
+      batchSize: ICAV2_WES_STATE_CHANGE_COALESCING_BATCH_SIZE,
+      maxBatchingWindow: Duration.seconds(ICAV2_WES_STATE_CHANGE_COALESCING_WINDOW_SECONDS),
+      reportBatchItemFailures: true,
+    })
+  );
+
+  props.lambdaFunction.addEnvironment(
+    'STATE_MACHINE_ARN',
+    props.stateMachineObject.stateMachineArn
+  );
+  props.stateMachineObject.grantStartExecution(props.lambdaFunction);
+}
+
+export function buildAllQueues(scope: Construct): QueueObject[] {
+  const queueObjects: QueueObject[] = [];
+  for (const queueName of queueNameList) {
+    queueObjects.push(buildQueue(scope, queueName));
+  }
+  return queueObjects;
+}
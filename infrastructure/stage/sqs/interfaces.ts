@@ -0,0 +1,27 @@
+import * as sqs from 'aws-cdk-lib/aws-sqs';
+import { StateMachine } from 'aws-cdk-lib/aws-stepfunctions';
+import { PythonUvFunction } from '@orcabus/platform-cdk-constructs/lambda';
+
+/**
+ * SQS Queue Interfaces
+ */
+export type QueueName =
+  // Post-submitted, icav2 wes state change events waiting to be coalesced
+  'icav2WesStateChangeCoalescing';
+
+export const queueNameList: QueueName[] = [
+  // Post-submitted, icav2 wes state change events waiting to be coalesced
+  'icav2WesStateChangeCoalescing',
+];
+
+export interface QueueObject {
+  queueName: QueueName;
+  queueObject: sqs.Queue;
+  deadLetterQueueObject: sqs.Queue;
+}
+
+export interface BuildCoalescingEventSourceProps {
+  queueObject: sqs.Queue;
+  lambdaFunction: PythonUvFunction;
+  stateMachineObject: StateMachine;
+}
@@ -6,6 +6,7 @@ import { buildAllLambdas } from './lambda';
 import { buildAllStepFunctions } from './step-functions';
 import { buildAllEventRules } from './event-rules';
 import { buildAllEventBridgeTargets } from './event-targets';
+import { buildAllQueues, buildCoalescingEventSource } from './sqs';
 
 export type StatelessApplicationStackProps = cdk.StackProps & StatelessApplicationStackConfig;
 
@@ -25,7 +26,9 @@ export class StatelessApplicationStack extends cdk.Stack {
     );
 
     // Build the lambdas
-    const lambdas = buildAllLambdas(this);
+    const lambdas = buildAllLambdas(this, {
+      outputPrefix: props.outputPrefix,
+    });
 
     // Build the state machines
     const stateMachines = buildAllStepFunctions(this, {
@@ -34,6 +37,22 @@ export class StatelessApplicationStack extends cdk.Stack {
       ssmParameterPaths: props.ssmParameterPaths,
     });
 
+    // Build the queues
+    const queues = buildAllQueues(this);
+
+    // Queued icav2 wes state change events are coalesced, then converted
+    buildCoalescingEventSource({
+      queueObject: queues.find(
+        (queueObject) => queueObject.queueName === 'icav2WesStateChangeCoalescing'
+      )!.queueObject,
+      lambdaFunction: lambdas.find(
+        (lambdaObject) => lambdaObject.lambdaName === 'coalesceIcav2WesStateChangeEvents'
+      )!.lambdaFunction,
+      stateMachineObject: stateMachines.find(
+        (sfnObject) => sfnObject.stateMachineName === 'icav2WesAscEventToWorkflowRscEvent'
+      )!.sfnObject,
+    });
+
     // Add event rules
     const eventRules = buildAllEventRules(this, {
       eventBus: orcabusMainEventBus,
@@ -43,6 +62,7 @@ export class StatelessApplicationStack extends cdk.Stack {
     buildAllEventBridgeTargets({
       eventBridgeRuleObjects: eventRules,
       stepFunctionObjects: stateMachines,
+      queueObjects: queues,
     });
   }
 }
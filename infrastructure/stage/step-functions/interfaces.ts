@@ -85,12 +85,10 @@ export const stepFunctionsRequirementsMap: Record<StateMachineName, StepFunction
 export const stepFunctionToLambdasMap: Record<StateMachineName, LambdaName[]> = {
   glueSucceededEventsToDraftUpdate: [
     // Shared pre-ready lambdas
-    'getDragenRnaOutputsFromPortalRunId',
-    'generateWruEventObjectWithMergedData',
-    'comparePayload',
     'getWorkflowRunObject',
     'findLatestWorkflow',
-    'getDraftPayload',
+    // Glue upstream
+    'generateDraftWruUpdates',
   ],
   populateDraftData: [
     // Shared pre-ready lambdas
@@ -99,11 +97,8 @@ export const stepFunctionToLambdasMap: Record<StateMachineName, LambdaName[]> =
     'comparePayload',
     'getWorkflowRunObject',
     'findLatestWorkflow',
-    'getDraftPayload',
     // Draft to ready
-    'getLibraries',
-    'getFastqRgidsFromLibraryId',
-    'getMetadataTags',
+    'getLibraryContext',
     'getFastqIdListFromRgidList',
     // Validation
     'validateDraftDataCompleteSchema',
@@ -119,5 +114,6 @@ export const stepFunctionToLambdasMap: Record<StateMachineName, LambdaName[]> =
   icav2WesAscEventToWorkflowRscEvent: [
     // ICAv2 WES to WRSC Event lambdas
     'convertIcav2WesEventToWrscEvent',
+    'summariseArribaFusions',
   ],
 };